@@ -0,0 +1,218 @@
+"""Request and SQL metrics in Prometheus text format.
+
+init_metrics(app) records, per Flask endpoint:
+
+- http_request_duration_seconds: latency histogram by endpoint, method and
+  status;
+- db_queries_per_request and db_time_per_request_seconds: how many SQL
+  statements a request ran and how long they took in total;
+- db_query_duration_seconds: a histogram of every statement's duration;
+- db_slow_queries_total: statements slower than SLOW_QUERY_MS, each of
+  which is also logged with its endpoint and SQL.
+
+Everything is served at /metrics. Nothing is installed unless
+METRICS_ENABLED is set, so apps that are not scraped pay nothing.
+
+Settings (environment variables):
+
+- METRICS_ENABLED: 1 to record and serve metrics (default off)
+- SLOW_QUERY_MS: statements at least this slow are logged (default 200)
+
+rootly/utils/metrics.py is a copy of this file, so each app runs on its
+own. Make changes in both, and keep to Flask and SQLAlchemy APIs that
+both apps' pinned versions (Flask 2.0 / SQLAlchemy 1.4 there) support.
+"""
+
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+
+from flask import Response, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+SLOW_QUERY_MS = int(os.environ.get('SLOW_QUERY_MS', 200))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250)
+
+logger = logging.getLogger(__name__)
+
+# [statement count, seconds in SQL, endpoint] for the request being handled
+_request_sql = ContextVar('request_sql', default=None)
+
+
+class Histogram:
+    """A labelled histogram with fixed buckets."""
+
+    def __init__(self, name, help_text, labels, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_values, value):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = [(labels, list(counts), total, count)
+                        for labels, (counts, total, count) in sorted(self._series.items())]
+
+        for label_values, counts, total, count in snapshot:
+            labels = _labels(self.labels, label_values)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f'{self.name}_sum{{{labels}}} {total}')
+            lines.append(f'{self.name}_count{{{labels}}} {count}')
+        return lines
+
+
+class Counter:
+    """A labelled monotonically increasing counter."""
+
+    def __init__(self, name, help_text, labels):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            snapshot = sorted(self._values.items())
+        for label_values, value in snapshot:
+            lines.append(f'{self.name}{{{_labels(self.labels, label_values)}}} {value}')
+        return lines
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values):
+    return ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+
+request_duration = Histogram('http_request_duration_seconds', 'Request latency.',
+                             ('endpoint', 'method', 'status'), LATENCY_BUCKETS)
+queries_per_request = Histogram('db_queries_per_request', 'SQL statements run by a request.',
+                                ('endpoint',), QUERY_COUNT_BUCKETS)
+sql_time_per_request = Histogram('db_time_per_request_seconds',
+                                 'Total time a request spent in SQL.',
+                                 ('endpoint',), LATENCY_BUCKETS)
+query_duration = Histogram('db_query_duration_seconds', 'Duration of each SQL statement.',
+                           ('endpoint',), LATENCY_BUCKETS)
+slow_queries = Counter('db_slow_queries_total', 'SQL statements slower than SLOW_QUERY_MS.',
+                       ('endpoint',))
+
+METRICS = (request_duration, queries_per_request, sql_time_per_request, query_duration,
+           slow_queries)
+
+
+def render_metrics():
+    """Return every metric in Prometheus text exposition format."""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('metrics_query_start')
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+
+    current = _request_sql.get()
+    endpoint = current[2] if current is not None else '(no request)'
+    if current is not None:
+        current[0] += 1
+        current[1] += elapsed
+
+    query_duration.observe((endpoint,), elapsed)
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        slow_queries.inc((endpoint,))
+        logger.warning("Slow query (%.0f ms) in %s: %s", elapsed * 1000, endpoint,
+                       ' '.join(statement.split())[:1000])
+
+
+def _handle_error(context):
+    # A statement that raised never reaches after_cursor_execute
+    if context.connection is not None:
+        starts = context.connection.info.get('metrics_query_start')
+        if starts:
+            starts.pop()
+
+
+_sql_hooks_installed = False
+
+
+def init_metrics(app, enabled=None):
+    """Record metrics for app and serve them at /metrics, if enabled."""
+    global _sql_hooks_installed
+
+    if enabled is None:
+        enabled = os.environ.get('METRICS_ENABLED', '').lower() in ('1', 'true', 'yes')
+    if not enabled:
+        return False
+
+    if not _sql_hooks_installed:
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
+        _sql_hooks_installed = True
+
+    @app.before_request
+    def start_timer():
+        request.environ['metrics.start'] = time.perf_counter()
+        request.environ['metrics.token'] = _request_sql.set([0, 0.0, request.endpoint or '(unmatched)'])
+
+    @app.after_request
+    def record_request(response):
+        start = request.environ.pop('metrics.start', None)
+        token = request.environ.pop('metrics.token', None)
+        if start is None:
+            return response
+
+        endpoint = request.endpoint or '(unmatched)'
+        request_duration.observe((endpoint, request.method, response.status_code),
+                                 time.perf_counter() - start)
+
+        count, seconds, _ = _request_sql.get()
+        queries_per_request.observe((endpoint,), count)
+        sql_time_per_request.observe((endpoint,), seconds)
+        _request_sql.reset(token)
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+    return True
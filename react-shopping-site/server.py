@@ -1,10 +1,13 @@
 from flask import Flask, jsonify, render_template
 from model import db, Melon, MelonType, connect_to_db
+from metrics import init_metrics
 from time import sleep
 
 app = Flask(__name__)
 app.secret_key = 'secret'
 
+init_metrics(app)
+
 
 @app.route('/')
 def home():
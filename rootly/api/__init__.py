@@ -0,0 +1,23 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()  # Load environment variables from .env file
+
+# API keys
+PERENUAL_API_KEY = os.environ.get('PERENUAL_API_KEY')
+PLANT_ID_API_KEY = os.environ.get('PLANT_ID_API_KEY')
+PLANT_HEALTH_API_KEY = os.environ.get('PLANT_HEALTH_API_KEY')
+QUANTITATIVE_PLANT_API_KEY = os.environ.get('QUANTITATIVE_PLANT_API_KEY')
+
+# API endpoints
+PERENUAL_BASE_URL = 'https://perenual.com/api/'
+PLANT_ID_BASE_URL = 'https://api.plant.id/v2/'
+PLANT_HEALTH_BASE_URL = 'https://api.plant.health/v2/'
+QUANTITATIVE_PLANT_BASE_URL = os.environ.get('QUANTITATIVE_PLANT_BASE_URL',
+                                             'http://www.quantitative-plant.org/api')
+
+# Common headers
+DEFAULT_HEADERS = {
+    'User-Agent': 'Rootly/1.0',
+    'Accept': 'application/json'
+}
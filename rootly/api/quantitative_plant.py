@@ -0,0 +1,471 @@
+"""Quantitative Plant trait client and columnar trait store.
+
+Trait measurements (leaf area, growth rate, height, ...) arrive as long
+lists of (species, trait, value) records. They are streamed page by page
+into an on-disk columnar store of NumPy arrays and queried through memory
+maps, so neither a download nor a query has to fit in RAM.
+
+Layout of TRAIT_STORE_DIR (default rootly/data/traits):
+
+- meta.json          species and trait names (their list index is their code),
+                     units, row counts, the current log and compacted
+                     generations and each trait's slice of the columns
+- log_<gen>_*.bin    raw columns of the latest complete download
+- species_<gen>.npy  species code of every row, rows grouped by trait
+- value_<gen>.npy    value of every row, in the same order
+- summary_*_<gen>.npy  count / sum / min / max per (trait, species)
+
+Every sync is a full snapshot, not an increment. It is written to the log
+files of the next generation, and meta.json is switched to them (with an
+atomic os.replace) only once the download completes. A crash midway
+leaves the previous snapshot in use, and a repeated sync never counts a
+record twice. Syncing only some traits carries the other traits' rows
+over from the previous snapshot.
+
+compact() turns the current log into the grouped columns and summaries with a
+counting sort done in chunks. It writes them as the next compacted
+generation and switches meta.json over the same way, so the columns, the
+summaries and the trait offsets always change together. Readers notice a
+new meta.json and reload it before their next query; the generation before
+the current one is kept until the next compaction, so a query already
+under way never loses its files. Range queries such as "species with growth
+rate between X and Y" read one row of the summary matrices; aggregates
+over raw values read one trait's slice in chunks.
+
+    python -m api.quantitative_plant sync [trait ...]
+    python -m api.quantitative_plant range <trait> <low> <high>
+    python -m api.quantitative_plant stats <trait> [species]
+"""
+
+import json
+import os
+
+import numpy as np
+import requests
+
+from api import DEFAULT_HEADERS, QUANTITATIVE_PLANT_API_KEY, QUANTITATIVE_PLANT_BASE_URL
+
+TRAIT_STORE_DIR = os.environ.get(
+    'TRAIT_STORE_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'traits'))
+
+CHUNK_ROWS = 1_000_000
+PAGE_SIZE = 1000
+
+LOG_COLUMNS = {'species': np.int32, 'trait': np.int16, 'value': np.float32}
+SUMMARIES = ('count', 'sum', 'min', 'max')
+COMPACTED = ('species', 'value') + tuple(f'summary_{name}' for name in SUMMARIES)
+
+
+# ----------------------------------------
+# API client
+# ----------------------------------------
+
+def get_session():
+    """Return a requests session with the API headers and key."""
+    session = requests.Session()
+    session.headers.update(DEFAULT_HEADERS)
+    if QUANTITATIVE_PLANT_API_KEY:
+        session.headers['Authorization'] = f"Token {QUANTITATIVE_PLANT_API_KEY}"
+    return session
+
+
+def iter_trait_records(traits=None, session=None, page_size=PAGE_SIZE, timeout=30):
+    """Yield trait records, following the API's pagination one page at a time.
+
+    Each record is a dict with species, trait, value and optionally unit.
+    """
+    session = session or get_session()
+    url = f"{QUANTITATIVE_PLANT_BASE_URL.rstrip('/')}/traits"
+    params = {'page_size': page_size}
+    if traits:
+        params['trait'] = ','.join(traits)
+
+    while url:
+        response = session.get(url, params=params, timeout=timeout)
+        response.raise_for_status()
+        page = response.json()
+
+        yield from page.get('results', [])
+
+        url = page.get('next')
+        params = None  # the next URL already carries the query
+
+
+# ----------------------------------------
+# Columnar store
+# ----------------------------------------
+
+class TraitStore:
+    """Snapshot trait columns on disk with memory-mapped queries."""
+
+    def __init__(self, path=TRAIT_STORE_DIR):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._load_meta()
+
+    def _load_meta(self):
+        self._meta_stamp = self._stat_meta()
+        self.meta = self._read_meta()
+        self.species_codes = {name: code for code, name in enumerate(self.meta['species'])}
+        self.trait_codes = {name: code for code, name in enumerate(self.meta['traits'])}
+
+    def refresh(self):
+        """Reload meta.json if another store has switched generations since."""
+        if self._stat_meta() != self._meta_stamp:
+            self._load_meta()
+
+    # Metadata
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _stat_meta(self):
+        try:
+            stat = os.stat(self._file('meta.json'))
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def _read_meta(self):
+        try:
+            with open(self._file('meta.json')) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'species': [], 'traits': [], 'units': {}, 'log_generation': 0,
+                    'log_rows': 0, 'rows': 0, 'trait_offsets': [0]}
+
+    def _write_meta(self):
+        temp = self._file('meta.json.tmp')
+        with open(temp, 'w') as f:
+            json.dump(self.meta, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp, self._file('meta.json'))
+        self._meta_stamp = self._stat_meta()
+
+    def _code(self, codes, names, name):
+        """Return the code for name, assigning the next one if it is new."""
+        code = codes.get(name)
+        if code is None:
+            code = codes[name] = len(names)
+            names.append(name)
+        return code
+
+    # Writing
+
+    def _log_file(self, column, generation):
+        # Generation 0 is the layout from before snapshots were versioned
+        if generation == 0:
+            return self._file(f'log_{column}.bin')
+        return self._file(f'log_{generation}_{column}.bin')
+
+    def load_snapshot(self, records, traits=None, chunk_rows=CHUNK_ROWS):
+        """Replace the log with records; return how many were written.
+
+        With traits, the records replace only those traits and the other
+        traits' rows are copied from the current snapshot. The new snapshot
+        becomes current only when everything has been written.
+        """
+        generation = self.meta.get('log_generation', 0) + 1
+        files = {column: open(self._log_file(column, generation), 'wb') for column in LOG_COLUMNS}
+        buffers = {column: [] for column in LOG_COLUMNS}
+        written = 0
+
+        try:
+            for record in records:
+                try:
+                    value = float(record['value'])
+                except (KeyError, TypeError, ValueError):
+                    continue
+
+                trait = record['trait']
+                buffers['species'].append(self._code(self.species_codes, self.meta['species'],
+                                                     record['species'].strip()))
+                buffers['trait'].append(self._code(self.trait_codes, self.meta['traits'], trait))
+                buffers['value'].append(value)
+                if record.get('unit'):
+                    self.meta['units'].setdefault(trait, record['unit'])
+
+                if len(buffers['value']) >= chunk_rows:
+                    written += self._flush(buffers, files)
+
+            written += self._flush(buffers, files)
+            kept = self._carry_over(traits, files, chunk_rows) if traits else 0
+
+            for f in files.values():
+                f.flush()
+                os.fsync(f.fileno())
+        except BaseException:
+            # Drop the partial snapshot; the current one stays in use
+            for column, f in files.items():
+                f.close()
+                os.remove(self._log_file(column, generation))
+            raise
+        finally:
+            for f in files.values():
+                f.close()
+
+        previous = self.meta.get('log_generation', 0)
+        self.meta['log_generation'] = generation
+        self.meta['log_rows'] = written + kept
+        self._write_meta()
+
+        for column in LOG_COLUMNS:
+            try:
+                os.remove(self._log_file(column, previous))
+            except FileNotFoundError:
+                pass
+        return written
+
+    def _flush(self, buffers, files):
+        """Write buffered rows to the new log files and clear the buffers."""
+        count = len(buffers['value'])
+        if not count:
+            return 0
+
+        for column, dtype in LOG_COLUMNS.items():
+            np.asarray(buffers[column], dtype=dtype).tofile(files[column])
+            buffers[column].clear()
+        return count
+
+    def _carry_over(self, traits, files, chunk_rows):
+        """Copy current log rows for traits not being replaced; return how many."""
+        if not self.meta['log_rows']:
+            return 0
+
+        replaced = np.array([self.trait_codes[trait] for trait in traits if trait in self.trait_codes],
+                            dtype=np.int16)
+        columns = {column: self._log(column) for column in LOG_COLUMNS}
+        kept = 0
+        for start in range(0, self.meta['log_rows'], chunk_rows):
+            keep = ~np.isin(columns['trait'][start:start + chunk_rows], replaced)
+            for column in LOG_COLUMNS:
+                np.asarray(columns[column][start:start + chunk_rows])[keep].tofile(files[column])
+            kept += int(keep.sum())
+        return kept
+
+    def _log(self, column):
+        """Memory-map one column of the current log."""
+        return np.memmap(self._log_file(column, self.meta.get('log_generation', 0)),
+                         dtype=LOG_COLUMNS[column], mode='r', shape=(self.meta['log_rows'],))
+
+    def _compacted_file(self, name, generation=None):
+        # Generation 0 is the layout from before compactions were versioned
+        if generation is None:
+            generation = self.meta.get('compact_generation', 0)
+        if generation == 0:
+            return self._file(f'{name}.npy')
+        return self._file(f'{name}_{generation}.npy')
+
+    def compact(self, chunk_rows=CHUNK_ROWS):
+        """Rebuild the grouped columns and per-species summaries from the current log.
+
+        They are written as a new generation, which meta.json switches to in
+        one os.replace. The generation before the previous one is removed.
+        """
+        rows = self.meta['log_rows']
+        if not rows:
+            self.meta['rows'] = 0
+            self.meta['trait_offsets'] = [0]
+            self._write_meta()
+            return
+
+        generation = self.meta.get('compact_generation', 0) + 1
+        try:
+            offsets = self._compact_into(generation, rows, chunk_rows)
+        except BaseException:
+            # Drop the partial generation; the current one stays in use
+            self._remove_compacted(generation)
+            raise
+
+        self.meta['compact_generation'] = generation
+        self.meta['rows'] = rows
+        self.meta['trait_offsets'] = offsets.tolist()
+        self._write_meta()
+
+        if generation >= 2:
+            self._remove_compacted(generation - 2)
+
+    def _remove_compacted(self, generation):
+        for name in COMPACTED:
+            try:
+                os.remove(self._compacted_file(name, generation))
+            except FileNotFoundError:
+                pass
+
+    def _compact_into(self, generation, rows, chunk_rows):
+        """Write generation's columns and summaries from the log; return the trait offsets."""
+        n_traits = len(self.meta['traits'])
+        n_species = len(self.meta['species'])
+
+        log_species, log_trait, log_value = self._log('species'), self._log('trait'), self._log('value')
+
+        counts = np.zeros(n_traits, dtype=np.int64)
+        for start in range(0, rows, chunk_rows):
+            counts += np.bincount(log_trait[start:start + chunk_rows], minlength=n_traits)
+        offsets = np.concatenate([[0], np.cumsum(counts)])
+
+        species_out = np.lib.format.open_memmap(self._compacted_file('species', generation),
+                                                mode='w+', dtype=np.int32, shape=(rows,))
+        value_out = np.lib.format.open_memmap(self._compacted_file('value', generation),
+                                              mode='w+', dtype=np.float32, shape=(rows,))
+        summary = {
+            'count': np.zeros((n_traits, n_species), dtype=np.int64),
+            'sum': np.zeros((n_traits, n_species), dtype=np.float64),
+            'min': np.full((n_traits, n_species), np.inf, dtype=np.float32),
+            'max': np.full((n_traits, n_species), -np.inf, dtype=np.float32),
+        }
+
+        cursor = offsets[:-1].copy()
+        for start in range(0, rows, chunk_rows):
+            species = np.asarray(log_species[start:start + chunk_rows])
+            traits = np.asarray(log_trait[start:start + chunk_rows]).astype(np.int64)
+            values = np.asarray(log_value[start:start + chunk_rows])
+
+            # Stable counting sort of this chunk by trait
+            order = np.argsort(traits, kind='stable')
+            traits, species, values = traits[order], species[order], values[order]
+            rank = np.arange(len(traits)) - np.searchsorted(traits, traits)
+            positions = cursor[traits] + rank
+            species_out[positions] = species
+            value_out[positions] = values
+            cursor += np.bincount(traits, minlength=n_traits)
+
+            cell = (traits, species)
+            np.add.at(summary['count'], cell, 1)
+            np.add.at(summary['sum'], cell, values)
+            np.minimum.at(summary['min'], cell, values)
+            np.maximum.at(summary['max'], cell, values)
+
+        species_out.flush()
+        value_out.flush()
+        del species_out, value_out
+
+        for name, matrix in summary.items():
+            with open(self._compacted_file(f'summary_{name}', generation), 'wb') as f:
+                np.save(f, matrix)
+                f.flush()
+                os.fsync(f.fileno())
+
+        return offsets
+
+    # Reading
+
+    def _summary(self, name, trait_code):
+        """Memory-map one trait's row of a summary matrix."""
+        return np.load(self._compacted_file(f'summary_{name}'), mmap_mode='r')[trait_code]
+
+    def _trait_code(self, trait):
+        code = self.trait_codes.get(trait)
+        if code is None or code + 1 >= len(self.meta['trait_offsets']):
+            raise KeyError(f"No compacted data for trait '{trait}'")
+        return code
+
+    def species_in_range(self, trait, low=None, high=None, stat='mean'):
+        """Return {species: value} where the species' stat for trait is in [low, high]."""
+        self.refresh()
+        code = self._trait_code(trait)
+        count = np.asarray(self._summary('count', code))
+
+        if stat == 'mean':
+            with np.errstate(invalid='ignore', divide='ignore'):
+                values = np.asarray(self._summary('sum', code)) / count
+        else:
+            values = np.asarray(self._summary(stat, code), dtype=np.float64)
+
+        mask = count > 0
+        if low is not None:
+            mask &= values >= low
+        if high is not None:
+            mask &= values <= high
+
+        species = self.meta['species']
+        return {species[i]: float(values[i]) for i in np.flatnonzero(mask)}
+
+    def aggregate(self, trait, species=None, chunk_rows=CHUNK_ROWS):
+        """Return count, mean, min, max and std of a trait's raw values.
+
+        Reads only that trait's slice of the value column, chunk by chunk.
+        """
+        self.refresh()
+        code = self._trait_code(trait)
+        start, stop = self.meta['trait_offsets'][code], self.meta['trait_offsets'][code + 1]
+        values_column = np.load(self._compacted_file('value'), mmap_mode='r')
+        species_column = np.load(self._compacted_file('species'), mmap_mode='r')
+        species_code = self.species_codes.get(species) if species else None
+        if species and species_code is None:
+            return {'count': 0, 'mean': None, 'min': None, 'max': None, 'std': None}
+
+        count, total, squares = 0, 0.0, 0.0
+        low, high = np.inf, -np.inf
+        for chunk_start in range(start, stop, chunk_rows):
+            chunk_stop = min(chunk_start + chunk_rows, stop)
+            values = np.asarray(values_column[chunk_start:chunk_stop], dtype=np.float64)
+            if species_code is not None:
+                values = values[species_column[chunk_start:chunk_stop] == species_code]
+            if not len(values):
+                continue
+            count += len(values)
+            total += values.sum()
+            squares += np.square(values).sum()
+            low, high = min(low, values.min()), max(high, values.max())
+
+        if not count:
+            return {'count': 0, 'mean': None, 'min': None, 'max': None, 'std': None}
+
+        mean = total / count
+        return {'count': count, 'mean': mean, 'min': float(low), 'max': float(high),
+                'std': float(np.sqrt(max(squares / count - mean * mean, 0.0)))}
+
+    def species_traits(self, species):
+        """Return {trait: mean} for one species, from the summaries."""
+        self.refresh()
+        code = self.species_codes.get(species)
+        if code is None or not self.meta['rows']:
+            return {}
+
+        counts = np.load(self._compacted_file('summary_count'), mmap_mode='r')[:, code]
+        sums = np.load(self._compacted_file('summary_sum'), mmap_mode='r')[:, code]
+        traits = self.meta['traits']
+        return {traits[i]: float(sums[i] / counts[i]) for i in np.flatnonzero(counts)}
+
+
+def sync(traits=None, store=None):
+    """Download a fresh snapshot of trait records and compact it; return rows downloaded."""
+    store = store or TraitStore()
+    downloaded = store.load_snapshot(iter_trait_records(traits), traits)
+    store.compact()
+    return downloaded
+
+
+def plants_in_range(trait, low=None, high=None, store=None):
+    """Return [(plant_id, scientific_name, value)] for Rootly plants whose trait is in range."""
+    from model import db, Plant
+
+    matches = (store or TraitStore()).species_in_range(trait, low, high)
+    if not matches:
+        return []
+
+    rows = db.session.execute(
+        db.select(Plant.plant_id, Plant.scientific_name)
+        .where(Plant.scientific_name.in_(list(matches)))
+    ).all()
+    return [(plant_id, name, matches[name]) for plant_id, name in rows]
+
+
+if __name__ == "__main__":
+    import sys
+
+    command, args = (sys.argv[1], sys.argv[2:]) if len(sys.argv) > 1 else ('', [])
+    store = TraitStore()
+
+    if command == 'sync':
+        print(f"Downloaded {sync(args or None, store)} trait records")
+    elif command == 'range' and len(args) == 3:
+        for name, value in sorted(store.species_in_range(args[0], float(args[1]), float(args[2])).items()):
+            print(f"{name:<40} {value:.3f}")
+    elif command == 'stats' and args:
+        print(store.aggregate(args[0], args[1] if len(args) > 1 else None))
+    else:
+        print(__doc__)
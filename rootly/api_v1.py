@@ -0,0 +1,386 @@
+"""Versioned JSON API for Rootly, mounted at /api/v1.
+
+List endpoints accept:
+
+- ``fields=a,b``  return only these fields (sparse fieldsets)
+- ``limit=N``     page size, at most MAX_PAGE_SIZE
+- ``cursor=...``  the opaque next_cursor from a previous page
+
+Every response has a weak ETag built from Plant.last_updated or the row
+version columns, so a client can revalidate with If-None-Match and get an
+empty 304 back. JSON bodies are gzipped when the client accepts it.
+
+Plants are listed in (last_updated, plant_id) order, and every plant page
+also carries a sync_cursor. A client that keeps the last sync_cursor it was
+given can ask again later with ``since=<sync_cursor>`` and gets the plants
+added or changed since then, paging on with next_cursor as usual.
+
+last_updated is stamped when a change is made, not when it commits, so a
+slow transaction can commit a plant with a timestamp older than one a
+client has already seen. since therefore reaches back API_SYNC_OVERLAP
+seconds (default 300) before the cursor: changes that took less than that
+to commit are never missed, and plants changed in the overlap are sent
+again. Clients should apply plants by plant_id, which makes repeats
+harmless.
+"""
+
+import base64
+import gzip
+import hashlib
+import json
+import os
+from datetime import date, datetime, timedelta
+
+from flask import Blueprint, abort, jsonify, make_response, request, session
+from sqlalchemy import select, tuple_
+from werkzeug.exceptions import HTTPException
+
+from model import db, Plant, UserPlant, CareEvent, Reminder
+from utils.plant_graph import get_plant_graph
+from utils.recommendations import recommend_plants
+
+api_v1 = Blueprint('api_v1', __name__, url_prefix='/api/v1')
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+MAX_HOPS = 3
+GZIP_MIN_SIZE = 500
+SYNC_OVERLAP = timedelta(seconds=int(os.environ.get('API_SYNC_OVERLAP', 300)))
+SYNC_START = datetime(1970, 1, 1)
+
+PUBLIC_ENDPOINTS = {'api_v1.list_plants', 'api_v1.get_plant', 'api_v1.related_plants'}
+
+
+# ----------------------------------------
+# Request and response helpers
+# ----------------------------------------
+
+def _to_json(value):
+    """Return value in a JSON-friendly form."""
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def _requested_fields(model):
+    """Return the field names in ?fields=, or all of the model's columns."""
+    columns = model.__mapper__.column_attrs.keys()
+    names = request.args.get('fields')
+
+    if not names:
+        return columns
+
+    fields = []
+    for name in names.split(','):
+        name = name.strip()
+        if name not in columns:
+            abort(400, f"Unknown field '{name}'.")
+        if name not in fields:
+            fields.append(name)
+    return fields
+
+
+def _page_size():
+    """Return the requested page size."""
+    try:
+        limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        abort(400, "limit must be an integer.")
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def _encode_cursor(values):
+    """Turn the sort key of the last row on a page into an opaque cursor."""
+    raw = json.dumps([_to_json(value) for value in values]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def _decode_cursor(sort_keys, param='cursor'):
+    """Return the sort key values from ?cursor= (or another param), or None."""
+    cursor = request.args.get(param)
+    if not cursor:
+        return None
+
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != len(sort_keys):
+            raise ValueError
+        return [_cursor_value(key, value) for key, value in zip(sort_keys, values)]
+    except (ValueError, TypeError, NotImplementedError):
+        abort(400, f"Invalid {param}.")
+
+
+def _cursor_value(key, value):
+    """Return a cursor value as the Python type of its sort key, or raise ValueError."""
+    python_type = key.type.python_type
+    if python_type in (date, datetime):
+        return python_type.fromisoformat(value)
+    if python_type is float and type(value) is int:
+        return float(value)
+    if type(value) is not python_type:
+        raise ValueError
+    return value
+
+
+def _etag(*parts):
+    """Hash parts into an ETag value."""
+    return hashlib.sha1(json.dumps(parts, default=_to_json).encode()).hexdigest()
+
+
+def _conditional(etag, build_body, private=True):
+    """Return 304 if the client already has etag, else the JSON from build_body."""
+    if request.if_none_match.contains_weak(etag):
+        response = make_response('', 304)
+    else:
+        response = jsonify(build_body())
+
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'private, no-cache' if private else 'public, no-cache'
+    return response
+
+
+def _list(model, sort_keys, version, *criteria, join=None, private=True, sync_cursor=None):
+    """Return one page of model rows as a conditional JSON response.
+
+    sort_keys must be unique together; pages are fetched with a keyset
+    condition on them, so deep pages cost the same as the first. With
+    sync_cursor (the position reached before this page), the body also
+    carries a sync_cursor for the position after it, even on the last page.
+    """
+    fields = _requested_fields(model)
+    limit = _page_size()
+    after = _decode_cursor(sort_keys)
+
+    names = list(dict.fromkeys(fields + [key.key for key in sort_keys] + [version.key]))
+    stmt = select(*(getattr(model, name) for name in names))
+    if join is not None:
+        stmt = stmt.join(*join)
+    stmt = stmt.where(*criteria)
+    if after is not None:
+        stmt = stmt.where(tuple_(*sort_keys) > tuple_(*after))
+
+    rows = [row._mapping for row in
+            db.session.execute(stmt.order_by(*sort_keys).limit(limit + 1))]
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    next_cursor = None
+    if has_more:
+        next_cursor = _encode_cursor([rows[-1][key.key] for key in sort_keys])
+
+    if sync_cursor is not None:
+        sync_cursor = _encode_cursor([rows[-1][sort_keys[0].key] if rows else sync_cursor])
+
+    etag = _etag(fields, next_cursor, sync_cursor,
+                 [[row[key.key] for key in sort_keys] + [row[version.key]] for row in rows])
+
+    def build_body():
+        body = {
+            'data': [{name: _to_json(row[name]) for name in fields} for row in rows],
+            'next_cursor': next_cursor,
+        }
+        if sync_cursor is not None:
+            body['sync_cursor'] = sync_cursor
+        return body
+
+    return _conditional(etag, build_body, private=private)
+
+
+def _detail(model, version, *criteria, join=None, private=True):
+    """Return a single row as a conditional JSON response, or 404."""
+    fields = _requested_fields(model)
+    names = list(dict.fromkeys(fields + [version.key]))
+
+    stmt = select(*(getattr(model, name) for name in names))
+    if join is not None:
+        stmt = stmt.join(*join)
+    row = db.session.execute(stmt.where(*criteria)).first()
+    if row is None:
+        abort(404, f"{model.__name__} not found.")
+
+    row = row._mapping
+    etag = _etag(fields, row[version.key])
+    return _conditional(etag, lambda: {name: _to_json(row[name]) for name in fields},
+                        private=private)
+
+
+def _int_list(name):
+    """Return ?name=1,2,3 as a list of ints."""
+    values = [value for value in request.args.get(name, '').split(',') if value.strip()]
+    try:
+        return [int(value) for value in values]
+    except ValueError:
+        abort(400, f"{name} must be a comma-separated list of integers.")
+
+
+def _owned(model):
+    """Join and criteria limiting model rows to the logged-in user's plants."""
+    join = (UserPlant, UserPlant.user_plant_id == model.user_plant_id)
+    criteria = [UserPlant.user_id == session['user_id']]
+
+    user_plant_id = request.args.get('user_plant_id')
+    if user_plant_id:
+        if not user_plant_id.isdigit():
+            abort(400, "user_plant_id must be an integer.")
+        criteria.append(model.user_plant_id == int(user_plant_id))
+
+    return join, criteria
+
+
+@api_v1.before_request
+def require_login():
+    """Reject anonymous requests to anything but the plant catalogue."""
+    if request.endpoint not in PUBLIC_ENDPOINTS and 'user_id' not in session:
+        abort(401, "Please log in to continue.")
+
+
+@api_v1.after_request
+def compress(response):
+    """Gzip JSON responses for clients that accept it."""
+    if (response.status_code != 200 or response.direct_passthrough
+            or 'Content-Encoding' in response.headers
+            or response.mimetype != 'application/json'):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    if 'gzip' not in request.accept_encodings or response.content_length < GZIP_MIN_SIZE:
+        return response
+
+    response.set_data(gzip.compress(response.get_data(), compresslevel=6))
+    response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+
+@api_v1.errorhandler(HTTPException)
+def http_error(error):
+    """Return API errors as JSON instead of HTML pages."""
+    return jsonify({'error': error.description}), error.code
+
+
+# ----------------------------------------
+# Plants
+# ----------------------------------------
+
+@api_v1.route('/plants')
+def list_plants():
+    """List plants, oldest change first; ?since= returns only recent changes."""
+    criteria = []
+    plant_type = request.args.get('plant_type')
+    if plant_type:
+        criteria.append(Plant.plant_type == plant_type)
+
+    position = SYNC_START
+    since = _decode_cursor((Plant.last_updated,), 'since')
+    if since is not None:
+        position = since[0]
+        criteria.append(Plant.last_updated >= position - SYNC_OVERLAP)
+    after = _decode_cursor((Plant.last_updated, Plant.plant_id))
+    if after is not None:
+        position = max(position, after[0])
+
+    return _list(Plant, (Plant.last_updated, Plant.plant_id), Plant.last_updated,
+                 *criteria, private=False, sync_cursor=position)
+
+
+@api_v1.route('/plants/<int:plant_id>')
+def get_plant(plant_id):
+    """Return one plant."""
+    return _detail(Plant, Plant.last_updated, Plant.plant_id == plant_id, private=False)
+
+
+# ----------------------------------------
+# The logged-in user's collection
+# ----------------------------------------
+
+@api_v1.route('/user-plants')
+def list_user_plants():
+    """List the logged-in user's plants."""
+    return _list(UserPlant, (UserPlant.user_plant_id,), UserPlant.version,
+                 UserPlant.user_id == session['user_id'])
+
+
+@api_v1.route('/user-plants/<int:user_plant_id>')
+def get_user_plant(user_plant_id):
+    """Return one of the logged-in user's plants."""
+    return _detail(UserPlant, UserPlant.version, UserPlant.user_plant_id == user_plant_id,
+                   UserPlant.user_id == session['user_id'])
+
+
+@api_v1.route('/care-events')
+def list_care_events():
+    """List care events, optionally for one plant (?user_plant_id=)."""
+    join, criteria = _owned(CareEvent)
+    return _list(CareEvent, (CareEvent.event_id,), CareEvent.date, *criteria, join=join)
+
+
+@api_v1.route('/reminders')
+def list_reminders():
+    """List reminders, optionally for one plant (?user_plant_id=)."""
+    join, criteria = _owned(Reminder)
+    return _list(Reminder, (Reminder.reminder_id,), Reminder.version, *criteria, join=join)
+
+
+@api_v1.route('/reminders/<int:reminder_id>')
+def get_reminder(reminder_id):
+    """Return one of the logged-in user's reminders."""
+    join = (UserPlant, UserPlant.user_plant_id == Reminder.user_plant_id)
+    return _detail(Reminder, Reminder.version, Reminder.reminder_id == reminder_id,
+                   UserPlant.user_id == session['user_id'], join=join)
+
+
+# ----------------------------------------
+# Related plants
+# ----------------------------------------
+
+@api_v1.route('/related-plants')
+def related_plants():
+    """Return related plants for many plants at once.
+
+    ?plant_ids=1,2,3 names the plants; without it, the logged-in user's
+    whole collection is used. ?hops= (1-3), ?types=companion,... and
+    ?genus=1 control the traversal.
+    """
+    plant_ids = _int_list('plant_ids')
+
+    if not plant_ids:
+        if 'user_id' not in session:
+            abort(401, "Please log in or pass plant_ids.")
+        plant_ids = db.session.execute(
+            select(UserPlant.plant_id).where(UserPlant.user_id == session['user_id'])
+        ).scalars().all()
+
+    try:
+        hops = int(request.args.get('hops', 1))
+    except ValueError:
+        abort(400, "hops must be an integer.")
+    hops = max(1, min(hops, MAX_HOPS))
+
+    types = [value.strip() for value in request.args.get('types', '').split(',') if value.strip()]
+    include_genus = request.args.get('genus') in ('1', 'true')
+
+    related = get_plant_graph().related_sets(plant_ids, hops, types or None, include_genus,
+                                             limit=MAX_PAGE_SIZE)
+    return jsonify({'data': {str(plant_id): found for plant_id, found in related.items()}})
+
+
+# ----------------------------------------
+# Recommendations
+# ----------------------------------------
+
+@api_v1.route('/recommendations')
+def recommendations():
+    """Suggest plants for the logged-in user's region, favorites and collection."""
+    suggestions = recommend_plants(session['user_id'], limit=_page_size())
+    if not suggestions:
+        return jsonify({'data': []})
+
+    names = dict((plant_id, (common_name, scientific_name)) for plant_id, common_name, scientific_name
+                 in db.session.execute(
+                     select(Plant.plant_id, Plant.common_name, Plant.scientific_name)
+                     .where(Plant.plant_id.in_([plant_id for plant_id, _ in suggestions]))))
+
+    return jsonify({'data': [
+        {'plant_id': plant_id, 'score': round(score, 4),
+         'common_name': names[plant_id][0], 'scientific_name': names[plant_id][1]}
+        for plant_id, score in suggestions if plant_id in names
+    ]})
@@ -0,0 +1,27 @@
+"""Shared pytest fixtures; see testing.py."""
+
+import pytest
+
+import crud
+from testing import create_test_app, rolled_back
+
+
+@pytest.fixture(scope='session')
+def app():
+    return create_test_app()
+
+
+@pytest.fixture
+def session(app):
+    """A rolled-back db.session, inside an app context."""
+    with app.app_context(), rolled_back() as session:
+        yield session
+
+
+@pytest.fixture
+def collection(session):
+    """A user with one plant in their collection, as (user_id, plant_id, user_plant_id)."""
+    user = crud.create_user("fern", "fern@example.com", "secret")
+    plant = crud.create_plant("Monstera deliciosa", common_name="Swiss Cheese Plant")
+    user_plant = crud.create_user_plant(user.user_id, plant.plant_id, nickname="Monty")
+    return user.user_id, plant.plant_id, user_plant.user_plant_id
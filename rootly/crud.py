@@ -4,8 +4,114 @@ from model import db, connect_to_db
 from model import User, Plant, PlantCareDetails, UserPlant, CareEvent, Reminder
 from model import HealthAssessment, IdentificationHistory, PlantHealthIssue
 from model import UserFavorite, Region, PlantRegionCare, RelatedPlant
+from utils.rollups import record_care_events
+from utils.dashboard import invalidate_dashboard_summary
+from utils.page_cache import invalidate_plant_pages
+from utils.region_care import invalidate_region_care
+from utils.diagnosis import invalidate_diagnosis_index
+from utils.plant_graph import (get_plant_graph, note_related_plants, note_plants,
+                               invalidate_plant_graph)
+from utils.auth import invalidate_identity
+from utils.uploads import schedule_upload_purge
+from utils.replicas import read_replica
 from datetime import datetime, date, timedelta
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sqlalchemy import case, delete, func, insert, or_, select, tuple_, update
+from sqlalchemy.exc import IntegrityError
 import os
+import time
+
+# Days between reminders for each frequency offered in the reminder form
+REMINDER_FREQUENCY_DAYS = {
+    'daily': 1,
+    'weekly': 7,
+    'biweekly': 14,
+    'monthly': 30,
+    'seasonally': 91,
+}
+
+# Care events per page of a plant's care history
+CARE_EVENT_PAGE_SIZE = 20
+
+# Callbacks waiting for the enclosing unit_of_work to commit, or None
+_pending_after_commit = ContextVar('pending_after_commit', default=None)
+
+@contextmanager
+def unit_of_work():
+    """Group several crud calls into one transaction.
+    
+    Inside the block, helpers flush instead of committing, so generated ids
+    are still available but nothing is made durable until the block exits.
+    An exception rolls everything back. Nested blocks join the outer one.
+    """
+    
+    if _pending_after_commit.get() is not None:
+        yield db.session
+        return
+    
+    callbacks = []
+    token = _pending_after_commit.set(callbacks)
+    try:
+        yield db.session
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        _pending_after_commit.reset(token)
+    
+    for callback, args in callbacks:
+        callback(*args)
+
+def _commit():
+    """Commit, or just flush when inside a unit_of_work."""
+    if _pending_after_commit.get() is None:
+        db.session.commit()
+    else:
+        db.session.flush()
+
+def _after_commit(callback, *args):
+    """Run callback now, or once the enclosing unit_of_work commits."""
+    callbacks = _pending_after_commit.get()
+    if callbacks is None:
+        callback(*args)
+    else:
+        callbacks.append((callback, args))
+
+def _insert_many(model, rows):
+    """Insert rows with one multi-row statement and return their new ids."""
+    if not rows:
+        return []
+    
+    primary_key = model.__mapper__.primary_key[0]
+    result = db.session.execute(
+        insert(model).returning(primary_key, sort_by_parameter_order=True), rows
+    )
+    return result.scalars().all()
+
+def _invalidate_dashboard_for_user_plant(user_plant_id):
+    """Drop the cached dashboard summary of the user who owns a plant."""
+    user_id = db.session.query(UserPlant.user_id).filter(UserPlant.user_plant_id == user_plant_id).scalar()
+    
+    if user_id is not None:
+        invalidate_dashboard_summary(user_id)
+
+def _touch_plants(plant_ids):
+    """Bump Plant.last_updated so caches and syncs see changed care details."""
+    db.session.execute(update(Plant).where(Plant.plant_id.in_(set(plant_ids)))
+                       .values(last_updated=datetime.utcnow()))
+
+def _owners_of(user_plant_ids):
+    """Return {user_plant_id: user_id} for the given plants in one query."""
+    return dict(db.session.query(UserPlant.user_plant_id, UserPlant.user_id).filter(
+        UserPlant.user_plant_id.in_(set(user_plant_ids))
+    ).all())
+
+def _invalidate_dashboards(user_ids):
+    """Drop the cached dashboard summaries of several users."""
+    for user_id in set(user_ids):
+        invalidate_dashboard_summary(user_id)
 
 # ----------------------------------------
 # User operations
@@ -23,18 +129,21 @@ def create_user(username, email, password, region_id=None, preferences=None):
     user.set_password(password)
     
     db.session.add(user)
-    db.session.commit()
+    _commit()
     
     return user
 
+@read_replica()
 def get_users():
     """Return all users."""
     return User.query.all()
 
+@read_replica()
 def get_user_by_id(user_id):
     """Return a user by ID."""
     return User.query.get(user_id)
 
+@read_replica()
 def get_user_by_email(email):
     """Return a user by email."""
     return User.query.filter(User.email == email).first()
@@ -52,18 +161,27 @@ def update_user(user_id, **kwargs):
         elif hasattr(user, key):
             setattr(user, key, value)
     
-    db.session.commit()
+    _commit()
+    _after_commit(invalidate_identity, user_id)
     return user
 
 def delete_user(user_id):
-    """Delete a user."""
-    user = User.query.get(user_id)
+    """Delete a user and, through ON DELETE CASCADE, everything they own.
     
-    if not user:
+    One statement however much history the account has; their uploaded
+    images are purged in the background afterwards.
+    """
+    deleted = db.session.execute(
+        delete(User).where(User.user_id == user_id).returning(User.user_id)
+    ).scalar()
+    
+    if deleted is None:
         return False
     
-    db.session.delete(user)
-    db.session.commit()
+    _commit()
+    _after_commit(invalidate_dashboard_summary, user_id)
+    _after_commit(invalidate_identity, user_id)
+    _after_commit(schedule_upload_purge)
     return True
 
 # ----------------------------------------
@@ -95,22 +213,50 @@ def create_plant(scientific_name, common_name=None, plant_type=None, image_url=N
     )
     
     db.session.add(plant)
-    db.session.commit()
+    _commit()
+    _after_commit(invalidate_plant_pages)
+    _after_commit(note_plants, [(plant.plant_id, scientific_name)])
     
     return plant
 
+def create_plants_many(plants):
+    """Create many plants with one multi-row insert and return their ids.
+    
+    `plants` is a list of dicts keyed like create_plant's arguments.
+    """
+    
+    now = datetime.utcnow()
+    rows = [{
+        'poisonous_to_humans': False, 'poisonous_to_pets': False, 'invasive': False,
+        'rare': False, 'tropical': False, 'indoor': False, 'outdoor': False,
+        **plant,
+        'data_sources': plant.get('data_sources') or [],
+        'last_updated': now
+    } for plant in plants]
+    
+    plant_ids = _insert_many(Plant, rows)
+    _commit()
+    _after_commit(invalidate_plant_pages)
+    _after_commit(note_plants, [(plant_id, row['scientific_name']) for plant_id, row in zip(plant_ids, rows)])
+    
+    return plant_ids
+
+@read_replica()
 def get_plants():
     """Return all plants."""
     return Plant.query.all()
 
+@read_replica()
 def get_plant_by_id(plant_id):
     """Return a plant by ID."""
     return Plant.query.get(plant_id)
 
+@read_replica()
 def get_plant_by_scientific_name(scientific_name):
     """Return a plant by scientific name."""
     return Plant.query.filter(Plant.scientific_name == scientific_name).first()
 
+@read_replica()
 def search_plants(query):
     """Search for plants by name."""
     search_term = f"%{query}%"
@@ -153,18 +299,36 @@ def update_plant(plant_id, **kwargs):
             setattr(plant, key, value)
     
     plant.last_updated = datetime.utcnow()
-    db.session.commit()
+    _commit()
+    _after_commit(invalidate_plant_pages, plant_id)
+    if 'scientific_name' in kwargs:
+        _after_commit(note_plants, [(plant_id, kwargs['scientific_name'])])
     return plant
 
 def delete_plant(plant_id):
-    """Delete a plant."""
-    plant = Plant.query.get(plant_id)
+    """Delete a plant and its care details, issues, region notes and links.
+    
+    Returns False if there is no such plant, or if it is still in someone's
+    collection or identification history, which the database refuses. The
+    delete runs in a savepoint, so a refusal leaves the session (and any
+    enclosing unit_of_work) usable.
+    """
+    try:
+        with db.session.begin_nested():
+            deleted = db.session.execute(
+                delete(Plant).where(Plant.plant_id == plant_id).returning(Plant.plant_id)
+            ).scalar()
+    except IntegrityError:
+        return False
     
-    if not plant:
+    if deleted is None:
         return False
     
-    db.session.delete(plant)
-    db.session.commit()
+    _commit()
+    _after_commit(invalidate_plant_pages, plant_id)
+    _after_commit(invalidate_plant_graph)
+    _after_commit(invalidate_region_care, plant_id)
+    _after_commit(invalidate_diagnosis_index)
     return True
 
 # ----------------------------------------
@@ -199,10 +363,34 @@ def create_plant_care_details(plant_id, watering_frequency=None, watering_interv
     )
     
     db.session.add(care_details)
-    db.session.commit()
+    _touch_plants([plant_id])
+    _commit()
+    _after_commit(invalidate_plant_pages, plant_id)
+    _after_commit(invalidate_region_care, plant_id)
     
     return care_details
 
+def create_plant_care_details_many(care_details):
+    """Create care details for many plants at once and return their ids."""
+    
+    rows = [{
+        'sunlight_duration_unit': 'hours',
+        **details,
+        'sunlight_requirements': details.get('sunlight_requirements') or [],
+        'pruning_months': details.get('pruning_months') or [],
+        'propagation_methods': details.get('propagation_methods') or []
+    } for details in care_details]
+    
+    care_ids = _insert_many(PlantCareDetails, rows)
+    _touch_plants([row['plant_id'] for row in rows])
+    _commit()
+    _after_commit(invalidate_plant_pages, *[row['plant_id'] for row in rows])
+    for row in rows:
+        _after_commit(invalidate_region_care, row['plant_id'])
+    
+    return care_ids
+
+@read_replica()
 def get_care_details_by_plant_id(plant_id):
     """Return care details for a specific plant."""
     return PlantCareDetails.query.filter(PlantCareDetails.plant_id == plant_id).first()
@@ -218,7 +406,10 @@ def update_plant_care_details(plant_id, **kwargs):
         if hasattr(care_details, key):
             setattr(care_details, key, value)
     
-    db.session.commit()
+    _touch_plants([plant_id])
+    _commit()
+    _after_commit(invalidate_plant_pages, plant_id)
+    _after_commit(invalidate_region_care, plant_id)
     return care_details
 
 # ----------------------------------------
@@ -241,14 +432,36 @@ def create_user_plant(user_id, plant_id, nickname=None, location_in_home=None,
     )
     
     db.session.add(user_plant)
-    db.session.commit()
+    _commit()
+    _after_commit(invalidate_dashboard_summary, user_id)
     
     return user_plant
 
+def create_user_plants_many(user_plants):
+    """Add many plants to users' collections at once and return their ids.
+    
+    `user_plants` is a list of dicts keyed like create_user_plant's arguments.
+    """
+    
+    today = date.today()
+    rows = [{
+        'status': 'active',
+        **user_plant,
+        'acquisition_date': user_plant.get('acquisition_date') or today
+    } for user_plant in user_plants]
+    
+    user_plant_ids = _insert_many(UserPlant, rows)
+    _commit()
+    _after_commit(_invalidate_dashboards, [row['user_id'] for row in rows])
+    
+    return user_plant_ids
+
+@read_replica()
 def get_user_plants(user_id):
     """Return all plants for a specific user."""
     return UserPlant.query.filter(UserPlant.user_id == user_id).all()
 
+@read_replica()
 def get_user_plant_by_id(user_plant_id):
     """Return a specific user plant by ID."""
     return UserPlant.query.get(user_plant_id)
@@ -264,18 +477,27 @@ def update_user_plant(user_plant_id, **kwargs):
         if hasattr(user_plant, key):
             setattr(user_plant, key, value)
     
-    db.session.commit()
+    _commit()
+    _after_commit(invalidate_dashboard_summary, user_plant.user_id)
     return user_plant
 
 def delete_user_plant(user_plant_id):
-    """Delete a user's plant."""
-    user_plant = UserPlant.query.get(user_plant_id)
+    """Delete a user's plant with its care history, reminders and assessments.
     
-    if not user_plant:
+    Identifications of it are kept but unlinked. Its images are purged in
+    the background.
+    """
+    user_id = db.session.execute(
+        delete(UserPlant).where(UserPlant.user_plant_id == user_plant_id)
+        .returning(UserPlant.user_id)
+    ).scalar()
+    
+    if user_id is None:
         return False
     
-    db.session.delete(user_plant)
-    db.session.commit()
+    _commit()
+    _after_commit(invalidate_dashboard_summary, user_id)
+    _after_commit(schedule_upload_purge)
     return True
 
 # ----------------------------------------
@@ -293,14 +515,114 @@ def create_care_event(user_plant_id, event_type, notes=None, date=None):
     )
     
     db.session.add(care_event)
-    db.session.commit()
+    
+    user_id = db.session.query(UserPlant.user_id).filter(UserPlant.user_plant_id == user_plant_id).scalar()
+    record_care_events([(user_id, user_plant_id, event_type, care_event.date)])
+    
+    _commit()
+    _after_commit(invalidate_dashboard_summary, user_id)
     
     return care_event
 
+def create_care_events_many(care_events):
+    """Create many care events at once and return their ids.
+    
+    `care_events` is a list of dicts with user_plant_id, event_type and
+    optionally notes and date. Rollups are updated in the same transaction.
+    """
+    
+    now = datetime.utcnow()
+    rows = [{'notes': None, **event, 'date': event.get('date') or now} for event in care_events]
+    owners = _owners_of(row['user_plant_id'] for row in rows)
+    
+    event_ids = _insert_many(CareEvent, rows)
+    record_care_events([
+        (owners[row['user_plant_id']], row['user_plant_id'], row['event_type'], row['date'])
+        for row in rows
+    ])
+    _commit()
+    _after_commit(_invalidate_dashboards, owners.values())
+    
+    return event_ids
+
+def bulk_log_care(user_id, event_type, user_plant_ids=None, location_in_home=None,
+                  notes=None, date=None):
+    """Log one care event for many of a user's plants at once.
+    
+    Plants are picked by id, by location_in_home, or both. Ownership is
+    checked in a single query, events are written with one multi-row insert,
+    and matching active reminders are pushed forward, all in one transaction.
+    Returns the ids of the plants that were logged.
+    """
+    
+    filters = []
+    if user_plant_ids:
+        filters.append(UserPlant.user_plant_id.in_([int(user_plant_id) for user_plant_id in user_plant_ids]))
+    if location_in_home:
+        filters.append(UserPlant.location_in_home == location_in_home)
+    
+    if not filters:
+        return []
+    
+    owned_ids = db.session.execute(
+        db.select(UserPlant.user_plant_id).where(UserPlant.user_id == user_id, or_(*filters))
+    ).scalars().all()
+    
+    if not owned_ids:
+        return []
+    
+    when = date or datetime.utcnow()
+    db.session.execute(insert(CareEvent), [
+        {'user_plant_id': user_plant_id, 'event_type': event_type, 'date': when, 'notes': notes}
+        for user_plant_id in owned_ids
+    ])
+    
+    # Push matching reminders forward to their next due date
+    next_dates = {frequency: when.date() + timedelta(days=days)
+                  for frequency, days in REMINDER_FREQUENCY_DAYS.items()}
+    db.session.execute(
+        update(Reminder)
+        .where(Reminder.user_plant_id.in_(owned_ids),
+               Reminder.is_active == True,
+               func.lower(Reminder.reminder_type) == (event_type or '').lower(),
+               func.lower(Reminder.frequency).in_(next_dates))
+        .values(next_reminder_date=case(next_dates, value=func.lower(Reminder.frequency)),
+                version=Reminder.version + 1)
+    )
+    
+    record_care_events([(user_id, user_plant_id, event_type, when) for user_plant_id in owned_ids])
+    
+    _commit()
+    _after_commit(invalidate_dashboard_summary, user_id)
+    
+    return owned_ids
+
+@read_replica()
 def get_care_events_by_user_plant(user_plant_id):
     """Return all care events for a specific user plant."""
     return CareEvent.query.filter(CareEvent.user_plant_id == user_plant_id).order_by(CareEvent.date.desc()).all()
 
+@read_replica()
+def get_care_event_page(user_plant_id, before_event_id=None, limit=CARE_EVENT_PAGE_SIZE):
+    """Return up to limit care events for a plant, newest first, and whether more remain.
+
+    Pass the event_id of the last event shown as before_event_id to get the
+    next page. Pages are fetched by keyset on (date, event_id), so an old
+    page costs the same as the first.
+    """
+    query = CareEvent.query.filter(CareEvent.user_plant_id == user_plant_id)
+    if before_event_id is not None:
+        before_date = (select(CareEvent.date)
+                       .where(CareEvent.event_id == before_event_id,
+                              CareEvent.user_plant_id == user_plant_id)
+                       .scalar_subquery())
+        query = query.filter(tuple_(CareEvent.date, CareEvent.event_id)
+                             < tuple_(before_date, before_event_id))
+
+    events = query.order_by(CareEvent.date.desc(), CareEvent.event_id.desc()).limit(limit + 1).all()
+    return events[:limit], len(events) > limit
+
+@read_replica()
 def get_recent_care_events(user_id, days=30):
     """Return recent care events for a user."""
     since_date = datetime.utcnow() - timedelta(days=days)
@@ -326,14 +648,33 @@ def create_reminder(user_plant_id, reminder_type, frequency, next_reminder_date=
     )
     
     db.session.add(reminder)
-    db.session.commit()
+    _commit()
+    _after_commit(_invalidate_dashboard_for_user_plant, user_plant_id)
     
     return reminder
 
+def create_reminders_many(reminders):
+    """Create many reminders at once and return their ids."""
+    
+    today = date.today()
+    rows = [{
+        'is_active': True,
+        **reminder,
+        'next_reminder_date': reminder.get('next_reminder_date') or today
+    } for reminder in reminders]
+    
+    reminder_ids = _insert_many(Reminder, rows)
+    _commit()
+    _after_commit(_invalidate_dashboards, _owners_of(row['user_plant_id'] for row in rows).values())
+    
+    return reminder_ids
+
+@read_replica()
 def get_reminders_by_user_plant(user_plant_id):
     """Return all reminders for a specific user plant."""
     return Reminder.query.filter(Reminder.user_plant_id == user_plant_id).all()
 
+@read_replica()
 def get_upcoming_reminders(user_id, days=7):
     """Return upcoming reminders for a user."""
     end_date = date.today() + timedelta(days=days)
@@ -355,7 +696,8 @@ def update_reminder(reminder_id, **kwargs):
         if hasattr(reminder, key):
             setattr(reminder, key, value)
     
-    db.session.commit()
+    _commit()
+    _after_commit(_invalidate_dashboard_for_user_plant, reminder.user_plant_id)
     return reminder
 
 # ----------------------------------------
@@ -377,10 +719,12 @@ def create_health_assessment(user_plant_id, symptoms=None, diagnosis=None,
     )
     
     db.session.add(assessment)
-    db.session.commit()
+    _commit()
+    _after_commit(_invalidate_dashboard_for_user_plant, user_plant_id)
     
     return assessment
 
+@read_replica()
 def get_health_assessments_by_user_plant(user_plant_id):
     """Return all health assessments for a specific user plant."""
     return HealthAssessment.query.filter(HealthAssessment.user_plant_id == user_plant_id).order_by(HealthAssessment.assessment_date.desc()).all()
@@ -396,7 +740,8 @@ def update_health_assessment(assessment_id, **kwargs):
         if hasattr(assessment, key):
             setattr(assessment, key, value)
     
-    db.session.commit()
+    _commit()
+    _after_commit(_invalidate_dashboard_for_user_plant, assessment.user_plant_id)
     return assessment
 
 # ----------------------------------------
@@ -418,10 +763,29 @@ def create_identification(user_id, image_url, identified_plant_id,
     )
     
     db.session.add(identification)
-    db.session.commit()
+    _commit()
+    _after_commit(invalidate_dashboard_summary, user_id)
     
     return identification
 
+def create_identifications_many(identifications):
+    """Create many identification records at once and return their ids."""
+    
+    now = datetime.utcnow()
+    rows = [{
+        'user_plant_id': None,
+        'added_to_collection': False,
+        **identification,
+        'identified_at': identification.get('identified_at') or now
+    } for identification in identifications]
+    
+    identification_ids = _insert_many(IdentificationHistory, rows)
+    _commit()
+    _after_commit(_invalidate_dashboards, [row['user_id'] for row in rows])
+    
+    return identification_ids
+
+@read_replica()
 def get_identifications_by_user(user_id):
     """Return all identifications for a specific user."""
     return IdentificationHistory.query.filter(IdentificationHistory.user_id == user_id).order_by(IdentificationHistory.identified_at.desc()).all()
@@ -437,7 +801,7 @@ def update_identification(identification_id, **kwargs):
         if hasattr(identification, key):
             setattr(identification, key, value)
     
-    db.session.commit()
+    _commit()
     return identification
 
 # ----------------------------------------
@@ -458,10 +822,12 @@ def create_plant_health_issue(plant_id, issue_name, symptoms=None,
     )
     
     db.session.add(health_issue)
-    db.session.commit()
+    _commit()
+    _after_commit(invalidate_diagnosis_index)
     
     return health_issue
 
+@read_replica()
 def get_health_issues_by_plant(plant_id):
     """Return all health issues for a specific plant."""
     return PlantHealthIssue.query.filter(PlantHealthIssue.plant_id == plant_id).all()
@@ -489,10 +855,11 @@ def create_user_favorite(user_id, plant_id):
     )
     
     db.session.add(favorite)
-    db.session.commit()
+    _commit()
     
     return favorite
 
+@read_replica()
 def get_user_favorites(user_id):
     """Return all favorites for a specific user."""
     return UserFavorite.query.filter(UserFavorite.user_id == user_id).all()
@@ -508,7 +875,7 @@ def delete_user_favorite(user_id, plant_id):
         return False
     
     db.session.delete(favorite)
-    db.session.commit()
+    _commit()
     return True
 
 # ----------------------------------------
@@ -526,14 +893,16 @@ def create_region(name, climate_zone=None, avg_temperature=None, humidity_level=
     )
     
     db.session.add(region)
-    db.session.commit()
+    _commit()
     
     return region
 
+@read_replica()
 def get_regions():
     """Return all regions."""
     return Region.query.all()
 
+@read_replica()
 def get_region_by_id(region_id):
     """Return a region by ID."""
     return Region.query.get(region_id)
@@ -555,10 +924,12 @@ def create_plant_region_care(plant_id, region_id, watering_frequency=None,
     )
     
     db.session.add(plant_region_care)
-    db.session.commit()
+    _commit()
+    _after_commit(invalidate_region_care, plant_id, region_id)
     
     return plant_region_care
 
+@read_replica()
 def get_plant_region_care(plant_id, region_id):
     """Return region-specific care for a plant."""
     return PlantRegionCare.query.filter(
@@ -590,36 +961,28 @@ def create_related_plants(plant_id_1, plant_id_2, relationship_type, notes=None)
     )
     
     db.session.add(related_plant)
-    db.session.commit()
+    _commit()
+    _after_commit(note_related_plants, related_plant.related_id, plant_id_1, plant_id_2,
+                  relationship_type, notes)
     
     return related_plant
 
-def get_related_plants(plant_id):
-    """Return all plants related to a specific plant."""
-    
-    related_as_1 = RelatedPlant.query.filter(RelatedPlant.plant_id_1 == plant_id).all()
-    related_as_2 = RelatedPlant.query.filter(RelatedPlant.plant_id_2 == plant_id).all()
-    
-    # Combine both sets of relationships
-    related_plants = []
+@read_replica()
+def get_related_plants(plant_id, relationship_types=None):
+    """Return all plants related to a specific plant, from the in-memory graph."""
     
-    for relation in related_as_1:
-        related_plants.append({
-            'related_id': relation.related_id,
-            'plant_id': relation.plant_id_2,
-            'relationship_type': relation.relationship_type,
-            'notes': relation.notes
-        })
-    
-    for relation in related_as_2:
-        related_plants.append({
-            'related_id': relation.related_id,
-            'plant_id': relation.plant_id_1,
-            'relationship_type': relation.relationship_type,
-            'notes': relation.notes
-        })
+    return [{
+        'related_id': edge.related_id,
+        'plant_id': edge.plant_id,
+        'relationship_type': edge.relationship_type,
+        'notes': edge.notes
+    } for edge in get_plant_graph().neighbors(plant_id, relationship_types)]
+
+@read_replica()
+def get_related_plants_within(plant_id, hops=2, relationship_types=None, include_genus=False):
+    """Return plants up to `hops` relationships away, e.g. companions of companions."""
     
-    return related_plants
+    return get_plant_graph().traverse(plant_id, hops, relationship_types, include_genus)
 
 # ----------------------------------------
 # Test functions
@@ -739,10 +1102,73 @@ def run_crud_tests():
     return True
 
 
+def run_crud_benchmark(n=500):
+    """Compare rows per second for commit-per-call, unit_of_work and _many.
+    
+    Logs n care events on a throwaway user's plant each way, then removes
+    everything it created.
+    """
+    
+    from model import UserPlantCareSummary, UserCareDaily
+    
+    stamp = int(time.time() * 1000)
+    user = create_user(f"bench{stamp}", f"bench{stamp}@example.com", "benchmark")
+    plant = create_plant(f"Benchmarkia {stamp}")
+    user_plant = create_user_plant(user.user_id, plant.plant_id)
+    user_plant_id = user_plant.user_plant_id
+    
+    def per_call():
+        for i in range(n):
+            create_care_event(user_plant_id, 'watering', notes=f"bench {i}")
+    
+    def grouped():
+        with unit_of_work():
+            for i in range(n):
+                create_care_event(user_plant_id, 'watering', notes=f"bench {i}")
+    
+    def batched():
+        create_care_events_many([
+            {'user_plant_id': user_plant_id, 'event_type': 'watering', 'notes': f"bench {i}"}
+            for i in range(n)
+        ])
+    
+    results = []
+    try:
+        for label, run in [('commit per call', per_call), ('unit_of_work', grouped), ('_many', batched)]:
+            start = time.perf_counter()
+            run()
+            elapsed = time.perf_counter() - start
+            results.append((label, n / elapsed))
+    finally:
+        db.session.rollback()
+        with unit_of_work():
+            db.session.execute(delete(CareEvent).where(CareEvent.user_plant_id == user_plant_id))
+            db.session.execute(delete(UserPlantCareSummary).where(UserPlantCareSummary.user_plant_id == user_plant_id))
+            db.session.execute(delete(UserCareDaily).where(UserCareDaily.user_id == user.user_id))
+            db.session.execute(delete(UserPlant).where(UserPlant.user_plant_id == user_plant_id))
+            db.session.execute(delete(Plant).where(Plant.plant_id == plant.plant_id))
+            db.session.execute(delete(User).where(User.user_id == user.user_id))
+    
+    print(f"{'path':<16}  {'rows/sec':>10}")
+    for label, rate in results:
+        print(f"{label:<16}  {rate:>10.1f}")
+    
+    return results
+
+
+
 if __name__ == "__main__":
-    """Run CRUD tests when executed directly."""
+    """Run CRUD tests when executed directly.
+    
+    python crud.py benchmark [n] compares the commit-per-call and batch paths.
+    """
     
+    import sys
     from server import app
-    connect_to_db(app)
+    connect_to_db(app, echo=False)
     
-    run_crud_tests()
\ No newline at end of file
+    with app.app_context():
+        if sys.argv[1:2] == ['benchmark']:
+            run_crud_benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else 500)
+        else:
+            run_crud_tests()
@@ -0,0 +1,186 @@
+"""Versioned schema migrations for Rootly.
+
+Migrations are plain SQL files in migrations/, applied in filename order and
+recorded in the schema_migrations table. A file whose first line is
+``-- migrate:no-transaction`` runs statement by statement in autocommit mode,
+which CREATE INDEX CONCURRENTLY needs.
+
+    python migrate.py            # apply pending migrations
+    python migrate.py status     # list applied and pending migrations
+    python migrate.py check      # EXPLAIN every crud query and fail on seq scans
+"""
+
+import os
+import re
+import sys
+
+from sqlalchemy import event, text
+
+from model import db, connect_to_db
+from utils.replicas import use_primary
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+NO_TRANSACTION = '-- migrate:no-transaction'
+
+
+def get_migrations():
+    """Return (version, path) for every migration file, oldest first."""
+    migrations = []
+    for filename in sorted(os.listdir(MIGRATIONS_DIR)):
+        if filename.endswith('.sql'):
+            version = filename.rsplit('.', 1)[0]
+            migrations.append((version, os.path.join(MIGRATIONS_DIR, filename)))
+    return migrations
+
+
+def split_statements(sql):
+    """Split a migration file into statements, dropping comment-only chunks."""
+    statements = []
+    for chunk in re.split(r';\s*(?:\n|$)', sql):
+        lines = [line for line in chunk.splitlines() if not line.strip().startswith('--')]
+        statement = '\n'.join(lines).strip()
+        if statement:
+            statements.append(statement)
+    return statements
+
+
+def ensure_migrations_table():
+    """Create the schema_migrations bookkeeping table if needed."""
+    with db.engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            " version VARCHAR(255) PRIMARY KEY,"
+            " applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+        ))
+
+
+def get_applied_versions():
+    """Return the set of migration versions already applied."""
+    ensure_migrations_table()
+    with db.engine.connect() as conn:
+        return set(conn.execute(text("SELECT version FROM schema_migrations")).scalars())
+
+
+def apply_migration(version, path):
+    """Apply one migration file and record it."""
+    with open(path) as f:
+        sql = f.read()
+
+    record = text("INSERT INTO schema_migrations (version) VALUES (:version)")
+
+    if sql.lstrip().startswith(NO_TRANSACTION):
+        with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            for statement in split_statements(sql):
+                conn.exec_driver_sql(statement)
+            conn.execute(record, {'version': version})
+    else:
+        with db.engine.begin() as conn:
+            for statement in split_statements(sql):
+                conn.exec_driver_sql(statement)
+            conn.execute(record, {'version': version})
+
+
+def upgrade():
+    """Apply every pending migration and return their versions."""
+    applied = get_applied_versions()
+    pending = [(version, path) for version, path in get_migrations() if version not in applied]
+
+    for version, path in pending:
+        print(f"Applying {version}...")
+        apply_migration(version, path)
+
+    return [version for version, _ in pending]
+
+
+def status():
+    """Return (version, applied) for every migration."""
+    applied = get_applied_versions()
+    return [(version, version in applied) for version, _ in get_migrations()]
+
+
+def _index_checks():
+    """Crud getters whose queries must be served by an index."""
+    import crud
+
+    return [
+        ('get_user_by_email', lambda: crud.get_user_by_email('check@example.com')),
+        ('get_plant_by_scientific_name', lambda: crud.get_plant_by_scientific_name('Checkus plantus')),
+        ('get_care_details_by_plant_id', lambda: crud.get_care_details_by_plant_id(1)),
+        ('get_user_plants', lambda: crud.get_user_plants(1)),
+        ('get_care_events_by_user_plant', lambda: crud.get_care_events_by_user_plant(1)),
+        ('get_recent_care_events', lambda: crud.get_recent_care_events(1)),
+        ('get_reminders_by_user_plant', lambda: crud.get_reminders_by_user_plant(1)),
+        ('get_upcoming_reminders', lambda: crud.get_upcoming_reminders(1)),
+        ('get_health_assessments_by_user_plant', lambda: crud.get_health_assessments_by_user_plant(1)),
+        ('get_identifications_by_user', lambda: crud.get_identifications_by_user(1)),
+        ('get_health_issues_by_plant', lambda: crud.get_health_issues_by_plant(1)),
+        ('get_user_favorites', lambda: crud.get_user_favorites(1)),
+        ('get_plant_region_care', lambda: crud.get_plant_region_care(1, 1)),
+    ]
+
+
+def check_indexes():
+    """EXPLAIN the SQL each crud getter emits and report any sequential scans.
+
+    Sequential scans are disabled for the check so the planner picks an
+    index whenever one can serve the query, even on tiny tables; a Seq Scan
+    left in the plan therefore means no usable index exists. The getters
+    run against the primary, whose engine is the one listened to, and a
+    getter that emitted no SQL at all fails too.
+
+    Returns a list of (name, ok, plan) tuples.
+    """
+    results = []
+
+    for name, run_query in _index_checks():
+        captured = []
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            captured.append((statement, parameters))
+
+        event.listen(db.engine, 'before_cursor_execute', capture)
+        try:
+            with use_primary():
+                run_query()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', capture)
+            db.session.rollback()
+
+        plans = []
+        with db.engine.connect() as conn:
+            conn.exec_driver_sql("SET enable_seqscan = off")
+            for statement, parameters in captured:
+                rows = conn.exec_driver_sql("EXPLAIN " + statement, parameters)
+                plans.append('\n'.join(row[0] for row in rows))
+            conn.rollback()
+
+        plan = '\n\n'.join(plans) or "(no SQL was captured)"
+        results.append((name, bool(plans) and 'Seq Scan' not in plan, plan))
+
+    return results
+
+
+if __name__ == "__main__":
+    from server import app
+
+    connect_to_db(app, echo=False)
+    command = sys.argv[1] if len(sys.argv) > 1 else 'upgrade'
+
+    with app.app_context():
+        if command == 'upgrade':
+            applied = upgrade()
+            print(f"Applied {len(applied)} migration(s).")
+        elif command == 'status':
+            for version, applied in status():
+                print(f"[{'x' if applied else ' '}] {version}")
+        elif command == 'check':
+            failures = 0
+            for name, ok, plan in check_indexes():
+                print(f"{'ok  ' if ok else 'FAIL'} {name}")
+                if not ok:
+                    failures += 1
+                    print(plan)
+            sys.exit(1 if failures else 0)
+        else:
+            print(__doc__)
+            sys.exit(2)
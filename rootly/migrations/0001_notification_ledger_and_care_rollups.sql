@@ -0,0 +1,33 @@
+-- Tables added for reminder digests and care-event rollups.
+-- Databases created with db.create_all() after these models existed
+-- already have them, hence IF NOT EXISTS.
+
+CREATE TABLE IF NOT EXISTS notification_ledger (
+    ledger_id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users (user_id),
+    digest_date DATE NOT NULL,
+    status VARCHAR(20),
+    reminder_count INTEGER,
+    sent_at TIMESTAMP WITHOUT TIME ZONE,
+    UNIQUE (user_id, digest_date)
+);
+
+CREATE TABLE IF NOT EXISTS user_plant_care_summaries (
+    user_plant_id INTEGER PRIMARY KEY REFERENCES user_plants (user_plant_id),
+    event_count INTEGER NOT NULL,
+    watering_count INTEGER NOT NULL,
+    last_event_at TIMESTAMP WITHOUT TIME ZONE,
+    last_watered_at TIMESTAMP WITHOUT TIME ZONE,
+    last_care_day DATE,
+    current_streak INTEGER NOT NULL,
+    longest_streak INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS user_care_daily (
+    user_id INTEGER NOT NULL REFERENCES users (user_id),
+    day DATE NOT NULL,
+    event_count INTEGER NOT NULL,
+    watering_count INTEGER NOT NULL,
+    streak INTEGER NOT NULL,
+    PRIMARY KEY (user_id, day)
+);
@@ -0,0 +1,48 @@
+-- migrate:no-transaction
+-- Indexes for every foreign-key filter in crud.py. Built CONCURRENTLY so
+-- they can be added to a live database without blocking writes.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_user_plants_user_id
+    ON user_plants (user_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_care_events_user_plant_id_date
+    ON care_events (user_plant_id, date);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_reminders_user_plant_id_next_date
+    ON reminders (user_plant_id, next_reminder_date);
+
+-- Only active reminders are ever due, so leave inactive ones out
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_reminders_active_next_date
+    ON reminders (next_reminder_date) WHERE is_active = true;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_health_assessments_user_plant_id_date
+    ON health_assessments (user_plant_id, assessment_date);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_identification_history_user_id_identified_at
+    ON identification_history (user_id, identified_at);
+
+-- create_user_favorite already refuses duplicates; drop any strays so the
+-- unique index can be built
+DELETE FROM user_favorites a
+    USING user_favorites b
+    WHERE a.user_id = b.user_id
+      AND a.plant_id = b.plant_id
+      AND a.favorite_id > b.favorite_id;
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS ix_user_favorites_user_id_plant_id
+    ON user_favorites (user_id, plant_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_plant_care_details_plant_id
+    ON plant_care_details (plant_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_plant_health_issues_plant_id
+    ON plant_health_issues (plant_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_plant_region_care_plant_id_region_id
+    ON plant_region_care (plant_id, region_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_related_plants_plant_id_1
+    ON related_plants (plant_id_1);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_related_plants_plant_id_2
+    ON related_plants (plant_id_2);
@@ -0,0 +1,11 @@
+-- Row versions for user_plants and reminders, bumped by SQLAlchemy on every
+-- ORM update (version_id_col), and a keyset index for syncing plants by
+-- last_updated. The /api/v1 ETags are derived from these.
+
+ALTER TABLE user_plants ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1;
+
+ALTER TABLE reminders ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1;
+
+UPDATE plants SET last_updated = now() WHERE last_updated IS NULL;
+
+CREATE INDEX IF NOT EXISTS ix_plants_last_updated_plant_id ON plants (last_updated, plant_id);
@@ -0,0 +1,5 @@
+-- Next watering date per user plant, filled in nightly by
+-- utils/watering_schedule.py from species interval, region climate and the
+-- last watering.
+
+ALTER TABLE user_plants ADD COLUMN IF NOT EXISTS next_watering_date DATE;
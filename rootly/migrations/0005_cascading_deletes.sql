@@ -0,0 +1,78 @@
+-- Let the database remove dependent rows, so deleting a user, plant or
+-- collection entry is one statement however much history hangs off it.
+-- Collection entries and identifications keep their catalogue plant
+-- (user_plants.plant_id and identification_history.identified_plant_id
+-- stay NO ACTION), so a plant someone owns cannot be deleted by accident.
+-- Constraint names are the PostgreSQL defaults used by db.create_all().
+
+ALTER TABLE users
+    DROP CONSTRAINT IF EXISTS users_region_id_fkey,
+    ADD CONSTRAINT users_region_id_fkey FOREIGN KEY (region_id) REFERENCES regions (region_id) ON DELETE SET NULL;
+
+ALTER TABLE plant_care_details
+    DROP CONSTRAINT IF EXISTS plant_care_details_plant_id_fkey,
+    ADD CONSTRAINT plant_care_details_plant_id_fkey FOREIGN KEY (plant_id) REFERENCES plants (plant_id) ON DELETE CASCADE;
+
+ALTER TABLE plant_health_issues
+    DROP CONSTRAINT IF EXISTS plant_health_issues_plant_id_fkey,
+    ADD CONSTRAINT plant_health_issues_plant_id_fkey FOREIGN KEY (plant_id) REFERENCES plants (plant_id) ON DELETE CASCADE;
+
+ALTER TABLE plant_region_care
+    DROP CONSTRAINT IF EXISTS plant_region_care_plant_id_fkey,
+    ADD CONSTRAINT plant_region_care_plant_id_fkey FOREIGN KEY (plant_id) REFERENCES plants (plant_id) ON DELETE CASCADE;
+
+ALTER TABLE plant_region_care
+    DROP CONSTRAINT IF EXISTS plant_region_care_region_id_fkey,
+    ADD CONSTRAINT plant_region_care_region_id_fkey FOREIGN KEY (region_id) REFERENCES regions (region_id) ON DELETE CASCADE;
+
+ALTER TABLE related_plants
+    DROP CONSTRAINT IF EXISTS related_plants_plant_id_1_fkey,
+    ADD CONSTRAINT related_plants_plant_id_1_fkey FOREIGN KEY (plant_id_1) REFERENCES plants (plant_id) ON DELETE CASCADE;
+
+ALTER TABLE related_plants
+    DROP CONSTRAINT IF EXISTS related_plants_plant_id_2_fkey,
+    ADD CONSTRAINT related_plants_plant_id_2_fkey FOREIGN KEY (plant_id_2) REFERENCES plants (plant_id) ON DELETE CASCADE;
+
+ALTER TABLE user_favorites
+    DROP CONSTRAINT IF EXISTS user_favorites_plant_id_fkey,
+    ADD CONSTRAINT user_favorites_plant_id_fkey FOREIGN KEY (plant_id) REFERENCES plants (plant_id) ON DELETE CASCADE;
+
+ALTER TABLE user_plants
+    DROP CONSTRAINT IF EXISTS user_plants_user_id_fkey,
+    ADD CONSTRAINT user_plants_user_id_fkey FOREIGN KEY (user_id) REFERENCES users (user_id) ON DELETE CASCADE;
+
+ALTER TABLE user_care_daily
+    DROP CONSTRAINT IF EXISTS user_care_daily_user_id_fkey,
+    ADD CONSTRAINT user_care_daily_user_id_fkey FOREIGN KEY (user_id) REFERENCES users (user_id) ON DELETE CASCADE;
+
+ALTER TABLE user_favorites
+    DROP CONSTRAINT IF EXISTS user_favorites_user_id_fkey,
+    ADD CONSTRAINT user_favorites_user_id_fkey FOREIGN KEY (user_id) REFERENCES users (user_id) ON DELETE CASCADE;
+
+ALTER TABLE identification_history
+    DROP CONSTRAINT IF EXISTS identification_history_user_id_fkey,
+    ADD CONSTRAINT identification_history_user_id_fkey FOREIGN KEY (user_id) REFERENCES users (user_id) ON DELETE CASCADE;
+
+ALTER TABLE notification_ledger
+    DROP CONSTRAINT IF EXISTS notification_ledger_user_id_fkey,
+    ADD CONSTRAINT notification_ledger_user_id_fkey FOREIGN KEY (user_id) REFERENCES users (user_id) ON DELETE CASCADE;
+
+ALTER TABLE care_events
+    DROP CONSTRAINT IF EXISTS care_events_user_plant_id_fkey,
+    ADD CONSTRAINT care_events_user_plant_id_fkey FOREIGN KEY (user_plant_id) REFERENCES user_plants (user_plant_id) ON DELETE CASCADE;
+
+ALTER TABLE user_plant_care_summaries
+    DROP CONSTRAINT IF EXISTS user_plant_care_summaries_user_plant_id_fkey,
+    ADD CONSTRAINT user_plant_care_summaries_user_plant_id_fkey FOREIGN KEY (user_plant_id) REFERENCES user_plants (user_plant_id) ON DELETE CASCADE;
+
+ALTER TABLE reminders
+    DROP CONSTRAINT IF EXISTS reminders_user_plant_id_fkey,
+    ADD CONSTRAINT reminders_user_plant_id_fkey FOREIGN KEY (user_plant_id) REFERENCES user_plants (user_plant_id) ON DELETE CASCADE;
+
+ALTER TABLE health_assessments
+    DROP CONSTRAINT IF EXISTS health_assessments_user_plant_id_fkey,
+    ADD CONSTRAINT health_assessments_user_plant_id_fkey FOREIGN KEY (user_plant_id) REFERENCES user_plants (user_plant_id) ON DELETE CASCADE;
+
+ALTER TABLE identification_history
+    DROP CONSTRAINT IF EXISTS identification_history_user_plant_id_fkey,
+    ADD CONSTRAINT identification_history_user_plant_id_fkey FOREIGN KEY (user_plant_id) REFERENCES user_plants (user_plant_id) ON DELETE SET NULL;
@@ -0,0 +1,19 @@
+-- migrate:no-transaction
+-- Indexes on the foreign keys that 0005 cascades through (or checks on
+-- delete) and that had none, so removing a user or plant never scans a
+-- whole child table.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_user_plants_plant_id
+    ON user_plants (plant_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_identification_history_user_plant_id
+    ON identification_history (user_plant_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_identification_history_identified_plant_id
+    ON identification_history (identified_plant_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_user_favorites_plant_id
+    ON user_favorites (plant_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_plant_region_care_region_id
+    ON plant_region_care (region_id);
@@ -0,0 +1,7 @@
+-- Plant.last_updated is the API's sync key, and a NULL sorts and compares
+-- outside every cursor. Backfill and forbid it.
+
+UPDATE plants SET last_updated = now() AT TIME ZONE 'utc' WHERE last_updated IS NULL;
+
+ALTER TABLE plants ALTER COLUMN last_updated SET DEFAULT (now() AT TIME ZONE 'utc');
+ALTER TABLE plants ALTER COLUMN last_updated SET NOT NULL;
@@ -0,0 +1,15 @@
+-- migrate:no-transaction
+-- Ids given to rows by the write-behind buffer (utils/write_behind.py), so a
+-- spill segment replayed after a crash skips the rows it already inserted.
+-- Rows written directly leave write_id NULL, which the unique index allows
+-- any number of times.
+
+ALTER TABLE care_events ADD COLUMN IF NOT EXISTS write_id VARCHAR(32);
+
+ALTER TABLE identification_history ADD COLUMN IF NOT EXISTS write_id VARCHAR(32);
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS ix_care_events_write_id
+    ON care_events (write_id);
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS ix_identification_history_write_id
+    ON identification_history (write_id);
@@ -0,0 +1,6 @@
+-- When a reminder digest run claimed each ledger row, so a later run can
+-- take over claims left in 'sending' by one that died (see
+-- utils/notifications.py). Claims already stuck have no claimed_at and
+-- count as stale.
+
+ALTER TABLE notification_ledger ADD COLUMN IF NOT EXISTS claimed_at TIMESTAMP WITHOUT TIME ZONE;
@@ -2,9 +2,23 @@
 
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
+import os
+import sqlite3
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import StaticPool
+from utils.passwords import hash_password, verify_password, needs_rehash
+from utils.replicas import RoutingSession, get_replica_urls, replica_binds
+
+db = SQLAlchemy(session_options={"class_": RoutingSession})
+
+DEFAULT_DATABASE_URL = "postgresql:///rootly"
+
+
+def string_array(length):
+    """A list of strings: a Postgres ARRAY, stored as JSON on SQLite."""
+    return db.ARRAY(db.String(length)).with_variant(db.JSON, 'sqlite')
 
-db = SQLAlchemy()
 
 class User(db.Model):
     """User of Rootly website."""
@@ -15,23 +29,27 @@ class User(db.Model):
     username = db.Column(db.String(50), nullable=False)
     email = db.Column(db.String(100), unique=True, nullable=False)
     password_hash = db.Column(db.String(255), nullable=False)
-    region_id = db.Column(db.Integer, db.ForeignKey('regions.region_id'), nullable=True)
+    region_id = db.Column(db.Integer, db.ForeignKey('regions.region_id', ondelete='SET NULL'), nullable=True)
     preferences = db.Column(db.JSON, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     # Relationships
-    region = db.relationship('Region', backref='users')
-    plants = db.relationship('UserPlant', backref='user')
-    favorites = db.relationship('UserFavorite', backref='user')
-    identifications = db.relationship('IdentificationHistory', backref='user')
+    region = db.relationship('Region', backref=db.backref('users', passive_deletes=True))
+    plants = db.relationship('UserPlant', backref='user', passive_deletes=True)
+    favorites = db.relationship('UserFavorite', backref='user', passive_deletes=True)
+    identifications = db.relationship('IdentificationHistory', backref='user', passive_deletes=True)
 
     def set_password(self, password):
         """Set password hash."""
-        self.password_hash = generate_password_hash(password, method='pbkdf2:sha256')
+        self.password_hash = hash_password(password)
 
     def check_password(self, password):
         """Check password."""
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
+
+    def password_needs_rehash(self):
+        """Check if the password hash was made with outdated settings."""
+        return needs_rehash(self.password_hash)
 
     def __repr__(self):
         return f"<User user_id={self.user_id} username={self.username}>"
@@ -56,15 +74,17 @@ class Plant(db.Model):
     tropical = db.Column(db.Boolean, default=False)
     indoor = db.Column(db.Boolean, default=False)
     outdoor = db.Column(db.Boolean, default=False)
-    data_sources = db.Column(db.ARRAY(db.String(50)))
-    last_updated = db.Column(db.DateTime, default=datetime.utcnow)
+    data_sources = db.Column(string_array(50))
+    last_updated = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (db.Index('ix_plants_last_updated_plant_id', 'last_updated', 'plant_id'),)
 
     # Relationships
-    care_details = db.relationship('PlantCareDetails', backref='plant', uselist=False)
+    care_details = db.relationship('PlantCareDetails', backref='plant', uselist=False, passive_deletes=True)
     user_plants = db.relationship('UserPlant', backref='plant')
-    health_issues = db.relationship('PlantHealthIssue', backref='plant')
-    favorites = db.relationship('UserFavorite', backref='plant')
-    region_care = db.relationship('PlantRegionCare', backref='plant')
+    health_issues = db.relationship('PlantHealthIssue', backref='plant', passive_deletes=True)
+    favorites = db.relationship('UserFavorite', backref='plant', passive_deletes=True)
+    region_care = db.relationship('PlantRegionCare', backref='plant', passive_deletes=True)
     identifications = db.relationship('IdentificationHistory', backref='identified_plant')
 
     def __repr__(self):
@@ -77,22 +97,24 @@ class PlantCareDetails(db.Model):
     __tablename__ = "plant_care_details"
 
     care_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    plant_id = db.Column(db.Integer, db.ForeignKey('plants.plant_id'), nullable=False)
+    plant_id = db.Column(db.Integer, db.ForeignKey('plants.plant_id', ondelete='CASCADE'), nullable=False)
     watering_frequency = db.Column(db.String(100))
     watering_interval_days = db.Column(db.Integer)
-    sunlight_requirements = db.Column(db.ARRAY(db.String(50)))
+    sunlight_requirements = db.Column(string_array(50))
     sunlight_duration_min = db.Column(db.Integer)
     sunlight_duration_max = db.Column(db.Integer)
     sunlight_duration_unit = db.Column(db.String(20), default='hours')
     soil_preferences = db.Column(db.Text)
     temperature_range = db.Column(db.String(100))
     fertilizing_schedule = db.Column(db.Text)
-    pruning_months = db.Column(db.ARRAY(db.String(20)))
+    pruning_months = db.Column(string_array(20))
     difficulty_level = db.Column(db.String(20))
     growth_rate = db.Column(db.String(20))
-    propagation_methods = db.Column(db.ARRAY(db.String(50)))
+    propagation_methods = db.Column(string_array(50))
     companion_plants = db.Column(db.Text)
 
+    __table_args__ = (db.Index('ix_plant_care_details_plant_id', 'plant_id'),)
+
     def __repr__(self):
         return f"<PlantCareDetails care_id={self.care_id} plant_id={self.plant_id}>"
 
@@ -102,7 +124,7 @@ class UserPlant(db.Model):
     __tablename__ = "user_plants"
 
     user_plant_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.user_id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.user_id', ondelete='CASCADE'), nullable=False)
     plant_id = db.Column(db.Integer, db.ForeignKey('plants.plant_id'), nullable=False)
     nickname = db.Column(db.String(100))
     location_in_home = db.Column(db.String(100))
@@ -110,12 +132,20 @@ class UserPlant(db.Model):
     image_url = db.Column(db.String(500))
     notes = db.Column(db.Text)
     status = db.Column(db.String(50))
+    next_watering_date = db.Column(db.Date)
+    version = db.Column(db.Integer, nullable=False, default=1)
+
+    __table_args__ = (
+        db.Index('ix_user_plants_user_id', 'user_id'),
+        db.Index('ix_user_plants_plant_id', 'plant_id'),
+    )
+    __mapper_args__ = {'version_id_col': version}
 
     # Relationships
-    care_events = db.relationship('CareEvent', backref='user_plant')
-    reminders = db.relationship('Reminder', backref='user_plant')
-    health_assessments = db.relationship('HealthAssessment', backref='user_plant')
-    identifications = db.relationship('IdentificationHistory', backref='user_plant')
+    care_events = db.relationship('CareEvent', backref='user_plant', passive_deletes=True)
+    reminders = db.relationship('Reminder', backref='user_plant', passive_deletes=True)
+    health_assessments = db.relationship('HealthAssessment', backref='user_plant', passive_deletes=True)
+    identifications = db.relationship('IdentificationHistory', backref='user_plant', passive_deletes=True)
 
     def __repr__(self):
         return f"<UserPlant user_plant_id={self.user_plant_id} nickname={self.nickname}>"
@@ -127,26 +157,76 @@ class CareEvent(db.Model):
     __tablename__ = "care_events"
 
     event_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    user_plant_id = db.Column(db.Integer, db.ForeignKey('user_plants.user_plant_id'), nullable=False)
+    user_plant_id = db.Column(db.Integer, db.ForeignKey('user_plants.user_plant_id', ondelete='CASCADE'), nullable=False)
     event_type = db.Column(db.String(50))
     date = db.Column(db.DateTime, default=datetime.utcnow)
     notes = db.Column(db.Text)
+    write_id = db.Column(db.String(32))
+
+    __table_args__ = (
+        db.Index('ix_care_events_user_plant_id_date', 'user_plant_id', 'date'),
+        db.Index('ix_care_events_write_id', 'write_id', unique=True),
+    )
 
     def __repr__(self):
         return f"<CareEvent event_id={self.event_id} type={self.event_type}>"
 
 
+class UserPlantCareSummary(db.Model):
+    """Running care totals for a user's plant, kept in step with care_events."""
+
+    __tablename__ = "user_plant_care_summaries"
+
+    user_plant_id = db.Column(db.Integer, db.ForeignKey('user_plants.user_plant_id', ondelete='CASCADE'), primary_key=True)
+    event_count = db.Column(db.Integer, default=0, nullable=False)
+    watering_count = db.Column(db.Integer, default=0, nullable=False)
+    last_event_at = db.Column(db.DateTime)
+    last_watered_at = db.Column(db.DateTime)
+    last_care_day = db.Column(db.Date)
+    current_streak = db.Column(db.Integer, default=0, nullable=False)
+    longest_streak = db.Column(db.Integer, default=0, nullable=False)
+
+    # Relationships
+    user_plant = db.relationship('UserPlant', backref=db.backref('care_summary', uselist=False, passive_deletes=True))
+
+    def __repr__(self):
+        return f"<UserPlantCareSummary user_plant_id={self.user_plant_id} events={self.event_count}>"
+
+
+class UserCareDaily(db.Model):
+    """Care events logged by a user on one day."""
+
+    __tablename__ = "user_care_daily"
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.user_id', ondelete='CASCADE'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    event_count = db.Column(db.Integer, default=0, nullable=False)
+    watering_count = db.Column(db.Integer, default=0, nullable=False)
+    streak = db.Column(db.Integer, default=1, nullable=False)
+
+    def __repr__(self):
+        return f"<UserCareDaily user_id={self.user_id} day={self.day} events={self.event_count}>"
+
+
 class Reminder(db.Model):
     """A reminder for plant care."""
 
     __tablename__ = "reminders"
 
     reminder_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    user_plant_id = db.Column(db.Integer, db.ForeignKey('user_plants.user_plant_id'), nullable=False)
+    user_plant_id = db.Column(db.Integer, db.ForeignKey('user_plants.user_plant_id', ondelete='CASCADE'), nullable=False)
     reminder_type = db.Column(db.String(50))
     frequency = db.Column(db.String(50))
     next_reminder_date = db.Column(db.Date)
     is_active = db.Column(db.Boolean, default=True)
+    version = db.Column(db.Integer, nullable=False, default=1)
+
+    __table_args__ = (
+        db.Index('ix_reminders_user_plant_id_next_date', 'user_plant_id', 'next_reminder_date'),
+        db.Index('ix_reminders_active_next_date', 'next_reminder_date',
+                 postgresql_where=(is_active == True), sqlite_where=(is_active == True)),
+    )
+    __mapper_args__ = {'version_id_col': version}
 
     def __repr__(self):
         return f"<Reminder reminder_id={self.reminder_id} type={self.reminder_type}>"
@@ -158,14 +238,16 @@ class HealthAssessment(db.Model):
     __tablename__ = "health_assessments"
 
     assessment_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    user_plant_id = db.Column(db.Integer, db.ForeignKey('user_plants.user_plant_id'), nullable=False)
+    user_plant_id = db.Column(db.Integer, db.ForeignKey('user_plants.user_plant_id', ondelete='CASCADE'), nullable=False)
     assessment_date = db.Column(db.DateTime, default=datetime.utcnow)
-    symptoms = db.Column(db.ARRAY(db.String(100)))
+    symptoms = db.Column(string_array(100))
     diagnosis = db.Column(db.String(255))
     treatment_recommendations = db.Column(db.Text)
     image_url = db.Column(db.String(500))
     resolved = db.Column(db.Boolean, default=False)
 
+    __table_args__ = (db.Index('ix_health_assessments_user_plant_id_date', 'user_plant_id', 'assessment_date'),)
+
     def __repr__(self):
         return f"<HealthAssessment assessment_id={self.assessment_id} diagnosis={self.diagnosis}>"
 
@@ -176,13 +258,21 @@ class IdentificationHistory(db.Model):
     __tablename__ = "identification_history"
 
     identification_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.user_id'), nullable=False)
-    user_plant_id = db.Column(db.Integer, db.ForeignKey('user_plants.user_plant_id'), nullable=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.user_id', ondelete='CASCADE'), nullable=False)
+    user_plant_id = db.Column(db.Integer, db.ForeignKey('user_plants.user_plant_id', ondelete='SET NULL'), nullable=True)
     image_url = db.Column(db.String(500))
     identified_plant_id = db.Column(db.Integer, db.ForeignKey('plants.plant_id'), nullable=False)
     confidence_score = db.Column(db.Float)
     identified_at = db.Column(db.DateTime, default=datetime.utcnow)
     added_to_collection = db.Column(db.Boolean, default=False)
+    write_id = db.Column(db.String(32))
+
+    __table_args__ = (
+        db.Index('ix_identification_history_user_id_identified_at', 'user_id', 'identified_at'),
+        db.Index('ix_identification_history_user_plant_id', 'user_plant_id'),
+        db.Index('ix_identification_history_identified_plant_id', 'identified_plant_id'),
+        db.Index('ix_identification_history_write_id', 'write_id', unique=True),
+    )
 
     def __repr__(self):
         return f"<IdentificationHistory id={self.identification_id} user_id={self.user_id}>"
@@ -194,13 +284,15 @@ class PlantHealthIssue(db.Model):
     __tablename__ = "plant_health_issues"
 
     issue_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    plant_id = db.Column(db.Integer, db.ForeignKey('plants.plant_id'), nullable=False)
+    plant_id = db.Column(db.Integer, db.ForeignKey('plants.plant_id', ondelete='CASCADE'), nullable=False)
     issue_name = db.Column(db.String(255), nullable=False)
     symptoms = db.Column(db.Text)
     treatment = db.Column(db.Text)
     prevention = db.Column(db.Text)
     severity = db.Column(db.String(50))
 
+    __table_args__ = (db.Index('ix_plant_health_issues_plant_id', 'plant_id'),)
+
     def __repr__(self):
         return f"<PlantHealthIssue issue_id={self.issue_id} name={self.issue_name}>"
 
@@ -211,10 +303,15 @@ class UserFavorite(db.Model):
     __tablename__ = "user_favorites"
 
     favorite_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.user_id'), nullable=False)
-    plant_id = db.Column(db.Integer, db.ForeignKey('plants.plant_id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.user_id', ondelete='CASCADE'), nullable=False)
+    plant_id = db.Column(db.Integer, db.ForeignKey('plants.plant_id', ondelete='CASCADE'), nullable=False)
     favorited_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index('ix_user_favorites_user_id_plant_id', 'user_id', 'plant_id', unique=True),
+        db.Index('ix_user_favorites_plant_id', 'plant_id'),
+    )
+
     def __repr__(self):
         return f"<UserFavorite favorite_id={self.favorite_id} user_id={self.user_id}>"
 
@@ -231,7 +328,7 @@ class Region(db.Model):
     humidity_level = db.Column(db.String(50))
 
     # Relationships
-    plant_region_care = db.relationship('PlantRegionCare', backref='region')
+    plant_region_care = db.relationship('PlantRegionCare', backref='region', passive_deletes=True)
 
     def __repr__(self):
         return f"<Region region_id={self.region_id} name={self.name}>"
@@ -243,12 +340,17 @@ class PlantRegionCare(db.Model):
     __tablename__ = "plant_region_care"
 
     plant_region_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    plant_id = db.Column(db.Integer, db.ForeignKey('plants.plant_id'), nullable=False)
-    region_id = db.Column(db.Integer, db.ForeignKey('regions.region_id'), nullable=False)
+    plant_id = db.Column(db.Integer, db.ForeignKey('plants.plant_id', ondelete='CASCADE'), nullable=False)
+    region_id = db.Column(db.Integer, db.ForeignKey('regions.region_id', ondelete='CASCADE'), nullable=False)
     watering_frequency = db.Column(db.String(100))
     sunlight_adjustments = db.Column(db.Text)
     seasonal_notes = db.Column(db.Text)
 
+    __table_args__ = (
+        db.Index('ix_plant_region_care_plant_id_region_id', 'plant_id', 'region_id'),
+        db.Index('ix_plant_region_care_region_id', 'region_id'),
+    )
+
     def __repr__(self):
         return f"<PlantRegionCare id={self.plant_region_id} plant_id={self.plant_id}>"
 
@@ -259,32 +361,128 @@ class RelatedPlant(db.Model):
     __tablename__ = "related_plants"
 
     related_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    plant_id_1 = db.Column(db.Integer, db.ForeignKey('plants.plant_id'), nullable=False)
-    plant_id_2 = db.Column(db.Integer, db.ForeignKey('plants.plant_id'), nullable=False)
+    plant_id_1 = db.Column(db.Integer, db.ForeignKey('plants.plant_id', ondelete='CASCADE'), nullable=False)
+    plant_id_2 = db.Column(db.Integer, db.ForeignKey('plants.plant_id', ondelete='CASCADE'), nullable=False)
     relationship_type = db.Column(db.String(100))
     notes = db.Column(db.Text)
 
+    __table_args__ = (
+        db.Index('ix_related_plants_plant_id_1', 'plant_id_1'),
+        db.Index('ix_related_plants_plant_id_2', 'plant_id_2'),
+    )
+
     # Relationships
-    plant_1 = db.relationship('Plant', foreign_keys=[plant_id_1], backref=db.backref('related_as_1', lazy='dynamic'))
-    plant_2 = db.relationship('Plant', foreign_keys=[plant_id_2], backref=db.backref('related_as_2', lazy='dynamic'))
+    plant_1 = db.relationship('Plant', foreign_keys=[plant_id_1], backref=db.backref('related_as_1', lazy='dynamic', passive_deletes=True))
+    plant_2 = db.relationship('Plant', foreign_keys=[plant_id_2], backref=db.backref('related_as_2', lazy='dynamic', passive_deletes=True))
 
     def __repr__(self):
         return f"<RelatedPlant related_id={self.related_id} type={self.relationship_type}>"
 
 
-def connect_to_db(flask_app, db_uri="postgresql:///rootly", echo=True):
-    """Connect the database to our Flask app."""
+class NotificationLedger(db.Model):
+    """Reminder digests sent to a user, one per user per day."""
+
+    __tablename__ = "notification_ledger"
+
+    ledger_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.user_id', ondelete='CASCADE'), nullable=False)
+    digest_date = db.Column(db.Date, nullable=False)
+    status = db.Column(db.String(20), default='sending')
+    reminder_count = db.Column(db.Integer, default=0)
+    sent_at = db.Column(db.DateTime)
+    claimed_at = db.Column(db.DateTime)
+
+    __table_args__ = (db.UniqueConstraint('user_id', 'digest_date'),)
+
+    def __repr__(self):
+        return f"<NotificationLedger user_id={self.user_id} date={self.digest_date} status={self.status}>"
+
+
+def get_database_url():
+    """The database to use: DATABASE_URL, or the local rootly database."""
+    url = os.environ.get("DATABASE_URL", DEFAULT_DATABASE_URL)
+    if url.startswith("postgres://"):
+        url = "postgresql://" + url[len("postgres://"):]
+    return url
+
+
+def is_memory_database(url):
+    """Whether url names an in-memory SQLite database."""
+    url = make_url(url)
+    return (url.get_backend_name() == "sqlite"
+            and (url.database in (None, "", ":memory:") or url.query.get("mode") == "memory"))
+
+
+def get_engine_options(db_uri=None):
+    """Connection pool settings, overridable with DB_POOL_* environment variables.
+
+    SQLite gets none of them. An in-memory database lives only as long as its
+    connection, so every session shares one connection through a StaticPool.
+    """
+
+    db_uri = db_uri or get_database_url()
+    if make_url(db_uri).get_backend_name() == "sqlite":
+        options = {"connect_args": {"check_same_thread": False}}
+        if is_memory_database(db_uri):
+            options["poolclass"] = StaticPool
+        return options
+
+    return {
+        "pool_size": int(os.environ.get("DB_POOL_SIZE", 5)),
+        "max_overflow": int(os.environ.get("DB_MAX_OVERFLOW", 10)),
+        "pool_timeout": float(os.environ.get("DB_POOL_TIMEOUT", 30)),
+        "pool_recycle": int(os.environ.get("DB_POOL_RECYCLE", 1800)),
+        "pool_pre_ping": True,
+    }
+
+
+@event.listens_for(Engine, "connect")
+def _configure_sqlite(dbapi_connection, connection_record):
+    """Turn on SQLite foreign keys (and so ON DELETE CASCADE), which are off by default.
+
+    The sqlite3 module's own transaction handling is switched off, so that
+    SQLAlchemy's BEGIN and SAVEPOINT statements mean what they say. Database
+    files use write-ahead logging, so an open read (such as the reminder
+    dispatcher's streaming query) does not stop another connection from
+    committing; in-memory databases ignore it.
+    """
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        dbapi_connection.isolation_level = None
+        dbapi_connection.execute("PRAGMA foreign_keys=ON")
+        dbapi_connection.execute("PRAGMA journal_mode=WAL")
+
+
+@event.listens_for(Engine, "begin")
+def _begin_sqlite(conn):
+    if conn.dialect.name == "sqlite":
+        conn.exec_driver_sql("BEGIN")
+
+
+def connect_to_db(flask_app, db_uri=None, echo=False, replica_uris=None):
+    """Connect the database to our Flask app.
+
+    db_uri defaults to the DATABASE_URL environment variable, then to the
+    local rootly Postgres database. replica_uris defaults to
+    DATABASE_REPLICA_URLS; see utils/replicas.py for how reads are routed.
+    """
+
+    db_uri = db_uri or get_database_url()
+    if replica_uris is None:
+        replica_uris = get_replica_urls()
 
     # Configure to use our database
     flask_app.config["SQLALCHEMY_DATABASE_URI"] = db_uri
+    if replica_uris:
+        flask_app.config.setdefault("SQLALCHEMY_BINDS", {}).update(
+            replica_binds(replica_uris, get_engine_options))
     flask_app.config["SQLALCHEMY_ECHO"] = echo
     flask_app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    flask_app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", get_engine_options(db_uri))
     db.app = flask_app
     db.init_app(flask_app)
 
     print("Connected to the db!")
 
-
 if __name__ == "__main__":
     from server import app
     connect_to_db(app)
@@ -4,6 +4,7 @@ import os
 from dotenv import load_dotenv
 from server import app
 from model import connect_to_db, db, Region, User, Plant, PlantCareDetails
+from migrate import upgrade
 from datetime import datetime
 
 load_dotenv()
@@ -12,6 +13,7 @@ def create_tables():
     """Create database tables."""
     connect_to_db(app)
     db.create_all()
+    upgrade()
     print("Tables created!")
 
 def add_regions():
@@ -0,0 +1,114 @@
+"""Serve Rootly with gevent for high-concurrency, I/O-bound traffic.
+
+    python serve.py                          # serve on $HOST:$PORT
+    python serve.py benchmark [n] [delay]    # n concurrent slow-upstream requests
+
+server.py's app.run() is a development server that ties up one OS thread
+per request. Here monkey.patch_all() makes sockets, ssl, DNS, time.sleep and
+threading cooperative, so a request waiting on Perenual or Plant.id yields
+to the others instead of holding a thread. psycogreen does the same for
+psycopg2, which would otherwise block the whole process inside libpq.
+
+Greenlets share the SQLAlchemy pool, so size it for the number of requests
+that talk to Postgres at once, not for GEVENT_MAX_CONNECTIONS.
+
+Settings (environment variables):
+
+- HOST, PORT                listen address (default 0.0.0.0:5000)
+- GEVENT_MAX_CONNECTIONS    concurrent requests per worker (default 1000)
+- DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE
+                            see model.get_engine_options
+"""
+
+from gevent import monkey
+monkey.patch_all()
+
+from psycogreen.gevent import patch_psycopg
+patch_psycopg()
+
+import os
+import sys
+import time
+
+from gevent.pool import Pool
+from gevent.pywsgi import WSGIServer
+from sqlalchemy import text
+
+from model import connect_to_db, db
+from server import app
+from utils.write_behind import init_write_behind
+
+
+def make_server(host, port, max_connections=None):
+    """Return a gevent WSGI server for the Rootly app."""
+    max_connections = max_connections or int(os.environ.get('GEVENT_MAX_CONNECTIONS', 1000))
+    return WSGIServer((host, port), app, spawn=Pool(max_connections), log=None)
+
+
+def _slow_upstream(delay):
+    """A WSGI app that answers after `delay` seconds, standing in for an external API."""
+
+    def upstream(environ, start_response):
+        time.sleep(delay)
+        start_response('200 OK', [('Content-Type', 'application/json')])
+        return [b'{"suggestions": []}']
+
+    return upstream
+
+
+def benchmark(count=200, delay=0.5):
+    """Send `count` concurrent requests through a route that waits on a slow upstream.
+
+    Each request makes one upstream HTTP call taking `delay` seconds and one
+    database query. Returns (elapsed seconds, requests per second).
+    """
+    import requests
+
+    upstream = WSGIServer(('127.0.0.1', 0), _slow_upstream(delay), log=None)
+    upstream.start()
+    upstream_url = f"http://127.0.0.1:{upstream.server_port}/"
+
+    def upstream_route():
+        requests.get(upstream_url, timeout=30)
+        db.session.execute(text("SELECT 1"))
+        return 'ok'
+
+    app.add_url_rule('/_benchmark/upstream', 'benchmark_upstream', upstream_route)
+
+    server = make_server('127.0.0.1', 0)
+    server.start()
+    url = f"http://127.0.0.1:{server.server_port}/_benchmark/upstream"
+
+    def fetch(_):
+        return requests.get(url, timeout=60).status_code
+
+    start = time.perf_counter()
+    statuses = Pool(count).map(fetch, range(count))
+    elapsed = time.perf_counter() - start
+
+    server.stop()
+    upstream.stop()
+
+    failures = sum(status != 200 for status in statuses)
+    print(f"{count} requests, {delay}s upstream each, one worker")
+    print(f"  total time        {elapsed:.2f}s (one at a time: {count * delay:.0f}s)")
+    print(f"  throughput        {count / elapsed:.1f} req/s")
+    print(f"  average in flight {count * delay / elapsed:.0f}")
+    print(f"  failures          {failures}")
+
+    return elapsed, count / elapsed
+
+
+if __name__ == "__main__":
+    connect_to_db(app, echo=False)
+
+    if sys.argv[1:2] == ['benchmark']:
+        count = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+        delay = float(sys.argv[3]) if len(sys.argv) > 3 else 0.5
+        benchmark(count, delay)
+    else:
+        init_write_behind(app)
+        host = os.environ.get('HOST', '0.0.0.0')
+        port = int(os.environ.get('PORT', 5000))
+        print(f"Serving Rootly on http://{host}:{port} with gevent")
+        make_server(host, port).serve_forever()
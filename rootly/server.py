@@ -1,9 +1,25 @@
 """Server for Rootly app."""
 
 from flask import (Flask, render_template, request, flash, redirect, 
-                   session, jsonify, url_for)
+                   session, jsonify, url_for, Response, stream_with_context)
 from model import connect_to_db, db, User, Plant, PlantCareDetails, UserPlant
-from model import CareEvent, Reminder, HealthAssessment, Region
+from model import Reminder, HealthAssessment, Region
+import crud
+from utils.rollups import get_plant_care_summary, get_user_care_stats
+from utils.auth import (login_required, get_current_identity,
+                        get_owned_or_404)
+from utils.dashboard import (get_dashboard_summary, invalidate_dashboard_summary,
+                             summary_to_json)
+from utils.region_care import get_region_care_many
+from utils.diagnosis import suggest_issues
+from utils.page_cache import cached_page, catalogue_key, plant_key, plant_card
+from utils.export import iter_export, export_filename
+from utils.importer import import_file
+from utils.metrics import init_metrics
+from utils.profiling import init_profiling
+from utils.replicas import init_read_routing
+from utils.write_behind import init_write_behind, record_care_event, record_identification
+from api_v1 import api_v1
 import os
 from datetime import datetime, date, timedelta
 from jinja2 import StrictUndefined
@@ -20,11 +36,29 @@ app.jinja_env.undefined = StrictUndefined
 # Set up secret key for sessions and debug
 app.secret_key = os.environ.get('FLASK_SECRET_KEY', 'dev-secret-key')
 
+# Seconds to cache logged-in user identities between requests (0 disables)
+app.config['IDENTITY_CACHE_TTL'] = int(os.environ.get('IDENTITY_CACHE_TTL', 0))
+
 # Configure upload folder for plant images
 UPLOAD_FOLDER = 'static/uploads'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
+# Cached plant cards for the browse page
+app.add_template_global(plant_card)
+
+# JSON API for the mobile client
+app.register_blueprint(api_v1)
+
+# Request and SQL metrics at /metrics when METRICS_ENABLED is set
+init_metrics(app)
+
+# Profile requests carrying a signed token when PROFILING_ENABLED is set
+init_profiling(app)
+
+# Read-only requests read from replicas when DATABASE_REPLICA_URLS is set
+init_read_routing(app)
+
 # Ensure upload directory exists
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
@@ -88,6 +122,11 @@ def login():
         user = User.query.filter(User.email == email).first()
         
         if user and user.check_password(password):
+            # Upgrade hashes made with older cost settings while we have the password
+            if user.password_needs_rehash():
+                user.set_password(password)
+                db.session.commit()
+            
             session['user_id'] = user.user_id
             flash(f'Welcome back, {user.username}!')
             return redirect('/dashboard')
@@ -104,23 +143,38 @@ def logout():
     return redirect('/')
 
 @app.route('/dashboard')
+@login_required('Please log in to view your dashboard.')
 def dashboard():
     """Show user dashboard."""
-    if 'user_id' not in session:
-        flash('Please log in to view your dashboard.')
-        return redirect('/login')
+    user = get_current_identity()
+    summary = get_dashboard_summary(user.user_id)
+    care_stats = get_user_care_stats(user.user_id)
     
-    user = User.query.get(session['user_id'])
-    
-    return render_template('dashboard.html', user=user)
+    return render_template('dashboard.html', user=user, summary=summary,
+                           care_stats=care_stats)
+
+@app.route('/api/dashboard-summary')
+@login_required('Please log in to view your dashboard.')
+def dashboard_summary():
+    """Return the logged-in user's dashboard summary as JSON."""
+    return jsonify(summary_to_json(get_dashboard_summary(session['user_id'])))
+
+@app.route('/export')
+@login_required('Please log in to export your data.')
+def export_data():
+    """Stream a ZIP of the logged-in user's data and uploaded images."""
+    user_id = session['user_id']
+    return Response(
+        stream_with_context(iter_export(user_id, app.config['UPLOAD_FOLDER'])),
+        mimetype='application/zip',
+        headers={'Content-Disposition': f'attachment; filename="{export_filename(user_id)}"',
+                 'Cache-Control': 'no-store'}
+    )
 
 @app.route('/identify', methods=['GET', 'POST'])
+@login_required('Please log in to identify plants.')
 def identify_plant():
     """Identify a plant from an image."""
-    if 'user_id' not in session:
-        flash('Please log in to identify plants.')
-        return redirect('/login')
-    
     if request.method == 'POST':
         # Check if the post request has the file part
         if 'plant_image' not in request.files:
@@ -149,6 +203,8 @@ def identify_plant():
             plant = Plant.query.first()
             
             if plant:
+                record_identification(session['user_id'], f"/static/uploads/{user_filename}",
+                                      plant.plant_id, 0.95)
                 return render_template('identification_results.html', 
                                       plant=plant, 
                                       image_url=f"/static/uploads/{user_filename}",
@@ -160,24 +216,22 @@ def identify_plant():
     return render_template('identify.html')
 
 @app.route('/my-plants')
+@login_required('Please log in to view your plants.')
 def my_plants():
     """Show user's plant collection."""
-    if 'user_id' not in session:
-        flash('Please log in to view your plants.')
-        return redirect('/login')
-    
-    user = User.query.get(session['user_id'])
-    user_plants = UserPlant.query.filter_by(user_id=user.user_id).all()
-    
-    return render_template('my_plants.html', user=user, user_plants=user_plants)
+    user = get_current_identity()
+    user_plants = UserPlant.query.filter_by(user_id=session['user_id']).all()
+    locations = sorted({user_plant.location_in_home for user_plant in user_plants
+                        if user_plant.location_in_home})
+    care = get_region_care_many(user.region_id, [user_plant.plant_id for user_plant in user_plants])
+    
+    return render_template('my_plants.html', user=user, user_plants=user_plants,
+                           locations=locations, care=care)
 
 @app.route('/add-plant', methods=['GET', 'POST'])
+@login_required('Please log in to add plants to your collection.')
 def add_plant():
     """Add a plant to user's collection."""
-    if 'user_id' not in session:
-        flash('Please log in to add plants to your collection.')
-        return redirect('/login')
-    
     if request.method == 'POST':
         plant_id = request.form.get('plant_id')
         nickname = request.form.get('nickname')
@@ -194,6 +248,7 @@ def add_plant():
         
         db.session.add(new_user_plant)
         db.session.commit()
+        invalidate_dashboard_summary(session['user_id'])
         
         flash('Plant added to your collection!')
         return redirect('/my-plants')
@@ -202,50 +257,83 @@ def add_plant():
     plants = Plant.query.all()
     return render_template('add_plant.html', plants=plants)
 
+@app.route('/import-collection', methods=['GET', 'POST'])
+@login_required('Please log in to import plants.')
+def import_collection():
+    """Import plants, care events and reminders from a CSV or JSON file."""
+    report = None
+    
+    if request.method == 'POST':
+        file = request.files.get('collection_file')
+        if not file or file.filename == '':
+            flash('No selected file')
+            return redirect(request.url)
+        
+        try:
+            report = import_file(session['user_id'], file.stream, file.filename)
+        except ValueError as error:
+            flash(str(error))
+            return redirect(request.url)
+        
+        logger.info("User %s imported %r", session['user_id'], report)
+        flash(f"Imported {report.plants} plants, {report.care_events} care events "
+              f"and {report.reminders} reminders.")
+    
+    return render_template('import_collection.html', report=report)
+
 @app.route('/browse-plants')
 def browse_plants():
     """Browse all plants in the database."""
     # Get search parameter
     search = request.args.get('search', '')
     
-    # Filter plants if search parameter is provided
-    if search:
-        plants = Plant.query.filter(
-            (Plant.common_name.ilike(f'%{search}%')) | 
-            (Plant.scientific_name.ilike(f'%{search}%'))
-        ).all()
-    else:
-        plants = Plant.query.all()
+    def render():
+        # Filter plants if search parameter is provided
+        if search:
+            plants = Plant.query.filter(
+                (Plant.common_name.ilike(f'%{search}%')) | 
+                (Plant.scientific_name.ilike(f'%{search}%'))
+            ).all()
+        else:
+            plants = Plant.query.all()
+        
+        last_modified = max((plant.last_updated for plant in plants if plant.last_updated),
+                            default=None)
+        return render_template('browse_plants.html', plants=plants, search=search), last_modified
     
-    return render_template('browse_plants.html', plants=plants, search=search)
+    return cached_page(catalogue_key('browse', search), render)
 
 @app.route('/plant/<int:plant_id>')
 def plant_details(plant_id):
     """Show details for a specific plant."""
-    plant = Plant.query.get_or_404(plant_id)
-    care_details = PlantCareDetails.query.filter_by(plant_id=plant_id).first()
     
-    return render_template('plant_details.html', plant=plant, care_details=care_details)
+    def render():
+        plant = Plant.query.get_or_404(plant_id)
+        care_details = PlantCareDetails.query.filter_by(plant_id=plant_id).first()
+        return (render_template('plant_details.html', plant=plant, care_details=care_details),
+                plant.last_updated)
+    
+    return cached_page(plant_key(plant_id), render)
 
 @app.route('/user-plant/<int:user_plant_id>')
+@login_required('Please log in to view your plants.')
 def user_plant_details(user_plant_id):
     """Show details for a specific user plant."""
-    if 'user_id' not in session:
-        flash('Please log in to view your plants.')
-        return redirect('/login')
-    
-    user_plant = UserPlant.query.get_or_404(user_plant_id)
-    
     # Ensure the plant belongs to the logged-in user
-    if user_plant.user_id != session['user_id']:
+    user_plant = get_owned_or_404(UserPlant, user_plant_id)
+    if user_plant is None:
         flash('You do not have access to this plant.')
         return redirect('/my-plants')
     
     # Get plant care details
     care_details = PlantCareDetails.query.filter_by(plant_id=user_plant.plant_id).first()
     
-    # Get care events
-    care_events = CareEvent.query.filter_by(user_plant_id=user_plant_id).order_by(CareEvent.date.desc()).all()
+    # Get care stats from the rollup instead of scanning events
+    care_summary = get_plant_care_summary(user_plant_id)
+    
+    # Get one page of care events, newest first; totals come from the rollup
+    before = request.args.get('before', type=int)
+    care_events, more_events = crud.get_care_event_page(user_plant_id, before_event_id=before)
     
     # Get reminders
     reminders = Reminder.query.filter_by(user_plant_id=user_plant_id, is_active=True).order_by(Reminder.next_reminder_date).all()
@@ -253,59 +341,81 @@ def user_plant_details(user_plant_id):
     # Get health assessments
     health_assessments = HealthAssessment.query.filter_by(user_plant_id=user_plant_id).order_by(HealthAssessment.assessment_date.desc()).all()
     
+    # Suggest likely issues for unresolved assessments
+    possible_issues = {
+        assessment.assessment_id: suggest_issues(assessment.symptoms, user_plant.plant_id,
+                                                 user_plant.plant.scientific_name)
+        for assessment in health_assessments if not assessment.resolved
+    }
+    
     return render_template('user_plant_details.html', 
                           user_plant=user_plant,
                           care_details=care_details,
+                          care_summary=care_summary,
                           care_events=care_events,
+                          more_events=more_events,
+                          paged=before is not None,
                           reminders=reminders,
-                          health_assessments=health_assessments)
+                          health_assessments=health_assessments,
+                          possible_issues=possible_issues)
 
 @app.route('/log-care', methods=['POST'])
+@login_required('Please log in to log care events.')
 def log_care():
     """Log a care event for a plant."""
-    if 'user_id' not in session:
-        flash('Please log in to log care events.')
-        return redirect('/login')
-    
     user_plant_id = request.form.get('user_plant_id')
     event_type = request.form.get('event_type')
     notes = request.form.get('notes')
     
     # Verify the plant belongs to the user
-    user_plant = UserPlant.query.get_or_404(user_plant_id)
-    if user_plant.user_id != session['user_id']:
+    user_plant = get_owned_or_404(UserPlant, user_plant_id)
+    if user_plant is None:
         flash('You do not have access to this plant.')
         return redirect('/my-plants')
     
-    # Create the care event
-    new_event = CareEvent(
-        user_plant_id=user_plant_id,
-        event_type=event_type,
-        date=datetime.utcnow(),
-        notes=notes
-    )
-    
-    db.session.add(new_event)
-    db.session.commit()
+    # Create the care event (buffered when write-behind is enabled)
+    try:
+        record_care_event(user_plant.user_plant_id, event_type, notes=notes)
+    except ValueError as error:
+        flash(str(error))
+        return redirect(f'/user-plant/{user_plant_id}')
     
     flash(f'{event_type} event logged successfully!')
     return redirect(f'/user-plant/{user_plant_id}')
 
+@app.route('/log-care-bulk', methods=['POST'])
+@login_required('Please log in to log care events.')
+def log_care_bulk():
+    """Log the same care event for many plants at once."""
+    user_plant_ids = [user_plant_id for user_plant_id in request.form.getlist('user_plant_ids')
+                      if user_plant_id.isdigit()]
+    location = request.form.get('location') or None
+    event_type = request.form.get('event_type')
+    notes = request.form.get('notes')
+    
+    logged_ids = crud.bulk_log_care(session['user_id'], event_type,
+                                    user_plant_ids=user_plant_ids,
+                                    location_in_home=location,
+                                    notes=notes)
+    
+    if logged_ids:
+        flash(f'{event_type} logged for {len(logged_ids)} plant{"s" if len(logged_ids) != 1 else ""}!')
+    else:
+        flash('No plants selected.')
+    return redirect('/my-plants')
+
 @app.route('/add-reminder', methods=['POST'])
+@login_required('Please log in to add reminders.')
 def add_reminder():
     """Add a care reminder for a plant."""
-    if 'user_id' not in session:
-        flash('Please log in to add reminders.')
-        return redirect('/login')
-    
     user_plant_id = request.form.get('user_plant_id')
     reminder_type = request.form.get('reminder_type')
     frequency = request.form.get('frequency')
     next_reminder_date = request.form.get('next_reminder_date')
     
     # Verify the plant belongs to the user
-    user_plant = UserPlant.query.get_or_404(user_plant_id)
-    if user_plant.user_id != session['user_id']:
+    user_plant = get_owned_or_404(UserPlant, user_plant_id)
+    if user_plant is None:
         flash('You do not have access to this plant.')
         return redirect('/my-plants')
     
@@ -320,25 +430,23 @@ def add_reminder():
     
     db.session.add(new_reminder)
     db.session.commit()
+    invalidate_dashboard_summary(user_plant.user_id)
     
     flash(f'{reminder_type} reminder added successfully!')
     return redirect(f'/user-plant/{user_plant_id}')
 
 @app.route('/add-health-assessment', methods=['POST'])
+@login_required('Please log in to add health assessments.')
 def add_health_assessment():
     """Add a health assessment for a plant."""
-    if 'user_id' not in session:
-        flash('Please log in to add health assessments.')
-        return redirect('/login')
-    
     user_plant_id = request.form.get('user_plant_id')
     symptoms = request.form.getlist('symptoms')
     diagnosis = request.form.get('diagnosis')
     treatment_recommendations = request.form.get('treatment_recommendations')
     
     # Verify the plant belongs to the user
-    user_plant = UserPlant.query.get_or_404(user_plant_id)
-    if user_plant.user_id != session['user_id']:
+    user_plant = get_owned_or_404(UserPlant, user_plant_id)
+    if user_plant is None:
         flash('You do not have access to this plant.')
         return redirect('/my-plants')
     
@@ -367,44 +475,36 @@ def add_health_assessment():
     
     db.session.add(new_assessment)
     db.session.commit()
+    invalidate_dashboard_summary(user_plant.user_id)
     
     flash('Health assessment added successfully!')
     return redirect(f'/user-plant/{user_plant_id}')
 
 @app.route('/resolve-health-issue/<int:assessment_id>', methods=['POST'])
+@login_required('Please log in to update health assessments.')
 def resolve_health_issue(assessment_id):
     """Mark a health issue as resolved."""
-    if 'user_id' not in session:
-        flash('Please log in to update health assessments.')
-        return redirect('/login')
-    
-    # Get the assessment
-    assessment = HealthAssessment.query.get_or_404(assessment_id)
-    
-    # Verify the assessment belongs to a plant owned by the user
-    user_plant = UserPlant.query.get(assessment.user_plant_id)
-    if user_plant.user_id != session['user_id']:
+    # Get the assessment, verifying it belongs to a plant owned by the user
+    assessment = get_owned_or_404(HealthAssessment, assessment_id)
+    if assessment is None:
         flash('You do not have access to this assessment.')
         return redirect('/my-plants')
     
     # Mark as resolved
     assessment.resolved = True
     db.session.commit()
+    invalidate_dashboard_summary(session['user_id'])
     
     flash('Health issue marked as resolved!')
     return redirect(f'/user-plant/{assessment.user_plant_id}')
 
 @app.route('/edit-user-plant/<int:user_plant_id>', methods=['GET', 'POST'])
+@login_required('Please log in to edit your plants.')
 def edit_user_plant(user_plant_id):
     """Edit a user's plant."""
-    if 'user_id' not in session:
-        flash('Please log in to edit your plants.')
-        return redirect('/login')
-    
-    user_plant = UserPlant.query.get_or_404(user_plant_id)
-    
     # Ensure the plant belongs to the logged-in user
-    if user_plant.user_id != session['user_id']:
+    user_plant = get_owned_or_404(UserPlant, user_plant_id)
+    if user_plant is None:
         flash('You do not have access to this plant.')
         return redirect('/my-plants')
     
@@ -427,6 +527,7 @@ def edit_user_plant(user_plant_id):
                 user_plant.image_url = f"/static/uploads/{user_filename}"
         
         db.session.commit()
+        invalidate_dashboard_summary(user_plant.user_id)
         flash('Plant details updated successfully!')
         return redirect(f'/user-plant/{user_plant_id}')
     
@@ -444,4 +545,5 @@ def server_error(e):
 
 if __name__ == "__main__":
     connect_to_db(app)
+    init_write_behind(app)
     app.run(host="0.0.0.0", debug=True)
\ No newline at end of file
@@ -0,0 +1,104 @@
+"""Tests for /api/v1 paging, incremental sync and conditional GETs."""
+
+import base64
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from api_v1 import SYNC_OVERLAP, _encode_cursor
+from model import db, Plant
+
+BASE = datetime(2030, 1, 1)
+
+
+@pytest.fixture
+def plants(session):
+    """Five plants changed ten minutes apart, oldest first."""
+    plants = [Plant(scientific_name=f"Plantus {n}", last_updated=BASE + timedelta(minutes=10 * n))
+              for n in range(5)]
+    db.session.add_all(plants)
+    db.session.commit()
+    return [plant.plant_id for plant in plants]
+
+
+def _get(client, **args):
+    response = client.get('/api/v1/plants', query_string={'fields': 'plant_id', **args})
+    return response.status_code, response.get_json()
+
+
+def test_pages_cover_every_plant_once(app, plants):
+    client = app.test_client()
+    seen, cursor = [], None
+
+    while True:
+        status, body = _get(client, limit=2, **({'cursor': cursor} if cursor else {}))
+        assert status == 200 and body['sync_cursor']
+        seen += [plant['plant_id'] for plant in body['data']]
+        cursor = body['next_cursor']
+        if cursor is None:
+            break
+
+    assert seen == plants
+
+
+def test_since_returns_changes_with_an_overlap(app, plants):
+    client = app.test_client()
+    status, body = _get(client)
+    sync_cursor = body['sync_cursor']
+
+    # Nothing new: only the plant inside the overlap is sent again, and the cursor holds
+    status, body = _get(client, since=sync_cursor)
+    assert [plant['plant_id'] for plant in body['data']] == [plants[-1]]
+    assert body['sync_cursor'] == sync_cursor
+
+    # A change stamped before the last one seen but committed after it
+    late = Plant(scientific_name="Plantus late", last_updated=BASE + timedelta(minutes=38))
+    db.session.add(late)
+    db.session.commit()
+    assert SYNC_OVERLAP >= timedelta(minutes=2)
+
+    status, body = _get(client, since=sync_cursor)
+    assert [plant['plant_id'] for plant in body['data']] == [late.plant_id, plants[-1]]
+
+
+def test_empty_catalogue_still_returns_a_sync_cursor(app, session):
+    status, body = _get(app.test_client())
+
+    assert body['data'] == [] and body['next_cursor'] is None
+    assert body['sync_cursor']
+
+
+def _raw_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+
+@pytest.mark.parametrize('cursor', [
+    _raw_cursor(["2024-01-01T00:00:00", "x"]),
+    _raw_cursor(["2024-01-01T00:00:00", None]),
+    _raw_cursor(["2024-01-01T00:00:00", True]),
+    _raw_cursor(["yesterday", 1]),
+    _raw_cursor([None, 1]),
+    _raw_cursor(["2024-01-01T00:00:00"]),
+    _raw_cursor({"last_updated": "2024-01-01T00:00:00", "plant_id": 1}),
+    'not base64 at all!',
+])
+def test_tampered_cursors_are_rejected(app, plants, cursor):
+    status, body = _get(app.test_client(), cursor=cursor)
+
+    assert status == 400
+
+
+def test_valid_handmade_cursor_is_accepted(app, plants):
+    status, body = _get(app.test_client(), cursor=_encode_cursor([BASE, plants[0]]))
+
+    assert status == 200 and [plant['plant_id'] for plant in body['data']] == plants[1:]
+
+
+def test_unchanged_list_revalidates_with_304(app, plants):
+    client = app.test_client()
+    first = client.get('/api/v1/plants')
+
+    again = client.get('/api/v1/plants', headers={'If-None-Match': first.headers['ETag']})
+
+    assert again.status_code == 304
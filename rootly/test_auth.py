@@ -0,0 +1,59 @@
+"""Tests for the login, identity and ownership helpers."""
+
+import pytest
+from flask import g, session as flask_session
+from werkzeug.exceptions import NotFound
+
+import crud
+from model import UserPlant
+from utils.auth import get_current_identity, get_owned_or_404
+
+
+def _identity(app, user_id):
+    # The fixture's app context outlives each request context, and g with it
+    g.pop('current_identity', None)
+    with app.test_request_context():
+        flask_session['user_id'] = user_id
+        return get_current_identity()
+
+
+def test_identity_cache_forgets_updated_users(app, collection, monkeypatch):
+    user_id, plant_id, user_plant_id = collection
+    monkeypatch.setitem(app.config, 'IDENTITY_CACHE_TTL', 60)
+    assert _identity(app, user_id).username == 'fern'
+
+    crud.update_user(user_id, username='bracken', email='bracken@example.com')
+
+    identity = _identity(app, user_id)
+    assert (identity.username, identity.email) == ('bracken', 'bracken@example.com')
+
+
+def test_identity_cache_waits_for_the_unit_of_work(app, collection, monkeypatch):
+    user_id, plant_id, user_plant_id = collection
+    monkeypatch.setitem(app.config, 'IDENTITY_CACHE_TTL', 60)
+
+    with crud.unit_of_work():
+        crud.update_user(user_id, username='bracken')
+        assert _identity(app, user_id).username == 'bracken'
+
+    assert _identity(app, user_id).username == 'bracken'
+
+
+def test_login_required_redirects_anonymous_users(app, session):
+    response = app.test_client().get('/my-plants')
+
+    assert response.status_code == 302 and response.headers['Location'].endswith('/login')
+
+
+def test_ownership_check_in_one_query(app, collection):
+    user_id, plant_id, user_plant_id = collection
+    other = crud.create_user("ivy", "ivy@example.com", "secret")
+
+    with app.test_request_context():
+        flask_session['user_id'] = user_id
+        assert get_owned_or_404(UserPlant, user_plant_id).user_plant_id == user_plant_id
+        with pytest.raises(NotFound):
+            get_owned_or_404(UserPlant, user_plant_id + 1000)
+
+        flask_session['user_id'] = other.user_id
+        assert get_owned_or_404(UserPlant, user_plant_id) is None
@@ -0,0 +1,45 @@
+"""Tests for the cascading deletes of users, user plants and plants."""
+
+import crud
+from model import db, CareEvent, IdentificationHistory, UserPlant
+from testing import count_rows
+
+
+def test_delete_user_removes_everything_they_own(collection):
+    user_id, plant_id, user_plant_id = collection
+    crud.create_care_event(user_plant_id, 'watering')
+    crud.create_identification(user_id, '/static/uploads/monty.jpg', plant_id, 0.9)
+
+    assert crud.delete_user(user_id)
+
+    assert count_rows(UserPlant, UserPlant.user_id == user_id) == 0
+    assert count_rows(CareEvent, CareEvent.user_plant_id == user_plant_id) == 0
+    assert count_rows(IdentificationHistory, IdentificationHistory.user_id == user_id) == 0
+    assert not crud.delete_user(user_id)
+
+
+def test_delete_user_plant_keeps_identifications_unlinked(collection):
+    user_id, plant_id, user_plant_id = collection
+    crud.create_care_event(user_plant_id, 'watering')
+    crud.create_identification(user_id, '/static/uploads/monty.jpg', plant_id, 0.9,
+                               user_plant_id=user_plant_id)
+
+    assert crud.delete_user_plant(user_plant_id)
+
+    assert count_rows(CareEvent, CareEvent.user_plant_id == user_plant_id) == 0
+    identification = db.session.execute(
+        db.select(IdentificationHistory).where(IdentificationHistory.user_id == user_id)
+    ).scalar_one()
+    assert identification.user_plant_id is None
+
+
+def test_delete_plant_refuses_plants_in_a_collection(collection):
+    user_id, plant_id, user_plant_id = collection
+
+    assert not crud.delete_plant(plant_id)
+    # The refusal was rolled back to a savepoint; the session still works
+    assert crud.get_plant_by_id(plant_id) is not None
+
+    crud.delete_user(user_id)
+    assert crud.delete_plant(plant_id)
+    assert not crud.delete_plant(plant_id)
@@ -0,0 +1,69 @@
+"""Tests for crud's unit_of_work and batch helpers."""
+
+from datetime import date, datetime
+
+import pytest
+
+import crud
+from model import db, CareEvent, Plant, Reminder, UserPlant, UserPlantCareSummary
+from testing import count_rows
+
+
+def test_batch_inserts_return_ids_in_order(session, collection):
+    user_id, plant_id, user_plant_id = collection
+
+    plant_ids = crud.create_plants_many([{'scientific_name': f"Plantus {n}"} for n in range(3)])
+    user_plant_ids = crud.create_user_plants_many([{'user_id': user_id, 'plant_id': plant_id}
+                                                   for plant_id in plant_ids])
+
+    assert [session.get(Plant, plant_id).scientific_name for plant_id in plant_ids] == \
+        ["Plantus 0", "Plantus 1", "Plantus 2"]
+    assert [session.get(UserPlant, user_plant_id).plant_id
+            for user_plant_id in user_plant_ids] == plant_ids
+
+
+def test_unit_of_work_defers_callbacks_until_commit(session, collection, monkeypatch):
+    user_id, plant_id, user_plant_id = collection
+    invalidated = []
+    monkeypatch.setattr(crud, 'invalidate_dashboard_summary', invalidated.append)
+
+    with crud.unit_of_work():
+        crud.create_user_plant(user_id, plant_id, nickname="Monty II")
+        with crud.unit_of_work():
+            crud.create_user_plant(user_id, plant_id, nickname="Monty III")
+        assert invalidated == []
+
+    assert invalidated == [user_id, user_id]
+
+
+def test_unit_of_work_rolls_back_everything_on_error(session, collection, monkeypatch):
+    user_id, plant_id, user_plant_id = collection
+    invalidated = []
+    monkeypatch.setattr(crud, 'invalidate_dashboard_summary', invalidated.append)
+
+    with pytest.raises(RuntimeError), crud.unit_of_work():
+        crud.create_user_plant(user_id, plant_id, nickname="Monty II")
+        raise RuntimeError("import failed halfway")
+
+    assert count_rows(UserPlant) == 1 and invalidated == []
+
+
+def test_bulk_log_care_logs_owned_plants_and_moves_their_reminders(session, collection):
+    user_id, plant_id, user_plant_id = collection
+    kitchen = [crud.create_user_plant(user_id, plant_id, location_in_home='Kitchen').user_plant_id
+               for _ in range(2)]
+    other_user = crud.create_user("ivy", "ivy@example.com", "secret")
+    not_mine = crud.create_user_plant(other_user.user_id, plant_id).user_plant_id
+    watering = crud.create_reminder(kitchen[0], 'Watering', 'Weekly', next_reminder_date=date(2024, 5, 1))
+    feeding = crud.create_reminder(kitchen[0], 'fertilizing', 'monthly', next_reminder_date=date(2024, 5, 1))
+
+    logged = crud.bulk_log_care(user_id, 'watering', user_plant_ids=[str(user_plant_id), str(not_mine)],
+                                location_in_home='Kitchen', date=datetime(2024, 5, 3, 8))
+
+    assert sorted(logged) == sorted([user_plant_id] + kitchen)
+    assert count_rows(CareEvent, CareEvent.user_plant_id == not_mine) == 0
+    assert session.get(UserPlantCareSummary, kitchen[1]).watering_count == 1
+    db.session.expire_all()
+    assert session.get(Reminder, watering.reminder_id).next_reminder_date == date(2024, 5, 10)
+    assert session.get(Reminder, feeding.reminder_id).next_reminder_date == date(2024, 5, 1)
+    assert crud.bulk_log_care(user_id, 'watering') == []
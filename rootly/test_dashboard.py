@@ -0,0 +1,42 @@
+"""Tests for the cached dashboard summary."""
+
+from datetime import date, datetime, timedelta
+
+import crud
+from utils.dashboard import (compute_dashboard_summary, get_dashboard_summary,
+                             invalidate_dashboard_summary)
+
+
+def test_summary_counts(session, collection):
+    user_id, plant_id, user_plant_id = collection
+    today = date.today()
+    crud.create_plant_care_details(plant_id, watering_interval_days=7)
+    watered = crud.create_user_plant(user_id, plant_id, nickname="Watered").user_plant_id
+    crud.create_care_event(watered, 'watering', date=datetime.utcnow() - timedelta(days=1))
+    crud.create_reminder(user_plant_id, 'fertilizing', 'monthly',
+                         next_reminder_date=today - timedelta(days=3))
+    crud.create_reminder(watered, 'misting', 'weekly', next_reminder_date=today + timedelta(days=2))
+    crud.create_health_assessment(watered, symptoms=["yellow leaves"])
+
+    summary = compute_dashboard_summary(user_id, today)
+
+    assert summary['plant_count'] == 2
+    assert (summary['overdue_reminders'], summary['upcoming_reminders']) == (1, 1)
+    # Monty has an interval and has never been watered; the other was watered yesterday
+    assert summary['plants_needing_water'] == 1
+    assert summary['unresolved_assessments'] == 1
+    assert summary['care_events_this_week'] == 1
+    assert summary['last_activity_at'] is not None
+
+
+def test_cached_summary_is_dropped_by_writes(session, collection):
+    user_id, plant_id, user_plant_id = collection
+    # Ids come round again once earlier tests roll back
+    invalidate_dashboard_summary(user_id)
+    assert get_dashboard_summary(user_id)['plant_count'] == 1
+
+    crud.create_user_plant(user_id, plant_id, nickname="Monty II")
+    assert get_dashboard_summary(user_id)['plant_count'] == 2
+
+    crud.delete_user_plant(user_plant_id)
+    assert get_dashboard_summary(user_id)['plant_count'] == 1
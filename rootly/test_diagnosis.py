@@ -0,0 +1,49 @@
+"""Tests for ranking likely health issues from symptoms."""
+
+import crud
+from model import db, HealthAssessment
+from utils.diagnosis import (DiagnosisIndex, apply_diagnoses, rerank_unresolved, suggest_issues,
+                             tokenize, tokenize_symptoms)
+
+ISSUES = [
+    (1, 10, "Overwatering", "Yellowing leaves and mushy stems", 'high', 'monstera'),
+    (2, 20, "Spider mites", "Fine webbing under the leaves, yellow spots", 'medium', 'ficus'),
+    (3, 30, "Root rot", "Soft, rotting roots and yellow leaves", 'high', 'ficus'),
+    (4, 40, "Sunburn", "Brown crispy patches", 'low', 'aloe'),
+]
+
+
+def test_tokenize_normalises_synonyms_and_pairs():
+    assert tokenize("Yellowing foliage") == ['yellow', 'leaves', 'yellow leaves']
+    # Pairs never span two separate symptoms
+    assert 'leaves webs' not in tokenize_symptoms(["yellow leaves", "webbing"])
+
+
+def test_ranking_prefers_specific_matches_and_boosts_the_species():
+    index = DiagnosisIndex(ISSUES)
+
+    assert index.rank(["webbing on leaves"])[0][0] == 2
+    assert [issue_id for issue_id, _ in index.rank(["yellow leaves"], limit=3)] == [1, 3, 2]
+    assert index.rank(["yellow leaves"], plant_id=30, genus='ficus')[0][0] == 3
+    assert index.rank(["perfectly healthy"]) == []
+    assert DiagnosisIndex([]).rank(["yellow leaves"]) == []
+
+
+def test_new_issues_are_ranked_and_applied(session, collection):
+    user_id, plant_id, user_plant_id = collection
+    crud.create_plant_health_issue(plant_id, "Overwatering", symptoms="Yellow leaves, soft stems")
+    assert [issue['issue_name'] for issue in suggest_issues(["soft stems"], plant_id)] == \
+        ["Overwatering"]
+
+    crud.create_plant_health_issue(plant_id, "Thrips", symptoms="Silver streaks on leaves")
+    open_case = crud.create_health_assessment(user_plant_id, symptoms=["silver streaks"])
+    diagnosed = crud.create_health_assessment(user_plant_id, symptoms=["silver streaks"],
+                                              diagnosis="Sunburn")
+
+    rankings = rerank_unresolved()
+    assert rankings[open_case.assessment_id][0][0] == rankings[diagnosed.assessment_id][0][0]
+    assert apply_diagnoses(rankings) == 1
+
+    db.session.expire_all()
+    assert session.get(HealthAssessment, open_case.assessment_id).diagnosis == "Thrips"
+    assert session.get(HealthAssessment, diagnosed.assessment_id).diagnosis == "Sunburn"
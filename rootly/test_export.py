@@ -0,0 +1,54 @@
+"""Tests for the streaming per-user export."""
+
+import io
+import json
+import zipfile
+
+import crud
+from utils.export import iter_export
+
+
+def _archive(chunks):
+    return zipfile.ZipFile(io.BytesIO(b''.join(chunks)))
+
+
+def _lines(archive, name):
+    return [json.loads(line) for line in archive.read(name).splitlines()]
+
+
+def test_export_holds_only_the_users_rows_and_uploads(session, collection, tmp_path):
+    user_id, plant_id, user_plant_id = collection
+    (tmp_path / 'monty.jpg').write_bytes(b'\xff\xd8jpeg bytes')
+    crud.update_user_plant(user_plant_id, image_url='/static/uploads/monty.jpg')
+    for n in range(5):
+        crud.create_care_event(user_plant_id, 'watering', notes=f"round {n}")
+    crud.create_health_assessment(user_plant_id, symptoms=["droop"],
+                                  image_url='/static/uploads/missing.jpg')
+    other = crud.create_user("ivy", "ivy@example.com", "secret")
+    other_plant = crud.create_user_plant(other.user_id, plant_id)
+    crud.create_care_event(other_plant.user_plant_id, 'misting')
+
+    chunks = list(iter_export(user_id, str(tmp_path), batch_size=2, chunk_size=64))
+
+    assert len(chunks) > 1
+    archive = _archive(chunks)
+    assert json.loads(archive.read('user.json'))['username'] == 'fern'
+    assert [row['user_plant_id'] for row in _lines(archive, 'user_plants.ndjson')] == [user_plant_id]
+    assert [row['notes'] for row in _lines(archive, 'care_events.ndjson')] == \
+        [f"round {n}" for n in range(5)]
+    assert _lines(archive, 'health_assessments.ndjson')[0]['symptoms'] == ["droop"]
+    assert archive.read('images/monty.jpg') == b'\xff\xd8jpeg bytes'
+    assert 'images/missing.jpg' not in archive.namelist()
+
+
+def test_export_route_streams_a_zip(app, collection):
+    user_id, plant_id, user_plant_id = collection
+    client = app.test_client()
+    with client.session_transaction() as cookie:
+        cookie['user_id'] = user_id
+
+    response = client.get('/export')
+
+    disposition = response.headers['Content-Disposition']
+    assert disposition.startswith(f'attachment; filename="rootly-export-{user_id}-')
+    assert _lines(_archive([response.get_data()]), 'user_plants.ndjson')[0]['nickname'] == "Monty"
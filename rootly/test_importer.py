@@ -0,0 +1,59 @@
+"""Tests for the CSV/JSON collection importer."""
+
+import io
+import json
+
+from model import db, CareEvent, Reminder, UserPlant
+from testing import count_rows
+from utils import importer
+
+
+def test_import_json_collection(collection):
+    user_id, plant_id, user_plant_id = collection
+    document = [
+        {"species": "swiss cheese plant", "nickname": "Cheesy",
+         "care_events": [{"event_type": "watering", "date": "2024-05-01"}],
+         "reminders": [{"reminder_type": "watering", "frequency": "weekly"}]},
+    ]
+
+    report = importer.import_file(user_id, io.StringIO(json.dumps(document)), 'plants.json')
+
+    assert (report.plants, report.care_events, report.reminders) == (1, 1, 1)
+    assert report.errors == []
+    cheesy = db.session.execute(
+        db.select(UserPlant).where(UserPlant.user_id == user_id, UserPlant.nickname == 'Cheesy')
+    ).scalar_one()
+    assert cheesy.plant_id == plant_id
+    assert count_rows(Reminder, Reminder.user_plant_id == cheesy.user_plant_id) == 1
+
+
+def test_import_reports_malformed_rows(collection):
+    user_id, plant_id, user_plant_id = collection
+    document = [
+        {"species": 123},
+        {"species": {"name": "Monstera deliciosa"}},
+        {"species": "Monstera deliciosa", "nickname": ["a", "list"]},
+        {"species": "Monstera deliciosa", "care_events": "watering"},
+        "not a plant",
+        {"species": "Monstera deliciosa", "nickname": "Good"},
+    ]
+
+    report = importer.import_file(user_id, io.StringIO(json.dumps(document)), 'plants.json')
+
+    assert report.plants == 2  # the plant whose care_events is malformed is still imported
+    assert sorted(row for row, message in report.errors) == [1, 2, 3, 5, 6]
+
+
+def test_import_csv_links_children_to_plants(collection):
+    user_id, plant_id, user_plant_id = collection
+    rows = ("type,species,nickname,plant,event_type,date\n"
+            "plant,Monstera deliciosa,Cheesy,,,\n"
+            "care_event,,,Cheesy,watering,2024-05-01\n"
+            "care_event,,,Monty,fertilizing,2024-05-02\n"
+            "care_event,,,Nobody,watering,2024-05-03\n")
+
+    report = importer.import_file(user_id, io.StringIO(rows), 'plants.csv')
+
+    assert (report.plants, report.care_events) == (1, 2)
+    assert [row for row, message in report.errors] == [5]
+    assert count_rows(CareEvent, CareEvent.user_plant_id == user_plant_id) == 1
@@ -0,0 +1,45 @@
+"""Tests for the request and SQL metrics."""
+
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from utils.metrics import init_metrics
+
+
+@pytest.fixture
+def metrics_app():
+    """A bare app with metrics on, whose /query route runs SQL on its own engine."""
+    app = Flask(__name__)
+    assert init_metrics(app, enabled=True)
+    app.engine = create_engine('sqlite://')
+
+    @app.route('/query/<int:count>')
+    def query(count):
+        with app.engine.connect() as conn:
+            for _ in range(count):
+                conn.execute(text('SELECT 1'))
+        return 'ok'
+
+    return app
+
+
+def test_counts_queries_per_endpoint(metrics_app):
+    client = metrics_app.test_client()
+    client.get('/query/3')
+
+    body = client.get('/metrics').get_data(as_text=True)
+
+    assert 'db_queries_per_request_bucket{endpoint="query",le="5"} 1' in body
+    assert 'db_queries_per_request_bucket{endpoint="query",le="2"} 0' in body
+    assert 'http_request_duration_seconds_count{endpoint="query",method="GET",status="200"} 1' in body
+
+
+def test_failed_statements_do_not_leave_a_start_behind(metrics_app):
+    with metrics_app.engine.connect() as conn:
+        for _ in range(3):
+            with pytest.raises(OperationalError):
+                conn.execute(text('SELECT * FROM no_such_table'))
+
+        assert conn.info.get('metrics_query_start') == []
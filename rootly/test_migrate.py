@@ -0,0 +1,48 @@
+"""Tests for the migration runner and the index check."""
+
+import pytest
+
+import migrate
+from model import db
+from migrate import check_indexes, get_migrations, split_statements
+
+
+def test_split_statements_drops_comments():
+    sql = """-- migrate:no-transaction
+    -- Speeds up the dashboard
+    CREATE INDEX CONCURRENTLY ix_a ON a (x);
+
+    -- nothing to do here;
+    CREATE INDEX CONCURRENTLY ix_b ON b (y)
+    """
+
+    assert split_statements(sql) == ["CREATE INDEX CONCURRENTLY ix_a ON a (x)",
+                                     "CREATE INDEX CONCURRENTLY ix_b ON b (y)"]
+
+
+def test_migrations_are_numbered_in_order():
+    versions = [version for version, _ in get_migrations()]
+
+    assert versions == sorted(versions)
+    assert [version[:4] for version in versions] == [f"{n:04d}" for n in range(1, len(versions) + 1)]
+
+
+@pytest.fixture
+def postgres(app):
+    """An app context on Postgres; check_indexes rolls back what the getters ran."""
+    with app.app_context():
+        if db.engine.dialect.name != 'postgresql':
+            pytest.skip("EXPLAIN plans are checked on Postgres only")
+        yield
+
+
+def test_every_crud_getter_uses_an_index(postgres):
+    failures = [(name, plan) for name, ok, plan in check_indexes() if not ok]
+
+    assert failures == []
+
+
+def test_a_getter_that_runs_no_sql_fails_the_check(postgres, monkeypatch):
+    monkeypatch.setattr(migrate, '_index_checks', lambda: [('cached', lambda: None)])
+
+    assert check_indexes() == [('cached', False, "(no SQL was captured)")]
@@ -0,0 +1,88 @@
+"""Tests for the reminder digest dispatcher and its ledger."""
+
+import smtplib
+from datetime import date, datetime, timedelta
+
+import pytest
+
+import crud
+from model import db, NotificationLedger
+from testing import create_file_test_app
+from utils.notifications import CLAIM_TIMEOUT, dispatch_due_reminders
+
+RUN_DATE = date(2024, 5, 10)
+
+
+class FakePool:
+    """Stands in for SMTPConnectionPool; refuses recipients in `refuse`."""
+
+    def __init__(self, refuse=()):
+        self.sent = []
+        self.refuse = set(refuse)
+
+    def send(self, message):
+        if message['To'] in self.refuse:
+            raise smtplib.SMTPRecipientsRefused({message['To']: (550, b'No such user')})
+        self.sent.append(message['To'])
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def users(tmp_path):
+    """Two users with a reminder due on RUN_DATE, as their ids; the ledger commits for real."""
+    app = create_file_test_app(str(tmp_path))
+    with app.app_context():
+        plant = crud.create_plant("Monstera deliciosa")
+        user_ids = []
+        for name in ('fern', 'ivy'):
+            user = crud.create_user(name, f"{name}@example.com", "secret")
+            user_plant = crud.create_user_plant(user.user_id, plant.plant_id, nickname=name.title())
+            crud.create_reminder(user_plant.user_plant_id, 'watering', 'weekly',
+                                 next_reminder_date=RUN_DATE)
+            user_ids.append(user.user_id)
+        yield user_ids
+
+
+def _ledger():
+    db.session.rollback()  # see the ledger as committed on its own connections
+    return {row.user_id: row.status for row in NotificationLedger.query}
+
+
+def test_each_user_gets_one_digest_a_day(users):
+    pool = FakePool()
+
+    assert dispatch_due_reminders(RUN_DATE, pool=pool)['sent'] == 2
+    assert dispatch_due_reminders(RUN_DATE, pool=pool)['sent'] == 0
+
+    assert sorted(pool.sent) == ['fern@example.com', 'ivy@example.com']
+    assert set(_ledger().values()) == {'sent'}
+
+
+def test_failed_digests_are_released_for_the_next_run(users):
+    fern, ivy = users
+
+    totals = dispatch_due_reminders(RUN_DATE, pool=FakePool(refuse={'ivy@example.com'}), retries=0)
+
+    assert (totals['sent'], totals['failed']) == (1, 1)
+    assert _ledger() == {fern: 'sent'}
+    assert dispatch_due_reminders(RUN_DATE, pool=FakePool())['sent'] == 1
+
+
+def test_claims_left_by_a_dead_run_are_taken_over_after_the_timeout(users):
+    fern, ivy = users
+    now = datetime.utcnow()
+    db.session.add_all([
+        NotificationLedger(user_id=fern, digest_date=RUN_DATE, status='sending',
+                           claimed_at=now - CLAIM_TIMEOUT - timedelta(minutes=1)),
+        NotificationLedger(user_id=ivy, digest_date=RUN_DATE, status='sending', claimed_at=now),
+    ])
+    db.session.commit()
+    pool = FakePool()
+
+    totals = dispatch_due_reminders(RUN_DATE, pool=pool)
+
+    assert pool.sent == ['fern@example.com']
+    assert totals['sent'] == 1
+    assert _ledger() == {fern: 'sent', ivy: 'sending'}
@@ -0,0 +1,60 @@
+"""Tests for the cached public plant pages."""
+
+from sqlalchemy import update
+
+import crud
+from model import db, Plant
+from utils.page_cache import invalidate_plant_pages
+
+
+def _rename_behind_crud(plant_id, common_name):
+    db.session.execute(update(Plant).where(Plant.plant_id == plant_id)
+                       .values(common_name=common_name))
+    db.session.commit()
+
+
+def test_plant_page_is_served_from_cache_until_crud_changes_it(app, collection):
+    user_id, plant_id, user_plant_id = collection
+    # Ids come round again once earlier tests roll back
+    invalidate_plant_pages(plant_id)
+    client = app.test_client()
+    first = client.get(f'/plant/{plant_id}')
+    assert "Swiss Cheese Plant" in first.get_data(as_text=True)
+    assert first.cache_control.public and first.cache_control.max_age
+
+    _rename_behind_crud(plant_id, "Split-leaf Philodendron")
+    assert client.get(f'/plant/{plant_id}').get_data() == first.get_data()
+    assert client.get(f'/plant/{plant_id}',
+                      headers={'If-None-Match': first.headers['ETag']}).status_code == 304
+
+    crud.update_plant(plant_id, common_name="Fruit Salad Plant")
+    page = client.get(f'/plant/{plant_id}', headers={'If-None-Match': first.headers['ETag']})
+    assert page.status_code == 200 and "Fruit Salad Plant" in page.get_data(as_text=True)
+
+
+def test_logged_in_visitors_get_their_own_private_copy(app, collection):
+    user_id, plant_id, user_plant_id = collection
+    invalidate_plant_pages(plant_id)
+    client = app.test_client()
+    anonymous = client.get(f'/plant/{plant_id}')
+    with client.session_transaction() as cookie:
+        cookie['user_id'] = user_id
+
+    logged_in = client.get(f'/plant/{plant_id}')
+
+    assert logged_in.cache_control.private and logged_in.cache_control.no_cache
+    assert logged_in.headers['ETag'] != anonymous.headers['ETag']
+
+
+def test_browse_page_rerenders_only_changed_cards(app, collection):
+    user_id, plant_id, user_plant_id = collection
+    fig = crud.create_plant("Ficus lyrata", common_name="Fiddle-leaf Fig").plant_id
+    client = app.test_client()
+    assert "Fiddle-leaf Fig" in client.get('/browse-plants').get_data(as_text=True)
+
+    _rename_behind_crud(plant_id, "Split-leaf Philodendron")
+    crud.update_plant(fig, common_name="Banjo Fig")
+    page = client.get('/browse-plants').get_data(as_text=True)
+
+    # Monstera's card is reused as it was; the fig's is rendered again
+    assert "Banjo Fig" in page and "Swiss Cheese Plant" in page
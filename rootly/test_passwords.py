@@ -0,0 +1,44 @@
+"""Tests for password hashing and rehash on login."""
+
+import crud
+from model import db, User
+from testing import TEST_PASSWORD_HASH_ITERATIONS
+from utils.passwords import get_hash_method, hash_password, needs_rehash, verify_password
+
+
+def test_hash_records_its_cost(app):
+    password_hash = hash_password("secret")
+
+    assert password_hash.startswith(f"pbkdf2:sha256:{TEST_PASSWORD_HASH_ITERATIONS}$")
+    assert verify_password(password_hash, "secret")
+    assert not verify_password(password_hash, "Secret")
+    assert not needs_rehash(password_hash)
+    assert needs_rehash(password_hash, method="pbkdf2:sha256:2000")
+
+
+def test_login_upgrades_an_outdated_hash(app, session):
+    user = crud.create_user("fern", "fern@example.com", "secret")
+    user.password_hash = hash_password("secret", method="pbkdf2:sha256:500")
+    db.session.commit()
+
+    response = app.test_client().post('/login', data={'email': 'fern@example.com',
+                                                      'password': 'secret'})
+
+    assert response.status_code == 302 and response.headers['Location'].endswith('/dashboard')
+    db.session.expire_all()
+    upgraded = session.get(User, user.user_id).password_hash
+    assert upgraded.startswith(get_hash_method() + '$')
+    assert verify_password(upgraded, "secret")
+
+
+def test_wrong_password_keeps_the_hash(app, session):
+    user = crud.create_user("fern", "fern@example.com", "secret")
+    old_hash = user.password_hash = hash_password("secret", method="pbkdf2:sha256:500")
+    db.session.commit()
+
+    response = app.test_client().post('/login', data={'email': 'fern@example.com',
+                                                      'password': 'wrong'})
+
+    assert response.status_code == 200
+    db.session.expire_all()
+    assert session.get(User, user.user_id).password_hash == old_hash
@@ -0,0 +1,60 @@
+"""Tests for the in-memory related plants graph."""
+
+import pytest
+
+import crud
+from utils.plant_graph import GENUS, PlantGraph, invalidate_plant_graph
+
+
+@pytest.fixture
+def graph():
+    """1 - 2 - 3 as companions, 3 - 4 as a pest host; 1 and 5 are both Ficus."""
+    graph = PlantGraph()
+    for plant_id, name in [(1, "Ficus lyrata"), (2, "Monstera deliciosa"), (3, "Pilea peperomioides"),
+                           (4, "Aloe vera"), (5, "Ficus elastica")]:
+        graph.add_plant(plant_id, name)
+    graph.add_edge(10, 1, 2, 'Companion')
+    graph.add_edge(11, 2, 3, 'companion')
+    graph.add_edge(12, 3, 4, 'pest host')
+    return graph
+
+
+def _reached(found):
+    return [(step['plant_id'], step['hops']) for step in found]
+
+
+def test_traverse_stops_at_hops_and_filters_types(graph):
+    assert _reached(graph.traverse(1, hops=2)) == [(2, 1), (3, 2)]
+    assert _reached(graph.traverse(2, hops=3, types=['COMPANION'])) == [(1, 1), (3, 1)]
+    assert _reached(graph.traverse(1, hops=5, limit=2)) == [(2, 1), (3, 2)]
+
+
+def test_genus_counts_as_one_hop(graph):
+    found = graph.traverse(1, hops=1, include_genus=True)
+
+    assert [(step['plant_id'], step['relationship_type']) for step in found] == \
+        [(2, 'Companion'), (5, GENUS)]
+    assert _reached(graph.traverse(1, hops=1, types=['pest host'], include_genus=True)) == []
+
+
+def test_renamed_plant_moves_genus(graph):
+    graph.add_plant(5, "Aloe arborescens")
+
+    assert graph.genus_cluster(1) == frozenset()
+    assert graph.genus_cluster(4) == {5}
+
+
+def test_crud_keeps_the_loaded_graph_current(session):
+    invalidate_plant_graph()
+    fig = crud.create_plant("Ficus lyrata").plant_id
+    monstera = crud.create_plant("Monstera deliciosa").plant_id
+    assert crud.get_related_plants(fig) == []
+
+    crud.create_related_plants(fig, monstera, 'companion', notes="Both like bright shade")
+    rubber = crud.create_plant("Ficus elastica").plant_id
+
+    assert [(edge['plant_id'], edge['notes']) for edge in crud.get_related_plants(monstera)] == \
+        [(fig, "Both like bright shade")]
+    assert _reached(crud.get_related_plants_within(monstera, include_genus=True)) == \
+        [(fig, 1), (rubber, 2)]
+    invalidate_plant_graph()
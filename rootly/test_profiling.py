@@ -0,0 +1,79 @@
+"""Tests for on-demand request profiling."""
+
+import os
+
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from utils import profiling
+from utils.profiling import HEADER, init_profiling, make_profile_token
+
+
+@pytest.fixture(scope='module')
+def profiled_app():
+    """A bare app with profiling on, whose /query route runs SQL on its own engine."""
+    app = Flask(__name__)
+    app.secret_key = 'test-profiling-secret'
+    assert init_profiling(app, enabled=True)
+    app.engine = create_engine('sqlite://')
+
+    @app.route('/query')
+    def query():
+        with app.engine.connect() as conn:
+            conn.execute(text('SELECT 1'))
+        return 'ok'
+
+    @app.route('/broken')
+    def broken():
+        raise RuntimeError("view failed")
+
+    return app
+
+
+@pytest.fixture
+def client(profiled_app, tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, 'PROFILE_DIR', str(tmp_path))
+    client = profiled_app.test_client()
+    client.environ_base[f"HTTP_{HEADER.upper().replace('-', '_')}"] = \
+        make_profile_token(profiled_app)
+    return client
+
+
+def test_profile_is_saved_with_its_sql(client, tmp_path):
+    response = client.get('/query')
+
+    profile_id = response.headers['X-Profile-Id']
+    assert sorted(os.listdir(tmp_path)) == [f"{profile_id}.json", f"{profile_id}.prof"]
+    [summary] = profiling.load_summaries()
+    assert 'SELECT 1' in [query['statement'] for query in summary['queries']]
+
+
+def test_only_one_request_is_profiled_at_a_time(client):
+    with profiling._profiling:
+        response = client.get('/query')
+
+    assert response.status_code == 200 and 'X-Profile-Id' not in response.headers
+    assert 'X-Profile-Id' in client.get('/query').headers
+
+
+def test_failed_request_releases_the_profiler(client, profiled_app):
+    profiled_app.testing = False
+    try:
+        assert client.get('/broken').status_code == 500
+    finally:
+        profiled_app.testing = True
+
+    assert 'X-Profile-Id' in client.get('/query').headers
+
+
+def test_failed_statements_do_not_leave_a_start_behind(profiled_app):
+    token = profiling._capture.set(profiling.Capture())
+    try:
+        with profiled_app.engine.connect() as conn:
+            with pytest.raises(OperationalError):
+                conn.execute(text('SELECT * FROM no_such_table'))
+            assert conn.info.get('profile_query_start') == []
+    finally:
+        profiling._capture.reset(token)
@@ -0,0 +1,97 @@
+"""Tests for the columnar trait store."""
+
+import numpy as np
+import pytest
+
+from api import quantitative_plant
+from api.quantitative_plant import TraitStore
+
+RECORDS = [
+    {'species': 'Monstera deliciosa', 'trait': 'height', 'value': 2.0, 'unit': 'm'},
+    {'species': 'Monstera deliciosa', 'trait': 'height', 'value': 4.0},
+    {'species': 'Ficus lyrata', 'trait': 'height', 'value': 10.0},
+    {'species': 'Ficus lyrata', 'trait': 'leaf_area', 'value': 300.0},
+    {'species': 'Ficus lyrata', 'trait': 'leaf_area', 'value': 'n/a'},
+]
+
+
+@pytest.fixture
+def store(tmp_path):
+    return TraitStore(str(tmp_path))
+
+
+def _sync(store, records, traits=None):
+    store.load_snapshot(iter(records), traits)
+    store.compact()
+
+
+def test_queries_read_compacted_columns(store):
+    _sync(store, RECORDS)
+
+    assert store.species_in_range('height', 2.5, 5) == {'Monstera deliciosa': 3.0}
+    assert store.species_traits('Ficus lyrata') == {'height': 10.0, 'leaf_area': 300.0}
+    stats = store.aggregate('height')
+    assert (stats['count'], stats['min'], stats['max']) == (3, 2.0, 10.0)
+    assert store.aggregate('height', 'Ficus lyrata')['count'] == 1
+
+
+def test_repeated_sync_replaces_the_snapshot(store, monkeypatch):
+    monkeypatch.setattr(quantitative_plant, 'iter_trait_records', lambda traits: iter(RECORDS))
+
+    for _ in range(3):
+        assert quantitative_plant.sync(store=store) == 4
+
+    assert store.aggregate('height')['count'] == 3
+
+
+def test_partial_sync_keeps_other_traits(store):
+    _sync(store, RECORDS)
+
+    _sync(store, [{'species': 'Ficus lyrata', 'trait': 'height', 'value': 12.0}], traits=['height'])
+
+    assert store.aggregate('height')['count'] == 1
+    assert store.species_traits('Ficus lyrata') == {'height': 12.0, 'leaf_area': 300.0}
+
+
+def test_failed_download_keeps_the_previous_snapshot(store):
+    _sync(store, RECORDS)
+
+    def broken():
+        yield RECORDS[0]
+        raise ConnectionError("lost the API halfway")
+
+    with pytest.raises(ConnectionError):
+        store.load_snapshot(broken())
+    store.compact()
+
+    assert store.aggregate('height')['count'] == 3
+
+
+def test_compaction_switches_readers_over_whole(store, tmp_path):
+    _sync(store, RECORDS)
+    reader = TraitStore(str(tmp_path))
+    assert reader.aggregate('leaf_area')['count'] == 1
+
+    more = RECORDS + [{'species': 'Aloe vera', 'trait': 'height', 'value': 0.5}] * 5
+    _sync(store, more)
+
+    # The reader was opened before both syncs and sees the new offsets and columns together
+    assert reader.aggregate('leaf_area')['count'] == 1
+    assert reader.aggregate('height')['count'] == 8
+    assert reader.species_in_range('height', high=1) == {'Aloe vera': 0.5}
+
+
+def test_failed_compaction_keeps_the_previous_generation(store, monkeypatch):
+    _sync(store, RECORDS)
+    store.load_snapshot(iter(RECORDS[:1]))
+
+    def fail(*args, **kwargs):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(np, 'save', fail)
+    with pytest.raises(OSError):
+        store.compact()
+
+    reopened = TraitStore(store.path)
+    assert reopened.aggregate('height')['count'] == 3
+    assert reopened.species_traits('Ficus lyrata') == {'height': 10.0, 'leaf_area': 300.0}
@@ -0,0 +1,68 @@
+"""Tests for the plant recommender and its incremental refresh."""
+
+from datetime import timedelta
+
+import pytest
+
+import crud
+from model import db, Plant
+from utils.recommendations import Recommender
+
+
+@pytest.fixture
+def catalogue(session):
+    """Two plants with care notes for a region and one outdoor plant without."""
+    region = crud.create_region("Pacific Northwest", "8b")
+    plants = [crud.create_plant(name, indoor=indoor, outdoor=not indoor)
+              for name, indoor in (("Aaa one", True), ("Bbb two", False), ("Ccc three", False))]
+    for plant in plants[:2]:
+        crud.create_plant_region_care(plant.plant_id, region.region_id)
+    return region.region_id, [plant.plant_id for plant in plants]
+
+
+def _candidates(recommender, region_id):
+    mask = recommender.candidates(region_id)
+    return {int(plant_id) for plant_id in recommender.plant_ids[mask]}
+
+
+def test_candidates_are_regional_or_indoor(catalogue):
+    region_id, (one, two, three) = catalogue
+
+    recommender = Recommender.build()
+
+    assert _candidates(recommender, region_id) == {one, two}
+    assert [plant_id for plant_id, score in recommender.score(region_id, collection_ids=[one])] == [two]
+
+
+def test_refresh_rebuilds_when_a_plant_is_deleted_and_another_added(catalogue):
+    region_id, (one, two, three) = catalogue
+    recommender = Recommender.build()
+
+    assert crud.delete_plant(one)
+    crud.create_plant("Ddd four")
+
+    assert recommender.refreshed() is None
+
+
+def test_refresh_updates_candidates_when_indoor_flips(catalogue):
+    region_id, (one, two, three) = catalogue
+    recommender = Recommender.build()
+
+    crud.update_plant(three, indoor=True)
+    refreshed = recommender.refreshed()
+
+    assert three in _candidates(refreshed, region_id)
+    assert three not in _candidates(recommender, region_id)
+
+
+def test_refresh_picks_up_rows_committed_late(catalogue):
+    region_id, (one, two, three) = catalogue
+    recommender = Recommender.build()
+
+    # Stamped before the newest plant already loaded, but committed after the build
+    late = Plant(scientific_name="Late commit", indoor=True,
+                 last_updated=recommender.watermark - timedelta(seconds=30))
+    db.session.add(late)
+    db.session.commit()
+
+    assert late.plant_id in set(recommender.refreshed().plant_ids.tolist())
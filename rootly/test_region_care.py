@@ -0,0 +1,37 @@
+"""Tests for region-adjusted care on the collection page."""
+
+import crud
+from utils.region_care import get_region_care_many
+
+
+def _my_plants(app, user_id):
+    client = app.test_client()
+    with client.session_transaction() as cookie:
+        cookie['user_id'] = user_id
+    return client.get('/my-plants').get_data(as_text=True)
+
+
+def test_region_overrides_base_care(app, collection):
+    user_id, plant_id, user_plant_id = collection
+    region = crud.create_region("Coastal")
+    crud.update_user(user_id, region_id=region.region_id)
+    crud.create_plant_care_details(plant_id, watering_frequency="Weekly")
+    crud.create_plant_region_care(plant_id, region.region_id, watering_frequency="Every 10 days",
+                                  seasonal_notes="Mist in summer")
+
+    page = _my_plants(app, user_id)
+
+    assert "Water: Every 10 days (adjusted for your region)" in page
+    assert "Mist in summer" in page
+
+
+def test_care_changes_reach_cached_entries(session, collection):
+    user_id, plant_id, user_plant_id = collection
+    crud.create_plant_care_details(plant_id, watering_frequency="Weekly")
+    assert get_region_care_many(None, [plant_id])[plant_id]['watering_frequency'] == "Weekly"
+
+    crud.update_plant_care_details(plant_id, watering_frequency="Fortnightly")
+
+    care = get_region_care_many(None, [plant_id, plant_id + 1000])
+    assert care[plant_id]['watering_frequency'] == "Fortnightly"
+    assert care[plant_id + 1000]['region_adjusted'] is False
@@ -0,0 +1,75 @@
+"""Tests for primary/replica read routing, on two SQLite files."""
+
+import time
+
+import pytest
+from sqlalchemy import insert, select, update
+
+from model import db, Plant
+from testing import create_file_test_app
+from utils.replicas import STICKY_KEY, RoutingSession, read_replica
+
+
+@pytest.fixture(scope='module')
+def replica_app(tmp_path_factory):
+    """An app whose primary and replica hold different names for plant 1."""
+    app = create_file_test_app(str(tmp_path_factory.mktemp('replicas')), replica=True)
+
+    with app.app_context():
+        db.session.execute(insert(Plant), [{'plant_id': 1, 'scientific_name': 'On primary'}])
+        db.session.commit()
+        with db.engines['replica_0'].begin() as conn:
+            conn.execute(insert(Plant), [{'plant_id': 1, 'scientific_name': 'On replica'}])
+
+    @app.get('/plant')
+    def read_plant():
+        return db.session.scalar(select(Plant.scientific_name).where(Plant.plant_id == 1))
+
+    @app.post('/plant')
+    def touch_plant():
+        db.session.execute(update(Plant).where(Plant.plant_id == 1)
+                           .values(common_name='Touched'))
+        db.session.commit()
+        return read_plant()
+
+    return app
+
+
+def _plant_name():
+    return db.session.scalar(select(Plant.scientific_name).where(Plant.plant_id == 1))
+
+
+def test_rolled_back_session_routes(session):
+    assert isinstance(db.session(), RoutingSession)
+
+
+def test_get_reads_from_replica(replica_app):
+    client = replica_app.test_client()
+
+    assert client.get('/plant').get_data(as_text=True) == 'On replica'
+
+
+def test_reads_after_a_flush_go_to_primary(replica_app):
+    with replica_app.app_context(), read_replica():
+        assert _plant_name() == 'On replica'
+
+        db.session.get(Plant, 1).common_name = 'Flushed'
+        db.session.flush()
+
+        assert _plant_name() == 'On primary'
+        db.session.rollback()
+
+
+def test_write_pins_next_request_to_primary(replica_app):
+    client = replica_app.test_client()
+
+    assert client.post('/plant').get_data(as_text=True) == 'On primary'
+    with client.session_transaction() as cookie:
+        assert cookie[STICKY_KEY] > time.time()
+    assert client.get('/plant').get_data(as_text=True) == 'On primary'
+
+    with client.session_transaction() as cookie:
+        cookie[STICKY_KEY] = time.time() - 1
+    assert client.get('/plant').get_data(as_text=True) == 'On replica'
+
+    assert replica_app.test_client().get('/plant').get_data(as_text=True) == 'On replica'
@@ -0,0 +1,78 @@
+"""Tests for the care-event rollups and the plant page that reads them."""
+
+from datetime import date, datetime, timedelta
+
+import crud
+from model import db, UserCareDaily, UserPlantCareSummary
+from utils.rollups import get_plant_care_summary, get_user_care_stats, rebuild_rollups
+
+
+def _log(user_plant_id, *days, event_type='watering'):
+    crud.create_care_events_many([
+        {'user_plant_id': user_plant_id, 'event_type': event_type,
+         'date': datetime.combine(day, datetime.min.time()) + timedelta(hours=9)}
+        for day in days
+    ])
+
+
+def _rollups(user_id, user_plant_id):
+    summary = db.session.get(UserPlantCareSummary, user_plant_id)
+    daily = UserCareDaily.query.filter_by(user_id=user_id).order_by(UserCareDaily.day).all()
+    return ((summary.event_count, summary.watering_count, summary.last_care_day,
+             summary.current_streak, summary.longest_streak),
+            [(row.day, row.event_count, row.watering_count, row.streak) for row in daily])
+
+
+def test_streaks_count_consecutive_days(collection):
+    user_id, plant_id, user_plant_id = collection
+    today = date(2024, 5, 10)
+    days = [today - timedelta(days=n) for n in (9, 8, 7, 2, 1, 0)]
+
+    _log(user_plant_id, *days[:3])
+    _log(user_plant_id, *days[3:])
+    _log(user_plant_id, today, event_type='misting')
+
+    summary = get_plant_care_summary(user_plant_id, today=today)
+    assert (summary['event_count'], summary['watering_count']) == (7, 6)
+    assert (summary['current_streak'], summary['longest_streak']) == (3, 3)
+    assert get_plant_care_summary(user_plant_id, today=today + timedelta(days=2))['current_streak'] == 0
+
+    stats = get_user_care_stats(user_id, today=today)
+    assert (stats['total_events'], stats['events_this_week'], stats['current_streak']) == (7, 4, 3)
+
+
+def test_incremental_rollups_match_a_rebuild(collection):
+    user_id, plant_id, user_plant_id = collection
+    start = date(2024, 1, 1)
+    for offset in (0, 1, 2, 4, 5, 5, 9):
+        _log(user_plant_id, start + timedelta(days=offset))
+    _log(user_plant_id, start + timedelta(days=10), event_type='fertilizing')
+
+    incremental = _rollups(user_id, user_plant_id)
+    rebuild_rollups(user_id)
+    db.session.expire_all()
+
+    assert _rollups(user_id, user_plant_id) == incremental
+
+
+def test_plant_page_pages_care_history(app, collection):
+    user_id, plant_id, user_plant_id = collection
+    start = date(2024, 1, 1)
+    _log(user_plant_id, *[start + timedelta(days=n) for n in range(crud.CARE_EVENT_PAGE_SIZE + 5)])
+    client = app.test_client()
+    with client.session_transaction() as cookie:
+        cookie['user_id'] = user_id
+
+    events, more = crud.get_care_event_page(user_plant_id)
+    assert len(events) == crud.CARE_EVENT_PAGE_SIZE and more
+    older, more = crud.get_care_event_page(user_plant_id, before_event_id=events[-1].event_id)
+    assert len(older) == 5 and not more
+    assert older[0].date < events[-1].date
+
+    page = client.get(f'/user-plant/{user_plant_id}').get_data(as_text=True)
+    assert f'{crud.CARE_EVENT_PAGE_SIZE + 5} events in total' in page
+    assert f'?before={events[-1].event_id}' in page
+
+    page = client.get(f'/user-plant/{user_plant_id}?before={events[-1].event_id}').get_data(as_text=True)
+    assert page.count('<td>watering</td>') == 5
+    assert '?before=' not in page
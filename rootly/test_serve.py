@@ -0,0 +1,63 @@
+"""Tests for gevent serving mode and its pool settings."""
+
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+from sqlalchemy.pool import StaticPool
+
+from model import get_engine_options
+from testing import TEST_PASSWORD_HASH_ITERATIONS
+
+# serve.py monkey-patches the whole process, so it runs in a child
+SERVE_CHECK = textwrap.dedent("""
+    import time
+    import urllib.request
+
+    import serve
+    from gevent.pool import Pool
+    from model import connect_to_db
+    from utils import passwords
+
+    connect_to_db(serve.app, 'sqlite://')
+    serve.app.add_url_rule('/_slow', 'slow', lambda: time.sleep(0.2) or 'ok')
+    server = serve.make_server('127.0.0.1', 0)
+    server.start()
+    url = f"http://127.0.0.1:{server.server_port}/_slow"
+
+    start = time.perf_counter()
+    bodies = Pool(20).map(lambda _: urllib.request.urlopen(url).read(), range(20))
+    print(bodies.count(b'ok'), round(time.perf_counter() - start, 2))
+    print(passwords._gevent_patched(),
+          passwords.verify_password(passwords.hash_password('secret'), 'secret'))
+""")
+
+
+def test_engine_options_come_from_the_environment(monkeypatch):
+    monkeypatch.setenv('DB_POOL_SIZE', '20')
+    monkeypatch.setenv('DB_POOL_TIMEOUT', '2.5')
+
+    options = get_engine_options('postgresql:///rootly')
+
+    assert (options['pool_size'], options['max_overflow'], options['pool_timeout']) == (20, 10, 2.5)
+    assert options['pool_pre_ping']
+    assert get_engine_options('sqlite://')['poolclass'] is StaticPool
+    assert 'pool_size' not in get_engine_options('sqlite:////tmp/rootly.db')
+
+
+def test_gevent_serves_slow_requests_concurrently():
+    pytest.importorskip('gevent')
+    pytest.importorskip('psycogreen')
+    env = dict(os.environ, PASSWORD_HASH_ITERATIONS=str(TEST_PASSWORD_HASH_ITERATIONS))
+
+    result = subprocess.run([sys.executable, '-c', SERVE_CHECK], cwd=os.path.dirname(__file__),
+                            env=env, capture_output=True, text=True, timeout=60)
+
+    assert result.returncode == 0, result.stderr
+    timing, hashing = result.stdout.splitlines()[-2:]
+    served, elapsed = timing.split()
+    # One at a time would take 4 s
+    assert served == '20' and float(elapsed) < 2
+    assert hashing == 'True True'
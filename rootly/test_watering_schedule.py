@@ -0,0 +1,59 @@
+"""Tests for the nightly climate-adjusted watering schedule."""
+
+from datetime import date, datetime
+
+import numpy as np
+import pytest
+
+import crud
+from model import db, UserPlant
+from utils.watering_schedule import climate_factor, compute_due_dates, update_watering_schedules
+
+TODAY = date(2024, 6, 1)
+
+
+@pytest.mark.parametrize('temperature, humidity, factor', [
+    (65, None, 1.0),
+    (75, 'moderate', 0.85),
+    (55, 'High', 1.15 * 1.15),
+    (200, None, 0.6),
+    (-50, 'low', 1.4 * 0.85),
+    (None, 'swampy', 1.0),
+])
+def test_climate_factor(temperature, humidity, factor):
+    assert climate_factor(temperature, humidity) == pytest.approx(factor)
+
+
+def test_due_dates_for_unknown_species_and_regions():
+    intervals = np.array([np.nan, 7.0, np.nan])
+    factors = np.array([1.0, 0.5])
+
+    due = compute_due_dates(
+        plant_ids=np.array([1, 1, 1, 2, 9]),
+        region_ids=np.array([0, 1, 7, 0, 0]),
+        last_watered=np.array(['2024-05-30', '2024-05-30', 'NaT', '2024-05-30', '2024-05-30'],
+                              dtype='datetime64[D]'),
+        intervals=intervals, factors=factors, today=TODAY)
+
+    assert due.astype(str).tolist() == ['2024-06-06', '2024-06-03', '2024-06-01', 'NaT', 'NaT']
+
+
+def test_schedule_follows_watering_and_status(session, collection):
+    user_id, plant_id, user_plant_id = collection
+    region = crud.create_region("Desert", avg_temperature=85, humidity_level='low')
+    crud.update_user(user_id, region_id=region.region_id)
+    crud.create_plant_care_details(plant_id, watering_interval_days=10)
+    idle_id = crud.create_user_plant(user_id, plant_id, nickname="Idle").user_plant_id
+
+    # 10 days x 0.7 (85°F) x 0.85 (low humidity) rounds to 6
+    crud.create_care_event(user_plant_id, 'watering', date=datetime(2024, 5, 28, 9))
+    assert update_watering_schedules(today=TODAY, chunk_size=1) == (2, 2)
+    assert session.get(UserPlant, user_plant_id).next_watering_date == date(2024, 6, 3)
+    assert session.get(UserPlant, idle_id).next_watering_date == TODAY
+
+    assert update_watering_schedules(today=TODAY) == (2, 0)
+
+    crud.update_user_plant(idle_id, status='given away')
+    assert update_watering_schedules(today=TODAY) == (1, 1)
+    db.session.expire_all()
+    assert session.get(UserPlant, idle_id).next_watering_date is None
@@ -0,0 +1,149 @@
+"""Tests for write-behind buffering of care events and identifications."""
+
+import glob
+import json
+import os
+import threading
+
+import pytest
+
+import crud
+from model import db, CareEvent, IdentificationHistory, UserPlantCareSummary
+from testing import count_rows
+from utils import write_behind
+from utils.write_behind import CARE_EVENT, IDENTIFICATION, WriteBehindBuffer, record_care_event
+
+
+@pytest.fixture
+def buffer(app, tmp_path):
+    return WriteBehindBuffer(app, directory=str(tmp_path), max_rows=1000, max_delay=60)
+
+
+def _care_event(user_plant_id, **row):
+    return {'user_plant_id': user_plant_id, 'event_type': 'watering', 'notes': None,
+            'date': None, **row}
+
+
+def _segments(buffer, prefix='seg'):
+    return glob.glob(os.path.join(buffer.directory, f"{prefix}-*.ndjson"))
+
+
+def test_write_behind_flush_writes_rows_and_rollups(collection, buffer):
+    user_id, plant_id, user_plant_id = collection
+    for _ in range(3):
+        buffer.submit(CARE_EVENT, _care_event(user_plant_id))
+    buffer.submit(IDENTIFICATION, {'user_id': user_id, 'image_url': '/static/uploads/monty.jpg',
+                                   'identified_plant_id': plant_id, 'confidence_score': 0.9,
+                                   'user_plant_id': None, 'added_to_collection': False,
+                                   'identified_at': None})
+
+    assert buffer.flush() == 4
+
+    assert _segments(buffer) == []
+    assert count_rows(CareEvent, CareEvent.user_plant_id == user_plant_id) == 3
+    assert count_rows(IdentificationHistory, IdentificationHistory.user_id == user_id) == 1
+    assert db.session.get(UserPlantCareSummary, user_plant_id).watering_count == 3
+
+
+def test_write_behind_replay_after_crash_writes_nothing_twice(collection, buffer):
+    user_id, plant_id, user_plant_id = collection
+    buffer.submit(CARE_EVENT, _care_event(user_plant_id))
+    buffer.submit(CARE_EVENT, _care_event(user_plant_id))
+    with buffer._lock:
+        buffer._close_segment()
+    [path] = _segments(buffer)
+    with open(path, 'rb') as segment:
+        contents = segment.read()
+
+    assert buffer.flush() == 2
+    # As if the process died after the commit but before deleting the segment
+    with open(path, 'wb') as segment:
+        segment.write(contents)
+    assert buffer.flush() == 0
+
+    assert count_rows(CareEvent, CareEvent.user_plant_id == user_plant_id) == 2
+    assert db.session.get(UserPlantCareSummary, user_plant_id).watering_count == 2
+
+
+def test_write_behind_dead_letters_rows_that_cannot_be_written(collection, buffer):
+    user_id, plant_id, user_plant_id = collection
+    buffer.submit(CARE_EVENT, _care_event(user_plant_id))
+    buffer.submit(CARE_EVENT, _care_event(user_plant_id))
+    with buffer._lock:
+        buffer._close_segment()
+    [path] = _segments(buffer)
+    with open(path, 'ab') as segment:
+        poison = {'kind': CARE_EVENT, 'row': {**_care_event(user_plant_id), 'date': 'yesterday'}}
+        segment.write(json.dumps(poison).encode() + b'\n')
+
+    assert buffer.flush() == 2
+
+    assert _segments(buffer) == []
+    [dead_path] = _segments(buffer, 'dead')
+    with open(dead_path) as dead:
+        [record] = [json.loads(line) for line in dead]
+    assert record['row']['date'] == 'yesterday' and 'error' in record
+    assert count_rows(CareEvent, CareEvent.user_plant_id == user_plant_id) == 2
+
+
+def test_write_behind_drops_rows_whose_owner_is_gone(collection, buffer):
+    user_id, plant_id, user_plant_id = collection
+    other_plant_id = crud.create_plant("Ficus lyrata").plant_id
+    buffer.submit(CARE_EVENT, _care_event(user_plant_id))
+    buffer.submit(IDENTIFICATION, {'user_id': user_id, 'image_url': '/static/uploads/fig.jpg',
+                                   'identified_plant_id': other_plant_id, 'confidence_score': 0.8,
+                                   'user_plant_id': user_plant_id, 'added_to_collection': False,
+                                   'identified_at': None})
+    buffer.submit(IDENTIFICATION, {'user_id': user_id, 'image_url': '/static/uploads/gone.jpg',
+                                   'identified_plant_id': other_plant_id + 1000,
+                                   'confidence_score': 0.8, 'user_plant_id': None,
+                                   'added_to_collection': False, 'identified_at': None})
+    crud.delete_user_plant(user_plant_id)
+
+    assert buffer.flush() == 1
+
+    assert count_rows(CareEvent, CareEvent.user_plant_id == user_plant_id) == 0
+    identification = db.session.execute(
+        db.select(IdentificationHistory).where(IdentificationHistory.user_id == user_id)
+    ).scalar_one()
+    assert identification.identified_plant_id == other_plant_id
+    assert identification.user_plant_id is None
+
+
+@pytest.mark.parametrize('user_plant_id, event_type, notes', [
+    ('1', 'watering', None),
+    (True, 'watering', None),
+    (1, None, None),
+    (1, '  ', None),
+    (1, 'w' * 51, None),
+    (1, 'watering', ['not', 'text']),
+])
+def test_write_behind_refuses_bad_care_events_before_buffering(buffer, monkeypatch,
+                                                               user_plant_id, event_type, notes):
+    monkeypatch.setattr(write_behind, '_buffer', buffer)
+
+    with pytest.raises(ValueError):
+        record_care_event(user_plant_id, event_type, notes=notes)
+
+    assert _segments(buffer) == []
+
+
+def test_write_behind_submits_race_flushes_without_losing_rows(collection, buffer):
+    user_id, plant_id, user_plant_id = collection
+
+    def submit_many():
+        for _ in range(25):
+            buffer.submit(CARE_EVENT, _care_event(user_plant_id))
+
+    threads = [threading.Thread(target=submit_many) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    written = 0
+    while any(thread.is_alive() for thread in threads):
+        written += buffer.flush()
+    for thread in threads:
+        thread.join()
+    written += buffer.flush()
+
+    assert written == 100
+    assert count_rows(CareEvent, CareEvent.user_plant_id == user_plant_id) == 100
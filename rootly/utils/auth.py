@@ -0,0 +1,97 @@
+"""Login and ownership helpers for Rootly routes.
+
+The logged-in user is resolved at most once per request and kept on flask.g.
+get_current_identity reads a few columns and, when IDENTITY_CACHE_TTL is
+set, serves them from a short-lived in-process cache instead of the
+database. crud drops a user's cached identity whenever the user changes.
+"""
+
+import threading
+import time
+from collections import namedtuple
+from functools import wraps
+
+from flask import abort, current_app, flash, g, redirect, session
+from sqlalchemy import select
+
+from model import db, User, UserPlant
+
+Identity = namedtuple('Identity', ['user_id', 'username', 'email', 'region_id'])
+
+_identity_cache = {}
+_identity_lock = threading.Lock()
+
+
+def login_required(message='Please log in to continue.'):
+    """Redirect to the login page with `message` unless a user is logged in."""
+
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            if 'user_id' not in session:
+                flash(message)
+                return redirect('/login')
+            return view(*args, **kwargs)
+        return wrapped
+
+    return decorator
+
+
+def get_current_identity():
+    """Return an Identity for the logged-in user, or None."""
+    if 'current_identity' in g:
+        return g.current_identity
+
+    user_id = session.get('user_id')
+    g.current_identity = _load_identity(user_id) if user_id is not None else None
+    return g.current_identity
+
+
+def _load_identity(user_id):
+    """Load an Identity, going through the TTL cache when it is enabled."""
+    ttl = current_app.config.get('IDENTITY_CACHE_TTL', 0)
+
+    if ttl:
+        with _identity_lock:
+            cached = _identity_cache.get(user_id)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+
+    row = db.session.execute(
+        select(User.user_id, User.username, User.email, User.region_id)
+        .where(User.user_id == user_id)
+    ).first()
+    identity = Identity(*row) if row else None
+
+    if ttl and identity:
+        with _identity_lock:
+            _identity_cache[user_id] = (time.monotonic() + ttl, identity)
+
+    return identity
+
+
+def invalidate_identity(user_id):
+    """Drop a cached identity after the user's details change."""
+    with _identity_lock:
+        _identity_cache.pop(user_id, None)
+
+
+def get_owned_or_404(model, object_id):
+    """Fetch an object and its owner in a single query.
+
+    `model` is UserPlant or anything with a user_plant_id column. Returns
+    the object if it belongs to the logged-in user, None if it belongs to
+    someone else, and aborts with a 404 if it does not exist.
+    """
+    primary_key = model.__mapper__.primary_key[0]
+    stmt = select(model, UserPlant.user_id).where(primary_key == object_id)
+
+    if model is not UserPlant:
+        stmt = stmt.join(UserPlant, UserPlant.user_plant_id == model.user_plant_id)
+
+    row = db.session.execute(stmt).first()
+    if row is None:
+        abort(404)
+
+    obj, owner_id = row
+    return obj if owner_id == session.get('user_id') else None
@@ -0,0 +1,77 @@
+"""In-process caching helpers for Rootly."""
+
+import threading
+import time
+
+
+class TTLCache:
+    """A small thread-safe cache whose entries expire after `ttl` seconds.
+
+    get_or_set computes a missing value once even when many threads ask for
+    it at the same moment; the others wait for that result instead of all
+    hitting the database.
+    """
+
+    def __init__(self, ttl=60, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    def get(self, key, default=None):
+        """Return the cached value for key, or default if missing or expired."""
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            return default
+        return entry[1]
+
+    def set(self, key, value, ttl=None):
+        """Cache value under key."""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (expires_at, value)
+            if len(self._entries) > self.max_entries:
+                self._evict()
+
+    def delete(self, key):
+        """Remove key from the cache."""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Remove everything."""
+        with self._lock:
+            self._entries.clear()
+
+    def get_or_set(self, key, compute, ttl=None):
+        """Return the cached value for key, computing and caching it if needed."""
+        missing = object()
+        value = self.get(key, missing)
+        if value is not missing:
+            return value
+
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        try:
+            with key_lock:
+                value = self.get(key, missing)
+                if value is missing:
+                    value = compute()
+                    self.set(key, value, ttl)
+        finally:
+            with self._lock:
+                if not key_lock.locked():
+                    self._key_locks.pop(key, None)
+
+        return value
+
+    def _evict(self):
+        """Drop expired entries, then the oldest ones, until under max_entries."""
+        now = time.monotonic()
+        for key in [key for key, (expires_at, _) in self._entries.items() if expires_at < now]:
+            del self._entries[key]
+        while len(self._entries) > self.max_entries:
+            del self._entries[next(iter(self._entries))]
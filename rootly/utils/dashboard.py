@@ -0,0 +1,115 @@
+"""Per-user dashboard summary for Rootly.
+
+Everything the dashboard shows is computed in one SQL statement of scalar
+subqueries and cached per user. Write paths that change any of the numbers
+call invalidate_dashboard_summary after committing. The cache is per
+process, so other workers may show numbers up to DASHBOARD_CACHE_TTL
+seconds old.
+"""
+
+import os
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import Interval, func, literal, or_, select
+
+from model import db, UserPlant, Reminder, HealthAssessment, IdentificationHistory
+from model import PlantCareDetails, UserPlantCareSummary, UserCareDaily
+from utils.cache import TTLCache
+
+_summaries = TTLCache(ttl=int(os.environ.get('DASHBOARD_CACHE_TTL', 300)))
+
+
+def _count(*where, join=None):
+    """Build a scalar count subquery."""
+    stmt = select(func.count())
+    if join is not None:
+        stmt = stmt.select_from(join)
+    return stmt.where(*where).scalar_subquery()
+
+
+def _watered_within_interval(now):
+    """Condition: the plant was last watered less than its interval ago.
+
+    Postgres does the date arithmetic with intervals; SQLite has none, so
+    the same comparison is made in Julian days there.
+    """
+    if db.engine.dialect.name == 'sqlite':
+        return (func.julianday(now) - func.julianday(UserPlantCareSummary.last_watered_at)
+                < PlantCareDetails.watering_interval_days)
+    return (UserPlantCareSummary.last_watered_at
+            + literal(timedelta(days=1), Interval) * PlantCareDetails.watering_interval_days
+            > now)
+
+
+def compute_dashboard_summary(user_id, today=None):
+    """Run the dashboard aggregate query for a user and return a dict."""
+    today = today or date.today()
+    now = datetime.utcnow()
+    week_ago = today - timedelta(days=7)
+
+    reminders = Reminder.__table__.join(
+        UserPlant.__table__, UserPlant.user_plant_id == Reminder.user_plant_id)
+    assessments = HealthAssessment.__table__.join(
+        UserPlant.__table__, UserPlant.user_plant_id == HealthAssessment.user_plant_id)
+
+    # A plant needs water when a watering reminder is due, or when it has a
+    # known interval and has never been watered or was last watered longer
+    # ago than that.
+    watering_due = select(Reminder.reminder_id).where(
+        Reminder.user_plant_id == UserPlant.user_plant_id,
+        Reminder.is_active == True,
+        func.lower(Reminder.reminder_type) == 'watering',
+        Reminder.next_reminder_date <= today
+    ).exists()
+    overdue_by_interval = select(PlantCareDetails.care_id).outerjoin(
+        UserPlantCareSummary, UserPlantCareSummary.user_plant_id == UserPlant.user_plant_id
+    ).where(
+        PlantCareDetails.plant_id == UserPlant.plant_id,
+        PlantCareDetails.watering_interval_days != None,
+        or_(UserPlantCareSummary.last_watered_at == None, ~_watered_within_interval(now))
+    ).exists()
+    needs_water = _count(UserPlant.user_id == user_id, UserPlant.status == 'active',
+                         or_(watering_due, overdue_by_interval))
+
+    stmt = select(
+        _count(UserPlant.user_id == user_id).label('plant_count'),
+        _count(UserPlant.user_id == user_id, Reminder.is_active == True,
+               Reminder.next_reminder_date < today, join=reminders).label('overdue_reminders'),
+        _count(UserPlant.user_id == user_id, Reminder.is_active == True,
+               Reminder.next_reminder_date >= today,
+               Reminder.next_reminder_date <= today + timedelta(days=7),
+               join=reminders).label('upcoming_reminders'),
+        needs_water.label('plants_needing_water'),
+        _count(UserPlant.user_id == user_id, HealthAssessment.resolved == False,
+               join=assessments).label('unresolved_assessments'),
+        _count(IdentificationHistory.user_id == user_id).label('plants_identified'),
+        select(func.coalesce(func.sum(UserCareDaily.event_count), 0))
+            .where(UserCareDaily.user_id == user_id, UserCareDaily.day > week_ago)
+            .scalar_subquery().label('care_events_this_week'),
+        select(func.max(UserPlantCareSummary.last_event_at))
+            .join(UserPlant, UserPlant.user_plant_id == UserPlantCareSummary.user_plant_id)
+            .where(UserPlant.user_id == user_id)
+            .scalar_subquery().label('last_activity_at'),
+    )
+
+    return dict(db.session.execute(stmt).one()._mapping)
+
+
+def get_dashboard_summary(user_id):
+    """Return the cached dashboard summary for a user, computing it if needed."""
+    today = date.today()
+    return _summaries.get_or_set((user_id, today),
+                                 lambda: compute_dashboard_summary(user_id, today))
+
+
+def invalidate_dashboard_summary(user_id):
+    """Forget a user's cached summary after a write that changes it."""
+    _summaries.delete((user_id, date.today()))
+
+
+def summary_to_json(summary):
+    """Return a copy of summary with dates as ISO strings."""
+    return {
+        key: value.isoformat() if isinstance(value, (date, datetime)) else value
+        for key, value in summary.items()
+    }
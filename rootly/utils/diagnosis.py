@@ -0,0 +1,255 @@
+"""Rank likely health issues for a plant's symptoms.
+
+PlantHealthIssue.symptoms is free text and HealthAssessment.symptoms is a
+list of short phrases. Both are reduced to the same normalised terms (lower
+case, light stemming, a few synonyms, plus adjacent-word pairs so "yellow
+leaves" beats "yellow" alone) and the issue catalogue is kept as an inverted
+index of TF-IDF weights. Ranking a set of symptoms adds up the postings of
+its terms into one score per issue with NumPy, then boosts issues recorded
+for the same species, and to a lesser degree the same genus.
+
+The index is built once per process and rebuilt after crud adds an issue,
+or after DIAGNOSIS_INDEX_TTL seconds (default 600) for other processes.
+
+Re-rank every unresolved assessment, optionally filling in missing
+diagnoses with the best match:
+
+    python -m utils.diagnosis [--apply]
+"""
+
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+from sqlalchemy import bindparam, or_, select, update
+
+from model import db, HealthAssessment, Plant, PlantHealthIssue, UserPlant
+from utils.plant_graph import genus_of
+
+SPECIES_BOOST = 2.0
+GENUS_BOOST = 1.3
+NAME_WEIGHT = 0.5
+
+STOPWORDS = {'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'has', 'have',
+             'in', 'is', 'it', 'its', 'of', 'on', 'or', 'that', 'the', 'to', 'with', 'some',
+             'very', 'may', 'can', 'become', 'becomes', 'appear', 'appears', 'plant'}
+
+SYNONYMS = {'leaf': 'leaves', 'foliage': 'leaves', 'yellowing': 'yellow', 'yellowed': 'yellow',
+            'browning': 'brown', 'browned': 'brown', 'wilting': 'wilt', 'wilted': 'wilt',
+            'drooping': 'droop', 'droopy': 'droop', 'spotted': 'spots', 'spotting': 'spots',
+            'spot': 'spots', 'curling': 'curl', 'curled': 'curl', 'mushy': 'soft',
+            'rotting': 'rot', 'rotten': 'rot', 'webbing': 'webs', 'web': 'webs',
+            'bugs': 'insects', 'insect': 'insects', 'pests': 'insects', 'pest': 'insects'}
+
+CANONICAL_TERMS = set(SYNONYMS.values())
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def _stem(word):
+    """Map a word to its normalised term."""
+    if word in SYNONYMS:
+        return SYNONYMS[word]
+    if word in CANONICAL_TERMS:
+        return word
+    for suffix in ('ing', 'ed', 'es', 's'):
+        if len(word) > len(suffix) + 3 and word.endswith(suffix):
+            stem = word[:-len(suffix)]
+            return SYNONYMS.get(stem, stem)
+    return word
+
+
+def tokenize(text):
+    """Return the normalised terms and adjacent-term pairs in text."""
+    words = [_stem(word) for word in re.findall(r"[a-z]+", (text or '').lower())
+             if word not in STOPWORDS and len(word) > 1]
+    return words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+
+
+def tokenize_symptoms(symptoms):
+    """Tokenize a list of symptom phrases without pairing words across phrases."""
+    terms = []
+    for symptom in symptoms or []:
+        terms.extend(tokenize(symptom))
+    return terms
+
+
+class DiagnosisIndex:
+    """Inverted index of TF-IDF term weights over PlantHealthIssue rows."""
+
+    def __init__(self, issues):
+        """Build from (issue_id, plant_id, issue_name, symptoms, severity, genus) tuples."""
+        self.built_at = time.monotonic()
+        self.issue_ids = np.array([issue[0] for issue in issues], dtype=np.int64)
+        self.issue_plants = np.array([issue[1] for issue in issues], dtype=np.int64)
+        self.genus_codes = {}
+        self.issue_genera = np.array([self.genus_codes.setdefault(issue[5], len(self.genus_codes))
+                                      for issue in issues], dtype=np.int64)
+        self.details = {issue[0]: {'issue_id': issue[0], 'plant_id': issue[1],
+                                   'issue_name': issue[2], 'severity': issue[4]}
+                        for issue in issues}
+
+        term_counts = []
+        for _, _, issue_name, symptoms, _, _ in issues:
+            counts = Counter(tokenize(symptoms))
+            for term in tokenize(issue_name):
+                counts[term] += NAME_WEIGHT
+            term_counts.append(counts)
+
+        document_frequency = Counter(term for counts in term_counts for term in counts)
+        total = len(issues)
+        self.idf = {term: math.log((1 + total) / (1 + df)) + 1
+                    for term, df in document_frequency.items()}
+
+        postings = {}
+        for position, counts in enumerate(term_counts):
+            # Log-scaled term frequency; name-only terms keep their fractional weight
+            weights = {term: (1 + math.log(count) if count >= 1 else count) * self.idf[term]
+                       for term, count in counts.items()}
+            norm = math.sqrt(sum(weight * weight for weight in weights.values())) or 1
+            for term, weight in weights.items():
+                postings.setdefault(term, ([], []))
+                postings[term][0].append(position)
+                postings[term][1].append(weight / norm)
+
+        self.postings = {term: (np.array(positions, dtype=np.int64),
+                                np.array(weights, dtype=np.float32))
+                         for term, (positions, weights) in postings.items()}
+
+    @classmethod
+    def load(cls):
+        """Build the index from every PlantHealthIssue in one query."""
+        rows = db.session.execute(
+            select(PlantHealthIssue.issue_id, PlantHealthIssue.plant_id,
+                   PlantHealthIssue.issue_name, PlantHealthIssue.symptoms,
+                   PlantHealthIssue.severity, Plant.scientific_name)
+            .join(Plant, Plant.plant_id == PlantHealthIssue.plant_id)
+            .order_by(PlantHealthIssue.issue_id)
+        ).all()
+        return cls([row[:5] + (genus_of(row[5]),) for row in rows])
+
+    def rank(self, symptoms, plant_id=None, genus=None, limit=5):
+        """Return up to `limit` (issue_id, score) pairs for a list of symptoms."""
+        if not len(self.issue_ids):
+            return []
+
+        scores = np.zeros(len(self.issue_ids), dtype=np.float32)
+        for term, count in Counter(tokenize_symptoms(symptoms)).items():
+            posting = self.postings.get(term)
+            if posting is not None:
+                np.add.at(scores, posting[0], posting[1] * self.idf[term] * count)
+
+        if plant_id is not None:
+            scores[self.issue_plants == plant_id] *= SPECIES_BOOST
+        if genus is not None and genus in self.genus_codes:
+            same_genus = self.issue_genera == self.genus_codes[genus]
+            same_genus &= self.issue_plants != (plant_id if plant_id is not None else -1)
+            scores[same_genus] *= GENUS_BOOST
+
+        matched = int(np.count_nonzero(scores))
+        limit = min(limit, matched)
+        if limit <= 0:
+            return []
+
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(int(self.issue_ids[i]), float(scores[i])) for i in top]
+
+
+def get_diagnosis_index():
+    """Return this process's index, building it on first use or when stale."""
+    global _index
+
+    ttl = int(os.environ.get('DIAGNOSIS_INDEX_TTL', 600))
+    index = _index
+    if index is not None and time.monotonic() - index.built_at < ttl:
+        return index
+
+    with _index_lock:
+        if _index is None or time.monotonic() - _index.built_at >= ttl:
+            _index = DiagnosisIndex.load()
+        return _index
+
+
+def invalidate_diagnosis_index():
+    """Drop the index so the next ranking rebuilds it with new issues."""
+    global _index
+
+    with _index_lock:
+        _index = None
+
+
+def suggest_issues(symptoms, plant_id=None, scientific_name=None, limit=3):
+    """Return the best-matching issues as dicts with issue details and a score."""
+    index = get_diagnosis_index()
+    ranked = index.rank(symptoms, plant_id, genus_of(scientific_name), limit)
+    return [dict(index.details[issue_id], score=round(score, 3)) for issue_id, score in ranked]
+
+
+def rerank_unresolved(limit=3, batch_size=1000):
+    """Rank issues for every unresolved assessment.
+
+    Returns {assessment_id: [(issue_id, score), ...]}.
+    """
+    index = get_diagnosis_index()
+    rows = db.session.execute(
+        select(HealthAssessment.assessment_id, HealthAssessment.symptoms,
+               UserPlant.plant_id, Plant.scientific_name)
+        .join(UserPlant, UserPlant.user_plant_id == HealthAssessment.user_plant_id)
+        .join(Plant, Plant.plant_id == UserPlant.plant_id)
+        .where(HealthAssessment.resolved == False),
+        execution_options={'yield_per': batch_size}
+    )
+
+    return {assessment_id: index.rank(symptoms, plant_id, genus_of(scientific_name), limit)
+            for assessment_id, symptoms, plant_id, scientific_name in rows}
+
+
+def apply_diagnoses(rankings):
+    """Fill in empty diagnoses with the best-ranked issue name; return the count."""
+    index = get_diagnosis_index()
+    rows = [{'target_id': assessment_id,
+             'best_issue': index.details[ranked[0][0]]['issue_name']}
+            for assessment_id, ranked in rankings.items() if ranked]
+    if not rows:
+        return 0
+
+    assessments = HealthAssessment.__table__
+    result = db.session.execute(
+        update(assessments)
+        .where(assessments.c.assessment_id == bindparam('target_id'),
+               or_(assessments.c.diagnosis == None, assessments.c.diagnosis == ''))
+        .values(diagnosis=bindparam('best_issue')),
+        rows
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+if __name__ == "__main__":
+    import sys
+
+    from server import app
+    from model import connect_to_db
+
+    connect_to_db(app, echo=False)
+
+    with app.app_context():
+        start = time.perf_counter()
+        index = get_diagnosis_index()
+        built = time.perf_counter() - start
+
+        start = time.perf_counter()
+        rankings = rerank_unresolved()
+        elapsed = time.perf_counter() - start
+
+        print(f"{len(index.issue_ids)} issues, {len(index.postings)} terms, built in {built * 1000:.1f} ms")
+        print(f"ranked {len(rankings)} unresolved assessments in {elapsed * 1000:.1f} ms")
+
+        if '--apply' in sys.argv[1:]:
+            print(f"filled in {apply_diagnoses(rankings)} empty diagnoses")
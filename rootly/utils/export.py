@@ -0,0 +1,185 @@
+"""Streaming export of everything a user has stored in Rootly.
+
+The export is a ZIP archive holding user.json, one NDJSON file per table
+(one JSON object per line) and an images/ folder with the user's uploads.
+It is produced as a generator of byte chunks: rows are read through
+server-side cursors EXPORT_BATCH_SIZE at a time (default 1000), each line
+is compressed straight into the archive, and compressed bytes are handed
+out as soon as EXPORT_CHUNK_SIZE of them (default 64 KiB) are ready. Memory
+use stays flat however many years of care history a user has.
+
+    python -m utils.export <user_id> [output.zip]
+"""
+
+import json
+import os
+import zipfile
+from datetime import date, datetime
+
+from sqlalchemy import select, union
+
+from model import db, CareEvent, HealthAssessment, IdentificationHistory, Reminder
+from model import Region, User, UserFavorite, UserPlant
+
+BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', 1000))
+CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', 64 * 1024))
+IMAGE_BLOCK_SIZE = 1024 * 1024
+UPLOAD_URL_PREFIX = '/static/uploads/'
+
+USER_FIELDS = ('user_id', 'username', 'email', 'region_id', 'preferences', 'created_at')
+
+
+class _Sink:
+    """Write-only file object that collects bytes until they are drained.
+
+    It cannot seek, so zipfile writes each member with a data descriptor
+    instead of going back to patch its header.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._offset = 0
+
+    def write(self, data):
+        self._buffer += data
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._offset
+
+    def flush(self):
+        pass
+
+    @property
+    def pending(self):
+        """Bytes written but not yet drained."""
+        return len(self._buffer)
+
+    def drain(self):
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+def _to_json(value):
+    """JSON default for dates and datetimes."""
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def _datasets(user_id):
+    """(filename, statement) for every table exported, each scoped to the user."""
+    user_plants = UserPlant.__table__
+    owned = UserPlant.user_id == user_id
+
+    def through_plants(model, order_by):
+        table = model.__table__
+        return (select(table)
+                .join(user_plants, user_plants.c.user_plant_id == table.c.user_plant_id)
+                .where(owned)
+                .order_by(order_by))
+
+    return [
+        ('user_plants.ndjson', select(user_plants).where(owned).order_by(UserPlant.user_plant_id)),
+        ('care_events.ndjson', through_plants(CareEvent, CareEvent.event_id)),
+        ('reminders.ndjson', through_plants(Reminder, Reminder.reminder_id)),
+        ('health_assessments.ndjson', through_plants(HealthAssessment,
+                                                     HealthAssessment.assessment_id)),
+        ('identifications.ndjson', select(IdentificationHistory.__table__)
+            .where(IdentificationHistory.user_id == user_id)
+            .order_by(IdentificationHistory.identification_id)),
+        ('favorites.ndjson', select(UserFavorite.__table__)
+            .where(UserFavorite.user_id == user_id)
+            .order_by(UserFavorite.favorite_id)),
+    ]
+
+
+def _image_urls(user_id):
+    """Statement for the distinct upload URLs referenced by the user's rows."""
+    return union(
+        select(UserPlant.image_url).where(UserPlant.user_id == user_id),
+        select(HealthAssessment.image_url)
+            .join(UserPlant, UserPlant.user_plant_id == HealthAssessment.user_plant_id)
+            .where(UserPlant.user_id == user_id),
+        select(IdentificationHistory.image_url).where(IdentificationHistory.user_id == user_id),
+    )
+
+
+def _upload_path(image_url, upload_dir):
+    """Return the local file for an uploaded image URL, or None if it is not one."""
+    if not image_url or not image_url.startswith(UPLOAD_URL_PREFIX):
+        return None
+    filename = os.path.basename(image_url[len(UPLOAD_URL_PREFIX):])
+    path = os.path.join(upload_dir, filename)
+    return path if filename and os.path.isfile(path) else None
+
+
+def iter_export(user_id, upload_dir, batch_size=BATCH_SIZE, chunk_size=CHUNK_SIZE):
+    """Yield a user's export archive as a sequence of byte chunks."""
+    sink = _Sink()
+
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        user = db.session.execute(
+            select(*(getattr(User, field) for field in USER_FIELDS), Region.name.label('region'))
+            .outerjoin(Region, Region.region_id == User.region_id)
+            .where(User.user_id == user_id)
+        ).one()
+        archive.writestr('user.json', json.dumps(dict(user._mapping), default=_to_json, indent=2))
+
+        for filename, stmt in _datasets(user_id):
+            rows = db.session.execute(stmt.execution_options(yield_per=batch_size))
+            with archive.open(filename, 'w', force_zip64=True) as member:
+                for row in rows:
+                    member.write(json.dumps(dict(row._mapping), default=_to_json).encode())
+                    member.write(b'\n')
+                    if sink.pending >= chunk_size:
+                        yield sink.drain()
+
+        urls = db.session.execute(_image_urls(user_id).execution_options(yield_per=batch_size))
+        for (image_url,) in urls:
+            path = _upload_path(image_url, upload_dir)
+            if path is None:
+                continue
+
+            # Images are already compressed, so store them as they are
+            info = zipfile.ZipInfo.from_file(path, f"images/{os.path.basename(path)}")
+            info.compress_type = zipfile.ZIP_STORED
+            with open(path, 'rb') as source, archive.open(info, 'w') as member:
+                while block := source.read(IMAGE_BLOCK_SIZE):
+                    member.write(block)
+                    if sink.pending >= chunk_size:
+                        yield sink.drain()
+
+    yield sink.drain()
+
+
+def export_filename(user_id):
+    """Download name for a user's export."""
+    return f"rootly-export-{user_id}-{date.today():%Y%m%d}.zip"
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    from server import app
+    from model import connect_to_db
+
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(2)
+
+    user_id = int(sys.argv[1])
+    output = sys.argv[2] if len(sys.argv) > 2 else export_filename(user_id)
+
+    connect_to_db(app, echo=False)
+
+    with app.app_context():
+        start = time.perf_counter()
+        with open(output, 'wb') as f:
+            for chunk in iter_export(user_id, app.config['UPLOAD_FOLDER']):
+                f.write(chunk)
+        elapsed = time.perf_counter() - start
+        print(f"wrote {output} ({os.path.getsize(output):,} bytes) in {elapsed:.1f} s")
@@ -0,0 +1,403 @@
+"""Bulk import of a plant collection from CSV or JSON.
+
+JSON is a list of plants (or {"plants": [...]}), each optionally carrying
+its own "care_events" and "reminders" lists:
+
+    [{"species": "Monstera deliciosa", "nickname": "Monty",
+      "location_in_home": "Living Room", "acquisition_date": "2023-04-01",
+      "care_events": [{"event_type": "watering", "date": "2024-05-01"}],
+      "reminders": [{"reminder_type": "watering", "frequency": "weekly"}]}]
+
+CSV has one record per row. A "type" column says what the row is: plant
+(the default), care_event or reminder. Care event and reminder rows name
+their plant in a "plant" column, matching the nickname (or species) of a
+plant row earlier in the file or a nickname already in the collection.
+
+Species are matched on scientific or common name, case-insensitively, with
+one query per chunk of IMPORT_CHUNK_SIZE records (default 500). Names that
+do not match exactly fall back to the closest catalogue name scoring at
+least IMPORT_FUZZY_CUTOFF (default 0.85). Each chunk is validated, then
+written with one multi-row insert per table in a single transaction.
+Invalid rows are skipped and reported with their row number.
+
+    python -m utils.importer <user_id> <file.csv|file.json>
+"""
+
+import csv
+import difflib
+import io
+import json
+import os
+from datetime import date, datetime
+from itertools import islice
+
+from sqlalchemy import String, func, or_, select
+
+import crud
+from model import db, CareEvent, Plant, Reminder, UserPlant
+
+CHUNK_SIZE = int(os.environ.get('IMPORT_CHUNK_SIZE', 500))
+FUZZY_CUTOFF = float(os.environ.get('IMPORT_FUZZY_CUTOFF', 0.85))
+
+PLANT, CARE_EVENT, REMINDER = 'plant', 'care_event', 'reminder'
+
+SPECIES_FIELDS = ('species', 'scientific_name', 'common_name')
+PLANT_FIELDS = ('nickname', 'location_in_home', 'acquisition_date', 'notes', 'status')
+CARE_EVENT_FIELDS = ('event_type', 'date', 'notes')
+REMINDER_FIELDS = ('reminder_type', 'frequency', 'next_reminder_date', 'is_active')
+
+COLUMNS = {PLANT: UserPlant.__table__.c, CARE_EVENT: CareEvent.__table__.c,
+           REMINDER: Reminder.__table__.c}
+
+
+class InvalidRecord(ValueError):
+    """A record that cannot be imported."""
+
+
+class ImportReport:
+    """What an import did: counts, skipped rows and fuzzy species matches."""
+
+    def __init__(self):
+        self.rows = 0
+        self.plants = 0
+        self.care_events = 0
+        self.reminders = 0
+        self.errors = []
+        self.fuzzy_matches = {}  # name as written -> catalogue name it was matched to
+
+    def error(self, row_number, message):
+        self.errors.append((row_number, message))
+
+    def __repr__(self):
+        return (f"<ImportReport rows={self.rows} plants={self.plants} "
+                f"care_events={self.care_events} reminders={self.reminders} "
+                f"errors={len(self.errors)}>")
+
+
+# ----------------------------------------
+# Parsing
+# ----------------------------------------
+
+def _blank_to_none(record):
+    return {key.strip().lower(): (value.strip() or None) if isinstance(value, str) else value
+            for key, value in record.items() if key}
+
+
+def iter_csv_records(stream):
+    """Yield (row_number, kind, record) from a CSV text stream."""
+    for row_number, row in enumerate(csv.DictReader(stream), start=2):
+        record = _blank_to_none(row)
+        kind = (record.pop('type', None) or PLANT).lower().replace(' ', '_').replace('-', '_')
+        yield row_number, kind, record
+
+
+def iter_json_records(stream):
+    """Yield (row_number, kind, record) from a JSON document, children after their plant."""
+    data = json.load(stream)
+    if isinstance(data, dict):
+        data = data.get('plants', [])
+    if not isinstance(data, list):
+        raise InvalidRecord("expected a list of plants")
+
+    row_number = 0
+    for plant in data:
+        row_number += 1
+        if not isinstance(plant, dict):
+            yield row_number, PLANT, {'_invalid': 'expected an object'}
+            continue
+
+        plant = _blank_to_none(plant)
+        ref = row_number
+        yield row_number, PLANT, dict(plant, _ref=ref)
+        for kind, key in ((CARE_EVENT, 'care_events'), (REMINDER, 'reminders')):
+            children = plant.get(key) or []
+            if not isinstance(children, list):
+                row_number += 1
+                yield row_number, kind, {'_invalid': f"{key} must be a list"}
+                continue
+            for child in children:
+                row_number += 1
+                child = _blank_to_none(child) if isinstance(child, dict) else {'_invalid': 'expected an object'}
+                yield row_number, kind, dict(child, _plant_ref=ref)
+
+
+def iter_records(stream, filename):
+    """Pick the parser from the file extension."""
+    if filename.lower().endswith('.json'):
+        return iter_json_records(stream)
+    if filename.lower().endswith('.csv'):
+        return iter_csv_records(stream)
+    raise InvalidRecord("Upload a .csv or .json file")
+
+
+# ----------------------------------------
+# Validation
+# ----------------------------------------
+
+def _parse_date(value, field, with_time=False):
+    if value is None or isinstance(value, (date, datetime)):
+        return value
+    try:
+        parsed = datetime.fromisoformat(str(value))
+    except ValueError:
+        raise InvalidRecord(f"{field} must be a date like 2024-05-01, not '{value}'")
+    return parsed if with_time else parsed.date()
+
+
+def _parse_bool(value, field):
+    if value is None or isinstance(value, bool):
+        return value
+    text = str(value).lower()
+    if text in ('1', 'true', 'yes', 'y'):
+        return True
+    if text in ('0', 'false', 'no', 'n'):
+        return False
+    raise InvalidRecord(f"{field} must be yes or no, not '{value}'")
+
+
+def _clean(kind, record, fields):
+    """Pick fields from a record, checking string lengths against the table."""
+    values = {}
+    for field in fields:
+        value = record.get(field)
+        if value is None:
+            continue
+        if isinstance(value, (dict, list)):
+            raise InvalidRecord(f"{field} must be a single value, not a list or object")
+        if isinstance(COLUMNS[kind][field].type, String):
+            value = str(value)
+            length = getattr(COLUMNS[kind][field].type, 'length', None)
+            if length and len(value) > length:
+                raise InvalidRecord(f"{field} is longer than {length} characters")
+        values[field] = value
+    return values
+
+
+def _validate(kind, record):
+    """Return the cleaned values for one record, or raise InvalidRecord."""
+    if '_invalid' in record:
+        raise InvalidRecord(record['_invalid'])
+
+    if kind == PLANT:
+        for field in SPECIES_FIELDS:
+            if record.get(field) is not None and not isinstance(record[field], str):
+                raise InvalidRecord(f"{field} must be text")
+        if not _species_name(record):
+            raise InvalidRecord("species is required")
+        values = _clean(PLANT, record, PLANT_FIELDS)
+        values['acquisition_date'] = _parse_date(values.get('acquisition_date'), 'acquisition_date')
+        return values
+
+    if record.get('plant') is not None and not isinstance(record['plant'], str):
+        raise InvalidRecord("plant must be text")
+
+    if kind == CARE_EVENT:
+        values = _clean(CARE_EVENT, record, CARE_EVENT_FIELDS)
+        if not values.get('event_type'):
+            raise InvalidRecord("event_type is required")
+        values['event_type'] = values['event_type'].lower()
+        values['date'] = _parse_date(values.get('date'), 'date', with_time=True)
+        return values
+
+    if kind == REMINDER:
+        values = _clean(REMINDER, record, REMINDER_FIELDS)
+        if not values.get('reminder_type'):
+            raise InvalidRecord("reminder_type is required")
+        values['reminder_type'] = values['reminder_type'].lower()
+        values['next_reminder_date'] = _parse_date(values.get('next_reminder_date'),
+                                                   'next_reminder_date')
+        if 'is_active' in values:
+            values['is_active'] = _parse_bool(values['is_active'], 'is_active')
+        return values
+
+    raise InvalidRecord(f"unknown type '{kind}'")
+
+
+# ----------------------------------------
+# Species matching
+# ----------------------------------------
+
+class SpeciesResolver:
+    """Resolve species names to plant ids, exactly in batches or fuzzily."""
+
+    def __init__(self, cutoff=FUZZY_CUTOFF):
+        self.cutoff = cutoff
+        self.resolved = {}
+        self.fuzzy_matches = {}
+        self._catalogue = None
+
+    def resolve(self, names):
+        """Resolve a batch of names in one query; return {name: plant_id or None}."""
+        wanted = {name.lower() for name in names if name and name.lower() not in self.resolved}
+        if wanted:
+            rows = db.session.execute(
+                select(Plant.plant_id, Plant.scientific_name, Plant.common_name)
+                .where(or_(func.lower(Plant.scientific_name).in_(wanted),
+                           func.lower(Plant.common_name).in_(wanted)))
+                .order_by(Plant.plant_id)
+            ).all()
+            # Scientific names win over common names shared by several plants
+            for plant_id, scientific_name, common_name in reversed(rows):
+                if common_name and common_name.lower() in wanted:
+                    self.resolved[common_name.lower()] = plant_id
+            for plant_id, scientific_name, common_name in reversed(rows):
+                if scientific_name.lower() in wanted:
+                    self.resolved[scientific_name.lower()] = plant_id
+
+            for name in wanted - self.resolved.keys():
+                self.resolved[name] = self._closest(name)
+
+        return {name: self.resolved.get(name.lower()) for name in names if name}
+
+    def _closest(self, name):
+        """Best fuzzy catalogue match for name, or None."""
+        if self._catalogue is None:
+            self._catalogue = {}
+            for plant_id, scientific_name, common_name in db.session.execute(
+                    select(Plant.plant_id, Plant.scientific_name, Plant.common_name)
+                    .order_by(Plant.plant_id)):
+                if common_name:
+                    self._catalogue.setdefault(common_name.lower(), plant_id)
+                self._catalogue[scientific_name.lower()] = plant_id
+
+        matches = difflib.get_close_matches(name, self._catalogue, n=1, cutoff=self.cutoff)
+        if not matches:
+            return None
+        self.fuzzy_matches[name] = matches[0]
+        return self._catalogue[matches[0]]
+
+
+# ----------------------------------------
+# Import
+# ----------------------------------------
+
+def _species_name(record):
+    for field in SPECIES_FIELDS:
+        if record.get(field):
+            return record[field]
+    return None
+
+
+def _import_chunk(user_id, chunk, resolver, plant_refs, report):
+    """Validate and insert one chunk of records in a single transaction."""
+    names = [name for _, kind, record in chunk if kind == PLANT
+             for name in [_species_name(record)] if isinstance(name, str)]
+    species = resolver.resolve(names)
+
+    plants, plant_keys, children = [], [], []
+    for row_number, kind, record in chunk:
+        try:
+            values = _validate(kind, record)
+            if kind == PLANT:
+                name = _species_name(record)
+                plant_id = species.get(name)
+                if plant_id is None:
+                    raise InvalidRecord(f"no plant in the catalogue matches '{name}'")
+                values.update(user_id=user_id, plant_id=plant_id)
+                plants.append(values)
+                plant_keys.append(record.get('_ref') or (values.get('nickname') or name).lower())
+            else:
+                ref = record.get('_plant_ref') or (record.get('plant') or '').lower()
+                if not ref:
+                    raise InvalidRecord("plant is required")
+                children.append((row_number, kind, ref, values))
+        except InvalidRecord as error:
+            report.error(row_number, str(error))
+
+    with crud.unit_of_work():
+        if plants:
+            for key, user_plant_id in zip(plant_keys, crud.create_user_plants_many(plants)):
+                plant_refs[key] = user_plant_id
+            report.plants += len(plants)
+
+        _resolve_existing(user_id, {ref for _, _, ref, _ in children}, plant_refs)
+
+        events, reminders = [], []
+        for row_number, kind, ref, values in children:
+            user_plant_id = plant_refs.get(ref)
+            if user_plant_id is None:
+                report.error(row_number, f"no plant named '{ref}' earlier in the file "
+                                         f"or in your collection")
+                continue
+            (events if kind == CARE_EVENT else reminders).append(
+                dict(values, user_plant_id=user_plant_id))
+
+        if events:
+            crud.create_care_events_many(events)
+        if reminders:
+            crud.create_reminders_many(reminders)
+        report.care_events += len(events)
+        report.reminders += len(reminders)
+
+
+def _resolve_existing(user_id, refs, plant_refs):
+    """Map nickname refs not seen in the file to plants already in the collection."""
+    missing = {ref for ref in refs if isinstance(ref, str) and ref not in plant_refs}
+    if not missing:
+        return
+    rows = db.session.execute(
+        select(func.lower(UserPlant.nickname), UserPlant.user_plant_id)
+        .where(UserPlant.user_id == user_id, func.lower(UserPlant.nickname).in_(missing))
+        .order_by(UserPlant.user_plant_id)
+    ).all()
+    for nickname, user_plant_id in rows:
+        plant_refs.setdefault(nickname, user_plant_id)
+
+
+def import_collection(user_id, records, chunk_size=CHUNK_SIZE, progress=None):
+    """Import (row_number, kind, record) tuples for a user; return an ImportReport.
+
+    progress, if given, is called with the number of records handled after
+    each chunk.
+    """
+    report = ImportReport()
+    resolver = SpeciesResolver()
+    plant_refs = {}
+    records = iter(records)
+
+    while chunk := list(islice(records, chunk_size)):
+        _import_chunk(user_id, chunk, resolver, plant_refs, report)
+        report.rows += len(chunk)
+        if progress:
+            progress(report.rows)
+
+    report.fuzzy_matches = resolver.fuzzy_matches
+    report.errors.sort()
+    return report
+
+
+def import_file(user_id, stream, filename, **kwargs):
+    """Import an uploaded file object (bytes or text) for a user."""
+    if isinstance(stream.read(0), bytes):
+        stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    try:
+        return import_collection(user_id, iter_records(stream, filename), **kwargs)
+    except (json.JSONDecodeError, csv.Error, UnicodeDecodeError) as error:
+        raise InvalidRecord(f"Could not read {filename}: {error}")
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    from server import app
+    from model import connect_to_db
+
+    if len(sys.argv) < 3:
+        print(__doc__)
+        sys.exit(2)
+
+    user_id, path = int(sys.argv[1]), sys.argv[2]
+    connect_to_db(app, echo=False)
+
+    with app.app_context(), open(path, 'rb') as f:
+        start = time.perf_counter()
+        report = import_file(user_id, f, path, progress=lambda rows: print(
+            f"\r{rows:,} rows ({time.perf_counter() - start:.1f} s)", end='', flush=True))
+        print()
+        print(f"imported {report.plants} plants, {report.care_events} care events, "
+              f"{report.reminders} reminders")
+        for name, match in report.fuzzy_matches.items():
+            print(f"  matched '{name}' to '{match}'")
+        for row_number, message in report.errors:
+            print(f"  row {row_number}: {message}")
@@ -0,0 +1,336 @@
+"""Batched reminder notifications for Rootly.
+
+Due reminders are grouped into a single digest email per user and sent over a
+small pool of reusable SMTP connections. A ledger row per (user, day) makes
+repeat runs on the same day skip users that already got their digest.
+
+Delivery: a run claims a batch of users ('sending', stamped claimed_at),
+sends their digests, then marks them 'sent' or releases the claims of
+digests that failed. If the run dies in between, its claims stay behind;
+once they are older than NOTIFY_CLAIM_TIMEOUT seconds (default 3600, which
+must exceed the time to send one batch), any later run that day claims
+those users again. Digests the dead run had already handed to SMTP are
+then sent a second time, so delivery is at least once; without crashes it
+is exactly once per user per day.
+
+Run from the rootly directory:
+
+    python -m utils.notifications
+
+To try it locally, point SMTP_HOST/SMTP_PORT at a sink such as
+``python -m aiosmtpd -n -l localhost:1025``.
+"""
+
+import logging
+import os
+import queue
+import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from email.message import EmailMessage
+from itertools import groupby
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from model import db, User, Plant, UserPlant, Reminder, NotificationLedger
+
+logger = logging.getLogger(__name__)
+
+# Digests are claimed, sent and recorded in batches of this many users
+BATCH_SIZE = 500
+
+# SMTP reply codes below this are worth retrying (4xx are transient)
+PERMANENT_FAILURE_CODE = 500
+
+# Claims older than this were left by a run that died, and can be taken over
+CLAIM_TIMEOUT = timedelta(seconds=int(os.environ.get('NOTIFY_CLAIM_TIMEOUT', 3600)))
+
+
+def _stale_claim(ledger, now):
+    """SQL condition: the ledger row is a claim abandoned by a dead run."""
+    return (ledger.status == 'sending') & (
+        (ledger.claimed_at == None) | (ledger.claimed_at < now - CLAIM_TIMEOUT))
+
+
+class SMTPConnectionPool:
+    """A bounded pool of logged-in SMTP connections shared by sender threads."""
+
+    def __init__(self, host='localhost', port=25, username=None, password=None,
+                 use_tls=False, size=4, timeout=30, max_messages_per_connection=100):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.timeout = timeout
+        self.max_messages_per_connection = max_messages_per_connection
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    @classmethod
+    def from_env(cls, size=4):
+        """Build a pool from SMTP_* environment variables."""
+        return cls(
+            host=os.environ.get('SMTP_HOST', 'localhost'),
+            port=int(os.environ.get('SMTP_PORT', 25)),
+            username=os.environ.get('SMTP_USERNAME'),
+            password=os.environ.get('SMTP_PASSWORD'),
+            use_tls=os.environ.get('SMTP_USE_TLS', '').lower() in ('1', 'true', 'yes'),
+            size=size
+        )
+
+    def _connect(self):
+        """Open a new SMTP connection."""
+        conn = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.use_tls:
+            conn.starttls()
+        if self.username:
+            conn.login(self.username, self.password)
+        conn.messages_sent = 0
+        return conn
+
+    def acquire(self):
+        """Return an idle connection, opening one if the pool has room."""
+        self._slots.acquire()
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            return self._connect()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, conn, discard=False):
+        """Return a connection to the pool, or close it if it is spent."""
+        try:
+            if discard or conn.messages_sent >= self.max_messages_per_connection:
+                self._close(conn)
+            else:
+                self._idle.put(conn)
+        finally:
+            self._slots.release()
+
+    def send(self, message):
+        """Send one message on a pooled connection."""
+        conn = self.acquire()
+        try:
+            conn.send_message(message)
+        except Exception:
+            self.release(conn, discard=True)
+            raise
+        conn.messages_sent += 1
+        self.release(conn)
+
+    def _close(self, conn):
+        try:
+            conn.quit()
+        except (smtplib.SMTPException, OSError):
+            conn.close()
+
+    def close(self):
+        """Close every idle connection."""
+        while True:
+            try:
+                self._close(self._idle.get_nowait())
+            except queue.Empty:
+                break
+
+
+class Digest:
+    """Due reminders for one user."""
+
+    def __init__(self, user_id, username, email, items):
+        self.user_id = user_id
+        self.username = username
+        self.email = email
+        self.items = items
+
+    def to_message(self, sender):
+        """Build the digest email."""
+        message = EmailMessage()
+        message['From'] = sender
+        message['To'] = self.email
+        message['Subject'] = f"Rootly: {len(self.items)} plant care reminder(s) due"
+
+        lines = [f"Hi {self.username},", "", "These plants need some attention:", ""]
+        for reminder_type, plant_name, due in self.items:
+            lines.append(f"- {reminder_type}: {plant_name} (due {due.strftime('%b %d')})")
+        lines += ["", "Happy growing,", "Rootly"]
+        message.set_content("\n".join(lines))
+
+        return message
+
+
+def iter_due_digests(run_date):
+    """Yield one Digest per user with active reminders due on or before run_date.
+
+    Rows are streamed in user order so memory stays flat however many
+    reminders are due. Users already recorded in the ledger for run_date
+    are skipped, unless their claim is stale.
+    """
+    already_sent = select(NotificationLedger.ledger_id).where(
+        NotificationLedger.user_id == User.user_id,
+        NotificationLedger.digest_date == run_date,
+        ~_stale_claim(NotificationLedger, datetime.utcnow())
+    ).exists()
+
+    stmt = (
+        select(User.user_id, User.username, User.email, Reminder.reminder_type,
+               UserPlant.nickname, Plant.common_name, Plant.scientific_name,
+               Reminder.next_reminder_date)
+        .join(UserPlant, UserPlant.user_plant_id == Reminder.user_plant_id)
+        .join(User, User.user_id == UserPlant.user_id)
+        .join(Plant, Plant.plant_id == UserPlant.plant_id)
+        .where(Reminder.is_active == True,
+               Reminder.next_reminder_date <= run_date,
+               ~already_sent)
+        .order_by(User.user_id, Reminder.next_reminder_date)
+        .execution_options(yield_per=1000)
+    )
+
+    rows = db.session.execute(stmt)
+    for user_id, user_rows in groupby(rows, key=lambda row: row.user_id):
+        user_rows = list(user_rows)
+        first = user_rows[0]
+        items = [
+            (row.reminder_type,
+             row.nickname or row.common_name or row.scientific_name,
+             row.next_reminder_date)
+            for row in user_rows
+        ]
+        yield Digest(user_id, first.username, first.email, items)
+
+
+def send_with_retries(pool, message, retries=3, backoff=0.5):
+    """Send a message, retrying transient failures with exponential backoff."""
+    for attempt in range(retries + 1):
+        try:
+            pool.send(message)
+            return True
+        except smtplib.SMTPRecipientsRefused:
+            return False
+        except smtplib.SMTPResponseException as e:
+            if e.smtp_code >= PERMANENT_FAILURE_CODE:
+                return False
+            error = e
+        except (smtplib.SMTPException, OSError) as e:
+            error = e
+
+        if attempt < retries:
+            time.sleep(backoff * (2 ** attempt))
+
+    logger.warning("Giving up on digest to %s: %s", message['To'], error)
+    return False
+
+
+def _claim(batch, run_date):
+    """Insert 'sending' ledger rows and return the user ids this run owns.
+
+    The unique (user_id, digest_date) constraint means a concurrent run can
+    never claim the same user twice. An existing row is taken over only if
+    it is a stale claim; the upsert locks it, so of two runs doing that at
+    once only the first sees it stale. Ledger writes go through their own
+    connection so the streaming reminder cursor stays open.
+    """
+    now = datetime.utcnow()
+    insert = sqlite_insert if db.engine.dialect.name == 'sqlite' else pg_insert
+    stmt = insert(NotificationLedger).values([
+        {'user_id': digest.user_id, 'digest_date': run_date, 'status': 'sending',
+         'reminder_count': len(digest.items), 'claimed_at': now}
+        for digest in batch
+    ])
+    ledger = NotificationLedger.__table__.c
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ledger.user_id, ledger.digest_date],
+        set_={'claimed_at': stmt.excluded.claimed_at,
+              'reminder_count': stmt.excluded.reminder_count},
+        where=_stale_claim(ledger, now),
+    ).returning(ledger.user_id)
+
+    with db.engine.begin() as conn:
+        return set(conn.execute(stmt).scalars())
+
+
+def _record(sent, failed, run_date):
+    """Mark sent digests and release the claims on failed ones."""
+    with db.engine.begin() as conn:
+        if sent:
+            conn.execute(
+                update(NotificationLedger)
+                .where(NotificationLedger.user_id.in_(sent),
+                       NotificationLedger.digest_date == run_date)
+                .values(status='sent', sent_at=datetime.utcnow())
+            )
+        if failed:
+            conn.execute(
+                delete(NotificationLedger)
+                .where(NotificationLedger.user_id.in_(failed),
+                       NotificationLedger.digest_date == run_date)
+            )
+
+
+def dispatch_due_reminders(run_date=None, pool=None, concurrency=4,
+                           batch_size=BATCH_SIZE, retries=3):
+    """Send today's reminder digests and return a dict of counts.
+
+    Digests are processed a batch at a time: claim the batch in the ledger,
+    send it on up to `concurrency` threads sharing the SMTP pool, then
+    record the outcome. Failed digests are released so the next run retries
+    them.
+    """
+    run_date = run_date or date.today()
+    owns_pool = pool is None
+    pool = pool or SMTPConnectionPool.from_env(size=concurrency)
+    sender = os.environ.get('NOTIFY_FROM', 'reminders@rootly.com')
+    totals = {'sent': 0, 'failed': 0, 'skipped': 0}
+
+    def process(batch):
+        claimed = _claim(batch, run_date)
+        totals['skipped'] += len(batch) - len(claimed)
+        batch = [digest for digest in batch if digest.user_id in claimed]
+        results = executor.map(
+            lambda digest: send_with_retries(pool, digest.to_message(sender), retries),
+            batch
+        )
+        sent, failed = [], []
+        for digest, ok in zip(batch, results):
+            (sent if ok else failed).append(digest.user_id)
+        _record(sent, failed, run_date)
+
+        totals['sent'] += len(sent)
+        totals['failed'] += len(failed)
+
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            batch = []
+            for digest in iter_due_digests(run_date):
+                batch.append(digest)
+                if len(batch) >= batch_size:
+                    process(batch)
+                    batch = []
+            if batch:
+                process(batch)
+    finally:
+        if owns_pool:
+            pool.close()
+
+    logger.info("Reminder digests for %s: %s", run_date, totals)
+    return totals
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    from server import app
+    from model import connect_to_db
+
+    load_dotenv()
+    connect_to_db(app, echo=False)
+
+    with app.app_context():
+        print(dispatch_due_reminders())
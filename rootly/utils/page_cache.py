@@ -0,0 +1,102 @@
+"""Page and fragment caching for Rootly's public plant pages.
+
+The plant catalogue looks the same to every visitor, so rendered pages are
+kept in memory and served without touching the database. Each page is
+cached in two variants, logged in and logged out, because the navigation
+bar differs. Requests with pending flash messages bypass the cache.
+
+Plant cards on the browse page are cached on their own, keyed by plant id
+and Plant.last_updated, so a changed plant only re-renders its own card.
+
+Caches are per process. Writes through crud call invalidate_plant_pages;
+other workers catch up within PAGE_CACHE_TTL seconds.
+
+Settings (environment variables):
+
+- PAGE_CACHE_TTL      seconds a rendered page is kept (default 300)
+- PAGE_MAX_AGE        Cache-Control max-age for anonymous visitors (default 60)
+"""
+
+import hashlib
+import os
+import threading
+
+from flask import make_response, render_template, request, session
+from markupsafe import Markup
+
+from utils.cache import TTLCache
+
+PAGE_CACHE_TTL = int(os.environ.get('PAGE_CACHE_TTL', 300))
+PAGE_MAX_AGE = int(os.environ.get('PAGE_MAX_AGE', 60))
+
+_pages = TTLCache(ttl=PAGE_CACHE_TTL, max_entries=5000)
+_fragments = TTLCache(ttl=PAGE_CACHE_TTL * 4, max_entries=50000)
+
+# Bumped whenever any plant changes so cached catalogue listings are skipped
+_catalogue_generation = 0
+_generation_lock = threading.Lock()
+
+
+def _render_entry(render):
+    """Call render and return (body, etag, last_modified) for the cache."""
+    body, last_modified = render()
+    etag = hashlib.sha1(body.encode()).hexdigest()
+    return body, etag, last_modified
+
+
+def cached_page(key, render):
+    """Return a response for a public page, rendering it only on a cache miss.
+
+    render is called with no arguments and returns (html, last_modified).
+    Concurrent misses for the same key wait for a single render.
+    """
+    if session.get('_flashes'):
+        body, _ = render()
+        return make_response(body)
+
+    logged_in = 'user_id' in session
+    body, etag, last_modified = _pages.get_or_set(
+        (key, logged_in), lambda: _render_entry(render))
+
+    response = make_response(body)
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+
+    if logged_in:
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+    else:
+        response.cache_control.public = True
+        response.cache_control.max_age = PAGE_MAX_AGE
+
+    return response.make_conditional(request)
+
+
+def plant_key(plant_id):
+    """Key for a single plant's page."""
+    return ('plant', plant_id)
+
+
+def catalogue_key(*parts):
+    """Key for a page listing many plants; it changes when any plant does."""
+    return ('catalogue', _catalogue_generation) + parts
+
+
+def plant_card(plant):
+    """Render the browse card for plant, reusing the cached HTML if current."""
+    return _fragments.get_or_set(
+        ('plant-card', plant.plant_id, plant.last_updated),
+        lambda: Markup(render_template('plant_card.html', plant=plant)))
+
+
+def invalidate_plant_pages(*plant_ids):
+    """Forget cached pages after a plant is added, changed or removed."""
+    global _catalogue_generation
+
+    with _generation_lock:
+        _catalogue_generation += 1
+
+    for plant_id in plant_ids:
+        for logged_in in (False, True):
+            _pages.delete((plant_key(plant_id), logged_in))
@@ -0,0 +1,132 @@
+"""Password hashing for Rootly.
+
+Hashes use werkzeug's format, e.g. ``pbkdf2:sha256:600000$<salt>$<hash>``,
+so every stored hash records the cost it was made with. needs_rehash compares
+that against the current settings, letting logins upgrade old hashes.
+
+Hashing runs on a small, bounded thread pool rather than the request thread.
+hashlib releases the GIL while it works, so a burst of logins can only ever
+occupy PASSWORD_HASH_WORKERS cores and the rest of the app keeps serving.
+Under serve.py's gevent mode the work goes to a gevent ThreadPool, which uses
+real OS threads, so hashing never stalls the event loop.
+
+Settings (environment variables):
+
+- PASSWORD_HASH_ALGORITHM   digest for pbkdf2 (default sha256)
+- PASSWORD_HASH_ITERATIONS  pbkdf2 rounds (default werkzeug's default)
+- PASSWORD_HASH_WORKERS     size of the hashing pool (default 2)
+- PASSWORD_HASH_TIMEOUT     seconds to wait for a free worker (default: forever)
+
+Benchmark logins per second per worker at several costs:
+
+    python -m utils.passwords [iterations ...]
+"""
+
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import (DEFAULT_PBKDF2_ITERATIONS, check_password_hash,
+                               generate_password_hash)
+
+_executor = None
+_executor_lock = threading.Lock()
+_gevent_pool = None
+
+
+def get_hash_method():
+    """Return the werkzeug method string for the configured cost."""
+    algorithm = os.environ.get('PASSWORD_HASH_ALGORITHM', 'sha256')
+    iterations = int(os.environ.get('PASSWORD_HASH_ITERATIONS', DEFAULT_PBKDF2_ITERATIONS))
+    return f"pbkdf2:{algorithm}:{iterations}"
+
+
+def _get_gevent_pool():
+    """Return a gevent pool of real OS threads, sized like the hashing pool."""
+    global _gevent_pool
+
+    if _gevent_pool is None:
+        from gevent.threadpool import ThreadPool
+        _gevent_pool = ThreadPool(int(os.environ.get('PASSWORD_HASH_WORKERS', 2)))
+    return _gevent_pool
+
+
+def _get_executor():
+    """Return the shared hashing pool, creating it on first use."""
+    global _executor
+
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                workers = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+                _executor = ThreadPoolExecutor(max_workers=workers,
+                                               thread_name_prefix='password-hash')
+    return _executor
+
+
+def _gevent_patched():
+    """Return True when running under gevent's monkey-patching (see serve.py)."""
+    if 'gevent.monkey' not in sys.modules:
+        return False
+    return sys.modules['gevent.monkey'].is_module_patched('threading')
+
+
+def _run(fn, *args):
+    """Run fn on the hashing pool and wait for its result."""
+    timeout = os.environ.get('PASSWORD_HASH_TIMEOUT')
+    timeout = float(timeout) if timeout else None
+
+    if _gevent_patched():
+        # Patched threads are greenlets and would hash on the event loop
+        return _get_gevent_pool().spawn(fn, *args).get(timeout=timeout)
+
+    future = _get_executor().submit(fn, *args)
+    return future.result(timeout=timeout)
+
+
+def hash_password(password, method=None):
+    """Return a new hash of password using the configured cost."""
+    return _run(generate_password_hash, password, method or get_hash_method())
+
+
+def verify_password(password_hash, password):
+    """Return True if password matches password_hash."""
+    return _run(check_password_hash, password_hash, password)
+
+
+def needs_rehash(password_hash, method=None):
+    """Return True if password_hash was made with different settings."""
+    stored_method = password_hash.split('$', 1)[0]
+    return stored_method != (method or get_hash_method())
+
+
+def benchmark(iterations_list, seconds=2.0):
+    """Return verifications per second on one worker for each iteration count."""
+    results = []
+
+    for iterations in iterations_list:
+        method = f"pbkdf2:sha256:{iterations}"
+        stored = generate_password_hash('correct horse battery staple', method=method)
+
+        count = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < seconds:
+            check_password_hash(stored, 'correct horse battery staple')
+            count += 1
+        elapsed = time.perf_counter() - start
+
+        results.append((iterations, count / elapsed))
+
+    return results
+
+
+if __name__ == "__main__":
+    iterations_list = [int(arg) for arg in sys.argv[1:]] or [
+        100_000, 260_000, 600_000, DEFAULT_PBKDF2_ITERATIONS
+    ]
+
+    print(f"{'iterations':>12}  {'logins/sec/worker':>18}  {'ms/login':>9}")
+    for iterations, rate in benchmark(iterations_list):
+        print(f"{iterations:>12,}  {rate:>18.1f}  {1000 / rate:>9.1f}")
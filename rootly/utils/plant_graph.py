@@ -0,0 +1,199 @@
+"""In-memory graph of related plants.
+
+The related_plants table is small and read far more often than it is
+written, so it is loaded once per process into an adjacency index and
+queried from memory. crud keeps the index current as relationships and
+plants are added in this process; other processes reload after
+PLANT_GRAPH_TTL seconds (default 600).
+
+Plants whose scientific names share a first word are in the same genus.
+Traversals can treat genus membership as an extra kind of edge.
+
+Per-plant entries are immutable tuples and frozensets that are swapped out
+whole under a lock, so readers never need to take it.
+"""
+
+import os
+import threading
+import time
+from collections import deque, namedtuple
+
+from model import db, Plant, RelatedPlant
+
+GENUS = 'same genus'
+
+Edge = namedtuple('Edge', ['plant_id', 'relationship_type', 'related_id', 'notes'])
+
+_graph = None
+_graph_lock = threading.Lock()
+
+
+def genus_of(scientific_name):
+    """Return the lower-cased genus from a scientific name, or None."""
+    if not scientific_name:
+        return None
+    return scientific_name.split()[0].lower()
+
+
+def _normalize_types(types):
+    """Return a set of lower-cased relationship types, or None for any type."""
+    if not types:
+        return None
+    return {relationship_type.lower() for relationship_type in types}
+
+
+class PlantGraph:
+    """Adjacency index over related_plants plus genus clusters."""
+
+    def __init__(self):
+        self.loaded_at = time.monotonic()
+        self._adjacency = {}
+        self._genus = {}
+        self._genus_members = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls):
+        """Build a graph from the database in two queries."""
+        graph = cls()
+        adjacency = {}
+
+        relations = db.session.execute(db.select(
+            RelatedPlant.related_id, RelatedPlant.plant_id_1, RelatedPlant.plant_id_2,
+            RelatedPlant.relationship_type, RelatedPlant.notes
+        ))
+        for related_id, plant_id_1, plant_id_2, relationship_type, notes in relations:
+            adjacency.setdefault(plant_id_1, []).append(
+                Edge(plant_id_2, relationship_type, related_id, notes))
+            adjacency.setdefault(plant_id_2, []).append(
+                Edge(plant_id_1, relationship_type, related_id, notes))
+        graph._adjacency = {plant_id: tuple(edges) for plant_id, edges in adjacency.items()}
+
+        members = {}
+        for plant_id, scientific_name in db.session.execute(
+                db.select(Plant.plant_id, Plant.scientific_name)):
+            genus = genus_of(scientific_name)
+            graph._genus[plant_id] = genus
+            members.setdefault(genus, set()).add(plant_id)
+        graph._genus_members = {genus: frozenset(ids) for genus, ids in members.items()}
+
+        return graph
+
+    # Updates
+
+    def add_edge(self, related_id, plant_id_1, plant_id_2, relationship_type, notes=None):
+        """Record a new relationship in both directions."""
+        with self._lock:
+            for source, target in ((plant_id_1, plant_id_2), (plant_id_2, plant_id_1)):
+                edges = self._adjacency.get(source, ())
+                if any(edge.related_id == related_id for edge in edges):
+                    continue
+                self._adjacency[source] = edges + (Edge(target, relationship_type, related_id, notes),)
+
+    def add_plant(self, plant_id, scientific_name):
+        """Record a plant's genus, moving it if its name changed."""
+        genus = genus_of(scientific_name)
+
+        with self._lock:
+            old_genus = self._genus.get(plant_id)
+            if old_genus == genus and plant_id in self._genus:
+                return
+            if plant_id in self._genus:
+                self._genus_members[old_genus] = self._genus_members.get(old_genus, frozenset()) - {plant_id}
+            self._genus[plant_id] = genus
+            self._genus_members[genus] = self._genus_members.get(genus, frozenset()) | {plant_id}
+
+    # Queries
+
+    def neighbors(self, plant_id, types=None):
+        """Return the edges leaving plant_id, optionally only of some types."""
+        wanted = _normalize_types(types)
+        edges = self._adjacency.get(plant_id, ())
+        if wanted is None:
+            return list(edges)
+        return [edge for edge in edges if (edge.relationship_type or '').lower() in wanted]
+
+    def genus_cluster(self, plant_id):
+        """Return the other plants in plant_id's genus."""
+        genus = self._genus.get(plant_id)
+        if genus is None:
+            return frozenset()
+        return self._genus_members.get(genus, frozenset()) - {plant_id}
+
+    def traverse(self, plant_id, hops=2, types=None, include_genus=False, limit=None):
+        """Breadth-first search out to `hops` steps from plant_id.
+
+        Returns a list of dicts with plant_id, hops, via (the plant it was
+        reached from) and relationship_type, nearest first. With
+        include_genus, plants in the same genus count as one hop away.
+        """
+        wanted = _normalize_types(types)
+        follow_genus = include_genus and (wanted is None or GENUS in wanted)
+
+        seen = {plant_id}
+        queue = deque([(plant_id, 0)])
+        found = []
+
+        while queue:
+            current, depth = queue.popleft()
+            if depth == hops:
+                continue
+
+            steps = [(edge.plant_id, edge.relationship_type)
+                     for edge in self._adjacency.get(current, ())
+                     if wanted is None or (edge.relationship_type or '').lower() in wanted]
+            if follow_genus:
+                steps.extend((other, GENUS) for other in sorted(self.genus_cluster(current)))
+
+            for neighbor, relationship_type in steps:
+                if neighbor in seen:
+                    continue
+                seen.add(neighbor)
+                found.append({'plant_id': neighbor, 'hops': depth + 1, 'via': current,
+                              'relationship_type': relationship_type})
+                if limit and len(found) >= limit:
+                    return found
+                queue.append((neighbor, depth + 1))
+
+        return found
+
+    def related_sets(self, plant_ids, hops=1, types=None, include_genus=False, limit=None):
+        """Return {plant_id: traverse(plant_id, ...)} for many plants at once."""
+        return {plant_id: self.traverse(plant_id, hops, types, include_genus, limit)
+                for plant_id in dict.fromkeys(plant_ids)}
+
+
+def get_plant_graph():
+    """Return this process's plant graph, loading it on first use or when stale."""
+    global _graph
+
+    ttl = int(os.environ.get('PLANT_GRAPH_TTL', 600))
+    graph = _graph
+    if graph is not None and time.monotonic() - graph.loaded_at < ttl:
+        return graph
+
+    with _graph_lock:
+        if _graph is None or time.monotonic() - _graph.loaded_at >= ttl:
+            _graph = PlantGraph.load()
+        return _graph
+
+
+def note_related_plants(related_id, plant_id_1, plant_id_2, relationship_type, notes=None):
+    """Add a committed relationship to the loaded graph, if there is one."""
+    if _graph is not None:
+        _graph.add_edge(related_id, plant_id_1, plant_id_2, relationship_type, notes)
+
+
+def note_plants(plants):
+    """Add or rename committed plants, given (plant_id, scientific_name) pairs."""
+    if _graph is not None:
+        for plant_id, scientific_name in plants:
+            _graph.add_plant(plant_id, scientific_name)
+
+
+def invalidate_plant_graph():
+    """Drop the loaded graph so the next query reloads it."""
+    global _graph
+
+    with _graph_lock:
+        _graph = None
@@ -0,0 +1,349 @@
+"""On-demand profiling of single requests.
+
+A request carrying a valid profile token, either in an X-Rootly-Profile
+header or a _profile query parameter, runs under cProfile. The SQL
+statements it executes and the templates it renders are timed as well.
+
+Nothing is installed unless PROFILING_ENABLED is set. When it is, every
+SQL statement and template render pays a context variable lookup and every
+request a header lookup. Profiles expose SQL text and stack data, so
+profiling also stays off while the app's secret key is the development
+default: anyone could sign a token with it.
+
+The profile is saved in PROFILE_DIR as a pstats file (open it with
+pstats or snakeviz) together with a JSON summary, and the response gets an
+X-Profile-Id header naming it. Only the newest PROFILE_KEEP profiles are
+kept. /_profiles?token=<token> lists them, with links to each summary and
+download. Streamed responses are profiled up to the point their body
+starts streaming.
+
+One request is profiled at a time; a token request that arrives while
+another is being profiled is served without a profile. cProfile follows a
+single OS thread, so under gevent a profile also contains whatever other
+greenlets ran on that thread meanwhile. Profile a worker that is not
+taking other traffic when the numbers need to be clean.
+
+Tokens are signed with the app's secret key and carry their own expiry:
+
+    python -m utils.profiling token [valid_for_seconds]
+
+Settings (environment variables):
+
+- PROFILING_ENABLED: 1 to profile requests carrying a token (default off)
+- PROFILE_DIR: where profiles are written (default rootly/data/profiles)
+- PROFILE_KEEP: how many profiles to keep (default 50)
+- PROFILE_TOKEN_MAX_AGE: seconds a new token stays valid (default 3600)
+"""
+
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import re
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime
+
+from flask import (Blueprint, abort, current_app, g, render_template, request,
+                   send_from_directory, template_rendered, before_render_template)
+from itsdangerous import BadSignature, URLSafeSerializer
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+PROFILE_DIR = os.environ.get(
+    'PROFILE_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'profiles'))
+PROFILE_KEEP = int(os.environ.get('PROFILE_KEEP', 50))
+TOKEN_MAX_AGE = int(os.environ.get('PROFILE_TOKEN_MAX_AGE', 3600))
+
+HEADER = 'X-Rootly-Profile'
+INSECURE_SECRET_KEYS = {None, '', 'dev-secret-key'}
+QUERY_PARAM = '_profile'
+TOP_FUNCTIONS = 30
+
+# The Capture for the request being profiled, if any
+_capture = ContextVar('profile_capture', default=None)
+
+# Held by the request being profiled
+_profiling = threading.Lock()
+
+logger = logging.getLogger(__name__)
+
+profiles = Blueprint('profiles', __name__, url_prefix='/_profiles')
+
+
+class Capture:
+    """SQL and template timings collected while a request is profiled.
+
+    Templates rendered from inside another template (plant cards, say) are
+    recorded with their nesting depth so they are not counted twice.
+    """
+
+    def __init__(self):
+        self.queries = []
+        self.templates = []
+        self._template_starts = []
+
+    def summary_of_queries(self):
+        """Per-statement totals, slowest first."""
+        totals = {}
+        for statement, seconds in self.queries:
+            entry = totals.setdefault(statement, {'statement': statement, 'count': 0, 'seconds': 0.0})
+            entry['count'] += 1
+            entry['seconds'] += seconds
+        return sorted(totals.values(), key=lambda entry: -entry['seconds'])
+
+
+# ----------------------------------------
+# Tokens
+# ----------------------------------------
+
+def _serializer(app=None):
+    return URLSafeSerializer((app or current_app).secret_key, salt='rootly-profile')
+
+
+def make_profile_token(app=None, valid_for=TOKEN_MAX_AGE):
+    """Return a token that switches on profiling for valid_for seconds."""
+    return _serializer(app).dumps({'until': int(time.time()) + valid_for})
+
+
+def _valid_token(token):
+    if not token:
+        return False
+    try:
+        return _serializer().loads(token)['until'] > time.time()
+    except (BadSignature, KeyError, TypeError):
+        return False
+
+
+def _request_token():
+    return request.headers.get(HEADER) or request.args.get(QUERY_PARAM)
+
+
+# ----------------------------------------
+# Capture hooks
+# ----------------------------------------
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _capture.get() is not None:
+        conn.info.setdefault('profile_query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    capture = _capture.get()
+    starts = conn.info.get('profile_query_start')
+    if capture is not None and starts:
+        capture.queries.append((' '.join(statement.split()), time.perf_counter() - starts.pop()))
+
+
+def _handle_error(context):
+    # A statement that raised never reaches after_cursor_execute
+    if context.connection is not None:
+        starts = context.connection.info.get('profile_query_start')
+        if starts:
+            starts.pop()
+
+
+def _before_render(sender, template, context, **extra):
+    capture = _capture.get()
+    if capture is not None:
+        capture._template_starts.append(time.perf_counter())
+
+
+def _rendered(sender, template, context, **extra):
+    capture = _capture.get()
+    if capture is not None and capture._template_starts:
+        seconds = time.perf_counter() - capture._template_starts.pop()
+        capture.templates.append((template.name, seconds, len(capture._template_starts)))
+
+
+def _start_profile():
+    if not _valid_token(_request_token()):
+        return
+    if not _profiling.acquire(blocking=False):
+        logger.info("Not profiling %s: another request is being profiled", request.path)
+        return
+
+    g.profile_token = _capture.set(Capture())
+    g.profile_started = time.perf_counter()
+    g.profiler = cProfile.Profile()
+    g.profiler.enable()
+
+
+def _finish_profile(response):
+    profiler = g.pop('profiler', None)
+    if profiler is None:
+        return response
+
+    profiler.disable()
+    _profiling.release()
+    elapsed = time.perf_counter() - g.pop('profile_started')
+    capture = _capture.get()
+    _capture.reset(g.pop('profile_token'))
+
+    profile_id = save_profile(profiler, capture, elapsed, response.status_code)
+    response.headers['X-Profile-Id'] = profile_id
+    return response
+
+
+def _abandon_profile(error=None):
+    """Switch the profiler off if the request ended before _finish_profile ran."""
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+        _profiling.release()
+        _capture.reset(g.pop('profile_token'))
+
+
+# ----------------------------------------
+# Storage
+# ----------------------------------------
+
+def _top_functions(stats, limit=TOP_FUNCTIONS):
+    """The functions with the most cumulative time, as dicts."""
+    rows = []
+    for (filename, line, name), (calls, primitive, own, cumulative, _) in stats.stats.items():
+        rows.append({'function': f"{name} ({os.path.basename(filename)}:{line})",
+                     'calls': calls, 'own_seconds': own, 'cumulative_seconds': cumulative})
+    rows.sort(key=lambda row: -row['cumulative_seconds'])
+    return rows[:limit]
+
+
+def save_profile(profiler, capture, elapsed, status_code):
+    """Write the pstats dump and JSON summary; return the profile id."""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    endpoint = re.sub(r'[^\w.]+', '-', request.endpoint or 'unmatched')
+    profile_id = f"{datetime.utcnow():%Y%m%dT%H%M%S}-{endpoint}-{uuid.uuid4().hex[:8]}"
+
+    profiler.dump_stats(os.path.join(PROFILE_DIR, f"{profile_id}.prof"))
+    stats = pstats.Stats(profiler, stream=io.StringIO())
+
+    summary = {
+        'id': profile_id,
+        'created_at': datetime.utcnow().isoformat(),
+        'method': request.method,
+        'path': request.path,
+        'endpoint': request.endpoint,
+        'status': status_code,
+        'seconds': elapsed,
+        'sql_count': len(capture.queries),
+        'sql_seconds': sum(seconds for _, seconds in capture.queries),
+        'template_seconds': sum(seconds for _, seconds, depth in capture.templates if depth == 0),
+        'queries': capture.summary_of_queries(),
+        'templates': [{'template': name, 'seconds': seconds, 'depth': depth}
+                      for name, seconds, depth in capture.templates],
+        'functions': _top_functions(stats),
+    }
+    with open(os.path.join(PROFILE_DIR, f"{profile_id}.json"), 'w') as f:
+        json.dump(summary, f, indent=1)
+
+    _prune()
+    return profile_id
+
+
+def _prune(keep=PROFILE_KEEP):
+    """Delete all but the newest `keep` profiles."""
+    ids = sorted(name[:-5] for name in os.listdir(PROFILE_DIR) if name.endswith('.json'))
+    for profile_id in ids[:-keep] if keep else ids:
+        for extension in ('.json', '.prof'):
+            try:
+                os.remove(os.path.join(PROFILE_DIR, profile_id + extension))
+            except FileNotFoundError:
+                pass
+
+
+def load_summaries():
+    """Return the JSON summaries of stored profiles, newest first."""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    summaries = []
+    for name in sorted(os.listdir(PROFILE_DIR), reverse=True):
+        if name.endswith('.json'):
+            with open(os.path.join(PROFILE_DIR, name)) as f:
+                summaries.append(json.load(f))
+    return summaries
+
+
+# ----------------------------------------
+# Index pages
+# ----------------------------------------
+
+@profiles.before_request
+def require_token():
+    """The profile pages show SQL, so they need a token too."""
+    if not _valid_token(request.args.get('token')):
+        abort(404)
+
+
+@profiles.route('/')
+def list_profiles():
+    """Recent profiles, newest first."""
+    return render_template('profiles.html', summaries=load_summaries(), summary=None,
+                           token=request.args['token'])
+
+
+@profiles.route('/<profile_id>')
+def show_profile(profile_id):
+    """One profile's SQL, template and function breakdown."""
+    path = os.path.join(PROFILE_DIR, f"{os.path.basename(profile_id)}.json")
+    if not os.path.isfile(path):
+        abort(404)
+    with open(path) as f:
+        summary = json.load(f)
+    return render_template('profiles.html', summaries=None, summary=summary,
+                           token=request.args['token'])
+
+
+@profiles.route('/<profile_id>.prof')
+def download_profile(profile_id):
+    """The raw pstats file."""
+    return send_from_directory(PROFILE_DIR, f"{profile_id}.prof", as_attachment=True)
+
+
+def has_secure_key(app):
+    """Whether tokens signed with app's secret key can be trusted."""
+    return app.secret_key not in INSECURE_SECRET_KEYS
+
+
+def init_profiling(app, enabled=None):
+    """Profile requests that carry a valid token, and serve /_profiles, if enabled."""
+    if enabled is None:
+        enabled = os.environ.get('PROFILING_ENABLED', '').lower() in ('1', 'true', 'yes')
+    if not enabled:
+        return False
+    if not has_secure_key(app):
+        logger.warning("Profiling not enabled: set FLASK_SECRET_KEY to a real secret first")
+        return False
+
+    event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(Engine, 'handle_error', _handle_error)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_rendered, app)
+
+    app.before_request(_start_profile)
+    app.after_request(_finish_profile)
+    app.teardown_request(_abandon_profile)
+    app.register_blueprint(profiles)
+    return True
+
+
+if __name__ == "__main__":
+    import sys
+
+    from server import app
+
+    if sys.argv[1:2] != ['token']:
+        print(__doc__)
+        sys.exit(2)
+
+    if not has_secure_key(app):
+        print("Set FLASK_SECRET_KEY to a real secret first; the default one is public.")
+        sys.exit(1)
+
+    valid_for = int(sys.argv[2]) if len(sys.argv) > 2 else TOKEN_MAX_AGE
+    print(make_profile_token(app, valid_for))
@@ -0,0 +1,315 @@
+"""Plant recommendations from a species feature matrix.
+
+Every plant becomes one L2-normalised row of a NumPy matrix built from its
+boolean flags, difficulty, sunlight needs and watering interval. A user's
+taste is the weighted mean of the rows of their favorites and collection,
+and every species is scored against it with a single matrix-vector product.
+
+Candidates are limited to plants with care notes for the user's region,
+plus indoor plants, which grow anywhere. These masks are precomputed per
+region.
+
+The recommender is built once per process. After RECOMMENDER_REFRESH
+seconds (default 60) it reloads only plants whose last_updated is past the
+newest one it has seen, less RECOMMENDER_REFRESH_OVERLAP seconds (default
+300): last_updated is stamped before commit, so a slow transaction can land
+with a timestamp older than rows already loaded, and the overlap picks it
+up. It rebuilds from scratch if any plant it holds was deleted, and rebuilds
+the region masks when a plant is added, its indoor flag changes or
+plant_region_care changes.
+"""
+
+import copy
+import os
+import re
+import threading
+import time
+from datetime import timedelta
+
+import numpy as np
+from sqlalchemy import func, select
+
+from model import db, Plant, PlantCareDetails, PlantRegionCare, User, UserFavorite, UserPlant
+
+BOOLEAN_FLAGS = ('poisonous_to_humans', 'poisonous_to_pets', 'invasive', 'rare',
+                 'tropical', 'indoor', 'outdoor')
+DIFFICULTIES = {'easy': 0, 'moderate': 1, 'medium': 1, 'hard': 2, 'difficult': 2}
+SUNLIGHT_PATTERNS = (r'(?<!in)direct|full sun', r'indirect|partial|part sun|part shade',
+                     r'low light|shade')
+MAX_WATERING_DAYS = 60
+
+FEATURES = (list(BOOLEAN_FLAGS)
+            + ['difficulty_easy', 'difficulty_moderate', 'difficulty_hard']
+            + ['sunlight_direct', 'sunlight_indirect', 'sunlight_low']
+            + ['watering_known', 'watering_interval'])
+
+FAVORITE_WEIGHT = 2.0
+COLLECTION_WEIGHT = 1.0
+
+REFRESH_OVERLAP = timedelta(seconds=int(os.environ.get('RECOMMENDER_REFRESH_OVERLAP', 300)))
+
+_recommender = None
+_recommender_lock = threading.Lock()
+
+
+def _feature_columns():
+    """Columns read for each plant, in the order feature_vector expects."""
+    return ([Plant.plant_id, Plant.last_updated]
+            + [getattr(Plant, flag) for flag in BOOLEAN_FLAGS]
+            + [PlantCareDetails.difficulty_level, PlantCareDetails.sunlight_requirements,
+               PlantCareDetails.watering_interval_days])
+
+
+def feature_vector(row):
+    """Return the unnormalised feature vector for a row of _feature_columns."""
+    flags = row[2:2 + len(BOOLEAN_FLAGS)]
+    difficulty, sunlight, interval = row[2 + len(BOOLEAN_FLAGS):]
+
+    vector = np.zeros(len(FEATURES), dtype=np.float32)
+    vector[:len(BOOLEAN_FLAGS)] = [bool(flag) for flag in flags]
+
+    offset = len(BOOLEAN_FLAGS)
+    level = DIFFICULTIES.get((difficulty or '').strip().lower())
+    if level is not None:
+        vector[offset + level] = 1
+
+    offset += 3
+    text = ' '.join(sunlight or []).lower()
+    for i, pattern in enumerate(SUNLIGHT_PATTERNS):
+        if re.search(pattern, text):
+            vector[offset + i] = 1
+
+    offset += 3
+    if interval:
+        vector[offset] = 1
+        vector[offset + 1] = np.log1p(min(interval, MAX_WATERING_DAYS)) / np.log1p(MAX_WATERING_DAYS)
+
+    return vector
+
+
+def _normalize(matrix):
+    """Scale each row to unit length, leaving all-zero rows alone."""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return matrix / norms
+
+
+class Recommender:
+    """Feature matrix over all plants plus per-region candidate masks."""
+
+    def __init__(self):
+        self.plant_ids = np.zeros(0, dtype=np.int64)
+        self.matrix = np.zeros((0, len(FEATURES)), dtype=np.float32)
+        self.indoor = np.zeros(0, dtype=bool)
+        self.positions = {}
+        self.region_masks = {}
+        self.watermark = None
+        self.refreshed_at = 0.0
+        self._region_stamp = None
+
+    @classmethod
+    def build(cls):
+        """Load every plant and return a ready recommender."""
+        recommender = cls()
+        recommender._merge(recommender._load_rows())
+        recommender._build_region_masks()
+        recommender.refreshed_at = time.monotonic()
+        return recommender
+
+    def _load_rows(self, since=None):
+        """Fetch one feature row per plant, optionally only those changed since `since`."""
+        stmt = select(*_feature_columns()).outerjoin(
+            PlantCareDetails, PlantCareDetails.plant_id == Plant.plant_id)
+        if since is not None:
+            stmt = stmt.where(Plant.last_updated >= since)
+
+        rows = {}
+        for row in db.session.execute(stmt.order_by(Plant.plant_id, PlantCareDetails.care_id)):
+            rows.setdefault(row[0], row)
+        return list(rows.values())
+
+    def _merge(self, rows):
+        """Overwrite changed plants in place and append new ones.
+
+        Returns True if the region masks are out of date: plants were added
+        or a plant's indoor flag changed.
+        """
+        if not rows:
+            return False
+
+        vectors = _normalize(np.stack([feature_vector(row) for row in rows]))
+        indoor_position = BOOLEAN_FLAGS.index('indoor')
+        new_ids, new_vectors = [], []
+        indoor_changed = False
+
+        for row, vector in zip(rows, vectors):
+            plant_id, last_updated = row[0], row[1]
+            if last_updated and (self.watermark is None or last_updated > self.watermark):
+                self.watermark = last_updated
+
+            position = self.positions.get(plant_id)
+            if position is None:
+                new_ids.append(plant_id)
+                new_vectors.append(vector)
+            else:
+                indoor = vector[indoor_position] > 0
+                indoor_changed |= bool(indoor != self.indoor[position])
+                self.matrix[position] = vector
+                self.indoor[position] = indoor
+
+        if new_ids:
+            start = len(self.plant_ids)
+            self.plant_ids = np.concatenate([self.plant_ids, np.array(new_ids, dtype=np.int64)])
+            self.matrix = np.vstack([self.matrix, np.array(new_vectors, dtype=np.float32)])
+            self.indoor = np.concatenate([self.indoor, np.array(new_vectors)[:, indoor_position] > 0])
+            self.positions.update({plant_id: start + i for i, plant_id in enumerate(new_ids)})
+
+        return bool(new_ids) or indoor_changed
+
+    def _build_region_masks(self):
+        """Precompute which plants are candidates in each region."""
+        pairs = db.session.execute(
+            select(PlantRegionCare.region_id, PlantRegionCare.plant_id).distinct()
+        ).all()
+
+        masks = {}
+        for region_id, plant_id in pairs:
+            position = self.positions.get(plant_id)
+            if position is None:
+                continue
+            if region_id not in masks:
+                masks[region_id] = self.indoor.copy()
+            masks[region_id][position] = True
+
+        self.region_masks = masks
+        self._region_stamp = self._current_region_stamp()
+
+    def _current_region_stamp(self):
+        """A cheap fingerprint of plant_region_care, to spot changes."""
+        return tuple(db.session.execute(
+            select(func.count(), func.max(PlantRegionCare.plant_region_id))
+        ).one())
+
+    def refreshed(self):
+        """Return a copy updated with plants changed since the last load.
+
+        The copy is swapped in whole, so requests scoring against this one
+        never see half-applied changes. Returns None if any plant it holds
+        was deleted; the caller should build a new recommender instead.
+        """
+        plant_ids = db.session.execute(select(Plant.plant_id)).scalars().all()
+        if not np.isin(self.plant_ids, plant_ids).all():
+            return None
+
+        updated = copy.copy(self)
+        updated.matrix = self.matrix.copy()
+        updated.indoor = self.indoor.copy()
+        updated.positions = dict(self.positions)
+
+        since = self.watermark - REFRESH_OVERLAP if self.watermark is not None else None
+        masks_stale = updated._merge(updated._load_rows(since))
+        if masks_stale or updated._current_region_stamp() != self._region_stamp:
+            updated._build_region_masks()
+
+        updated.refreshed_at = time.monotonic()
+        return updated
+
+    def candidates(self, region_id):
+        """Boolean mask of plants to consider for a user in region_id."""
+        mask = self.region_masks.get(region_id)
+        if mask is None:
+            return np.ones(len(self.plant_ids), dtype=bool)
+        return mask
+
+    def score(self, region_id, favorite_ids=(), collection_ids=(), limit=10):
+        """Return up to `limit` (plant_id, score) pairs, best first.
+
+        Plants already in the collection or favorited are never suggested.
+        With no favorites or collection, plants closest to the region's
+        typical candidate are suggested.
+        """
+        if not len(self.plant_ids):
+            return []
+
+        mask = self.candidates(region_id).copy()
+        weights = np.zeros(len(self.plant_ids), dtype=np.float32)
+
+        for plant_ids, weight in ((collection_ids, COLLECTION_WEIGHT),
+                                  (favorite_ids, FAVORITE_WEIGHT)):
+            positions = [self.positions[plant_id] for plant_id in plant_ids
+                         if plant_id in self.positions]
+            weights[positions] += weight
+            mask[positions] = False
+
+        if weights.any():
+            profile = weights @ self.matrix
+        else:
+            profile = self.matrix[mask].mean(axis=0) if mask.any() else self.matrix.mean(axis=0)
+
+        norm = np.linalg.norm(profile)
+        if norm == 0:
+            return []
+
+        scores = self.matrix @ (profile / norm)
+        scores[~mask] = -np.inf
+
+        limit = min(limit, int(mask.sum()))
+        if limit <= 0:
+            return []
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.argsort(-scores[top], kind='stable')]
+
+        return [(int(self.plant_ids[i]), float(scores[i])) for i in top]
+
+
+def get_recommender():
+    """Return this process's recommender, refreshing it when it is due."""
+    global _recommender
+
+    interval = int(os.environ.get('RECOMMENDER_REFRESH', 60))
+
+    with _recommender_lock:
+        if _recommender is None:
+            _recommender = Recommender.build()
+        elif time.monotonic() - _recommender.refreshed_at >= interval:
+            _recommender = _recommender.refreshed() or Recommender.build()
+        return _recommender
+
+
+def recommend_plants(user_id, limit=10):
+    """Return [(plant_id, score), ...] of plants to suggest to a user."""
+    region_id = db.session.execute(
+        select(User.region_id).where(User.user_id == user_id)).scalar()
+    favorite_ids = db.session.execute(
+        select(UserFavorite.plant_id).where(UserFavorite.user_id == user_id)).scalars().all()
+    collection_ids = db.session.execute(
+        select(UserPlant.plant_id).where(UserPlant.user_id == user_id)).scalars().all()
+
+    return get_recommender().score(region_id, favorite_ids, collection_ids, limit)
+
+
+if __name__ == "__main__":
+    import sys
+
+    from server import app
+    from model import connect_to_db
+
+    connect_to_db(app, echo=False)
+
+    with app.app_context():
+        start = time.perf_counter()
+        recommender = Recommender.build()
+        built = time.perf_counter() - start
+
+        start = time.perf_counter()
+        runs = 1000
+        for _ in range(runs):
+            recommender.score(None, collection_ids=recommender.plant_ids[:5].tolist())
+        scored = (time.perf_counter() - start) / runs
+
+        print(f"{len(recommender.plant_ids)} plants, {len(recommender.region_masks)} regions")
+        print(f"build {built * 1000:.1f} ms, score {scored * 1e6:.0f} us per user")
+
+        if len(sys.argv) > 1:
+            for plant_id, score in recommend_plants(int(sys.argv[1])):
+                print(f"{plant_id:>8}  {score:.3f}")
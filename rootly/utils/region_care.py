@@ -0,0 +1,118 @@
+"""Region-adjusted care for many plants at once.
+
+A plant's care is its PlantCareDetails with any PlantRegionCare row for the
+user's region laid over the top. get_region_care_many resolves a whole
+collection with at most one query and caches each merged result per
+(region, plant) pair for REGION_CARE_CACHE_TTL seconds (default 600).
+"""
+
+import os
+import threading
+
+from sqlalchemy import and_, select
+
+from model import db, Plant, PlantCareDetails, PlantRegionCare
+from utils.cache import TTLCache
+
+BASE_FIELDS = ('watering_frequency', 'watering_interval_days', 'sunlight_requirements',
+               'soil_preferences', 'temperature_range', 'fertilizing_schedule',
+               'difficulty_level', 'growth_rate')
+
+_merged = TTLCache(ttl=int(os.environ.get('REGION_CARE_CACHE_TTL', 600)), max_entries=50000)
+
+# Bumped per plant when its care details change, so old entries are skipped
+_plant_generations = {}
+_generations_lock = threading.Lock()
+
+
+def _key(region_id, plant_id):
+    """Cache key for a (region, plant) pair at the plant's current generation."""
+    return (region_id, plant_id, _plant_generations.get(plant_id, 0))
+
+
+def merge_care(care_details, region_care):
+    """Lay a PlantRegionCare row's overrides over a plant's base care.
+
+    Both arguments are mappings (or None). Returns a dict of the base
+    fields plus sunlight_adjustments, seasonal_notes and region_adjusted.
+    """
+    merged = {field: care_details[field] if care_details else None for field in BASE_FIELDS}
+    merged['sunlight_adjustments'] = None
+    merged['seasonal_notes'] = None
+    merged['region_adjusted'] = False
+
+    if region_care:
+        if region_care['watering_frequency']:
+            merged['watering_frequency'] = region_care['watering_frequency']
+        merged['sunlight_adjustments'] = region_care['sunlight_adjustments']
+        merged['seasonal_notes'] = region_care['seasonal_notes']
+        merged['region_adjusted'] = True
+
+    return merged
+
+
+def get_region_care_many(region_id, plant_ids):
+    """Return {plant_id: merged care} for plant_ids in region_id.
+
+    Cached pairs cost nothing; the rest are fetched together in one query.
+    """
+    result = {}
+    missing = []
+
+    for plant_id in dict.fromkeys(plant_ids):
+        merged = _merged.get(_key(region_id, plant_id))
+        if merged is None:
+            missing.append(plant_id)
+        else:
+            result[plant_id] = merged
+
+    if not missing:
+        return result
+
+    care_columns = [PlantCareDetails.care_id] + [getattr(PlantCareDetails, field)
+                                                 for field in BASE_FIELDS]
+    region_columns = [PlantRegionCare.plant_region_id,
+                      PlantRegionCare.watering_frequency.label('region_watering_frequency'),
+                      PlantRegionCare.sunlight_adjustments, PlantRegionCare.seasonal_notes]
+
+    stmt = (
+        select(Plant.plant_id, *care_columns, *region_columns)
+        .outerjoin(PlantCareDetails, PlantCareDetails.plant_id == Plant.plant_id)
+        .outerjoin(PlantRegionCare, and_(PlantRegionCare.plant_id == Plant.plant_id,
+                                         PlantRegionCare.region_id == region_id))
+        .where(Plant.plant_id.in_(missing))
+        .order_by(Plant.plant_id, PlantCareDetails.care_id, PlantRegionCare.plant_region_id)
+    )
+
+    fetched = {}
+    for row in db.session.execute(stmt):
+        row = row._mapping
+        if row['plant_id'] in fetched:
+            continue
+        care_details = row if row['care_id'] is not None else None
+        region_care = None
+        if row['plant_region_id'] is not None:
+            region_care = {'watering_frequency': row['region_watering_frequency'],
+                           'sunlight_adjustments': row['sunlight_adjustments'],
+                           'seasonal_notes': row['seasonal_notes']}
+        fetched[row['plant_id']] = merge_care(care_details, region_care)
+
+    for plant_id in missing:
+        merged = fetched.get(plant_id) or merge_care(None, None)
+        _merged.set(_key(region_id, plant_id), merged)
+        result[plant_id] = merged
+
+    return result
+
+
+def invalidate_region_care(plant_id, region_id=None):
+    """Forget merged care after a plant's care details or region notes change.
+
+    With region_id, only that pair is dropped; without it, every region's.
+    """
+    if region_id is not None:
+        _merged.delete(_key(region_id, plant_id))
+        return
+
+    with _generations_lock:
+        _plant_generations[plant_id] = _plant_generations.get(plant_id, 0) + 1
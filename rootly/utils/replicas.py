@@ -0,0 +1,176 @@
+"""Send reads to replica databases and writes to the primary.
+
+connect_to_db registers every URL in DATABASE_REPLICA_URLS as a bind named
+replica_<n>. db.session is a RoutingSession, which picks an engine per
+statement:
+
+- flushes, INSERT/UPDATE/DELETE, SELECT ... FOR UPDATE and textual SQL
+  always go to the primary;
+- plain SELECTs go to a replica while replica reads are switched on: for
+  the whole of a GET or HEAD request (see init_read_routing), or inside
+  read_replica(), which also decorates the crud getters;
+- once a session has written, its later reads go to the primary too;
+- inside use_primary() everything goes to the primary, read_replica() or
+  not.
+
+Read-your-writes across requests: when a request commits a write, the
+user's session cookie is pinned to the primary for REPLICA_STICKY_SECONDS
+(default 10), which should exceed the replicas' usual lag. Requests from
+that browser read only from the primary until then.
+
+Each session keeps to one replica, picked at random, so a page never
+mixes rows from replicas at different points in time. Without replicas
+every statement goes to the primary and the request hooks do nothing.
+
+Process caches (page cache, dashboard summaries) refilled by a replica
+read just after an invalidation can hold pre-write rows until their TTL,
+so keep replica lag well under those TTLs.
+
+Settings (environment variables):
+
+- DATABASE_REPLICA_URLS: comma-separated replica URLs (default none)
+- REPLICA_STICKY_SECONDS: how long a write pins reads to the primary
+"""
+
+import os
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from flask import current_app, g, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.sql import CompoundSelect, Select
+
+REPLICA_PREFIX = 'replica_'
+STICKY_SECONDS = float(os.environ.get('REPLICA_STICKY_SECONDS', 10))
+STICKY_KEY = '_primary_until'
+READ_ONLY_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Whether plain SELECTs may go to a replica
+_replica_reads = ContextVar('replica_reads', default=False)
+
+# Set for requests that must read their own recent writes
+_pinned_to_primary = ContextVar('pinned_to_primary', default=False)
+
+
+def get_replica_urls():
+    """Replica URLs from DATABASE_REPLICA_URLS."""
+    return [url.strip() for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',')
+            if url.strip()]
+
+
+def replica_binds(urls, engine_options):
+    """SQLALCHEMY_BINDS entries for the replica URLs."""
+    return {f"{REPLICA_PREFIX}{i}": {'url': url, **engine_options(url)}
+            for i, url in enumerate(urls)}
+
+
+@contextmanager
+def read_replica():
+    """Let plain SELECTs in the block go to a replica.
+
+    Works as a decorator too. Reads still go to the primary if the session
+    has already written, or the request is pinned after a recent write.
+    """
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+@contextmanager
+def use_primary():
+    """Send every statement in the block to the primary, even from read_replica() code."""
+    token = _pinned_to_primary.set(True)
+    try:
+        yield
+    finally:
+        _pinned_to_primary.reset(token)
+
+
+class RoutingSession(Session):
+    """Session that sends plain reads to a replica when allowed."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self._reads_from_replica(clause):
+            replica = self._replica_engine()
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper, clause=clause, bind=bind, **kwargs)
+
+    def _reads_from_replica(self, clause):
+        if not _replica_reads.get() or _pinned_to_primary.get():
+            return False
+        if self._flushing or self.info.get('wrote'):
+            return False
+        return (isinstance(clause, (Select, CompoundSelect))
+                and getattr(clause, '_for_update_arg', None) is None)
+
+    def _replica_engine(self):
+        engines = self._db.engines
+        key = self.info.get('replica')
+        if key is None:
+            keys = [key for key in engines if isinstance(key, str) and key.startswith(REPLICA_PREFIX)]
+            if not keys:
+                return None
+            key = self.info['replica'] = random.choice(keys)
+        return engines[key]
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _note_statement_write(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info['wrote'] = True
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _note_flush_write(session, flush_context):
+    session.info['wrote'] = True
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _note_committed_write(session):
+    if session.info.get('wrote'):
+        session.info['committed_write'] = True
+
+
+def has_replicas(app=None):
+    """Whether any replica binds are configured."""
+    binds = (app or current_app).config.get('SQLALCHEMY_BINDS') or {}
+    return any(key.startswith(REPLICA_PREFIX) for key in binds)
+
+
+def _route_reads():
+    if not has_replicas():
+        return
+
+    if session.get(STICKY_KEY, 0) > time.time():
+        g.replica_pin_token = _pinned_to_primary.set(True)
+    if request.method in READ_ONLY_METHODS:
+        g.replica_reads_token = _replica_reads.set(True)
+
+
+def _stick_after_write(response):
+    db = current_app.extensions['sqlalchemy']
+    if has_replicas() and db.session.registry.has() and db.session().info.get('committed_write'):
+        session[STICKY_KEY] = time.time() + STICKY_SECONDS
+    return response
+
+
+def _reset_routing(error=None):
+    token = g.pop('replica_reads_token', None)
+    if token is not None:
+        _replica_reads.reset(token)
+    token = g.pop('replica_pin_token', None)
+    if token is not None:
+        _pinned_to_primary.reset(token)
+
+
+def init_read_routing(app):
+    """Route read-only requests to replicas, with read-your-writes stickiness."""
+    app.before_request(_route_reads)
+    app.after_request(_stick_after_write)
+    app.teardown_request(_reset_routing)
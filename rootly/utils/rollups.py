@@ -0,0 +1,319 @@
+"""Care-event rollups for Rootly.
+
+care_events is append-only and grows without bound, so pages that only need
+counts, last-watered dates and streaks read these summaries instead:
+
+- user_plant_care_summaries: one row per UserPlant
+- user_care_daily: one row per user per day with care logged
+
+Both are updated in the same transaction as the events they summarise, with
+SQL upserts that are safe under concurrent writers (see record_care_events).
+Backdated events update the counts but can leave streaks stale;
+rebuild_rollups recomputes everything from the raw events and is meant to
+run periodically:
+
+    python -m utils.rollups
+"""
+
+from datetime import date, timedelta
+
+from sqlalchemy import bindparam, case, delete, func, insert, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from model import db, CareEvent, UserPlant, UserPlantCareSummary, UserCareDaily
+
+WATERING = 'watering'
+
+# Rows per bulk insert when rebuilding
+CHUNK_SIZE = 1000
+
+
+def is_watering(event_type):
+    """Return True if the event type counts as watering."""
+    return (event_type or '').lower() == WATERING
+
+
+def _advance_streak(streak, last_day, day):
+    """Return the streak after care on `day`, given the previous care day."""
+    if last_day is None or day > last_day + timedelta(days=1):
+        return 1
+    if day == last_day + timedelta(days=1):
+        return streak + 1
+    return streak
+
+
+def _insert_statement(model):
+    """INSERT for model in the dialect in use, for ON CONFLICT clauses."""
+    insert = sqlite_insert if db.session.get_bind().dialect.name == 'sqlite' else pg_insert
+    return insert(model)
+
+
+def _later(current, incoming):
+    """SQL for the later of two nullable timestamps (GREATEST, minus NULLs)."""
+    return case((incoming == None, current), (current == None, incoming),
+                (incoming > current, incoming), else_=current)
+
+
+def record_care_events(events):
+    """Fold new care events into the rollups.
+
+    `events` is a list of (user_id, user_plant_id, event_type, when) tuples.
+    Counts are added and latest timestamps kept by INSERT ... ON CONFLICT DO
+    UPDATE in SQL, so concurrent transactions never lose each other's
+    increments or collide inserting the first row for a plant or day. The
+    upsert also locks each summary row until commit, so the streak fields
+    read back from it can be advanced and written without a race. Daily
+    streaks are set only when a day's row is first inserted; as before,
+    rebuild_rollups corrects any that concurrent writers leave stale.
+    The caller commits alongside the events themselves.
+    """
+    if not events:
+        return
+
+    plants, days = {}, {}
+    for user_id, user_plant_id, event_type, when in events:
+        watering = is_watering(event_type)
+
+        plant = plants.setdefault(user_plant_id, {
+            'user_plant_id': user_plant_id, 'event_count': 0, 'watering_count': 0,
+            'last_event_at': when, 'last_watered_at': None, 'care_days': set()})
+        plant['event_count'] += 1
+        plant['last_event_at'] = max(plant['last_event_at'], when)
+        plant['care_days'].add(when.date())
+        if watering:
+            plant['watering_count'] += 1
+            plant['last_watered_at'] = max(plant['last_watered_at'] or when, when)
+
+        day = days.setdefault((user_id, when.date()), {
+            'user_id': user_id, 'day': when.date(), 'event_count': 0, 'watering_count': 0})
+        day['event_count'] += 1
+        day['watering_count'] += watering
+
+    _upsert_summaries(list(plants.values()))
+    _upsert_daily(days)
+
+
+def _upsert_summaries(plants):
+    """Add counts to the plant summaries in SQL, then advance their streaks."""
+    table = UserPlantCareSummary.__table__
+    streaks = {}
+    for start in range(0, len(plants), CHUNK_SIZE):
+        chunk = plants[start:start + CHUNK_SIZE]
+        stmt = _insert_statement(UserPlantCareSummary).values([
+            {'user_plant_id': plant['user_plant_id'], 'event_count': plant['event_count'],
+             'watering_count': plant['watering_count'], 'last_event_at': plant['last_event_at'],
+             'last_watered_at': plant['last_watered_at'], 'last_care_day': None,
+             'current_streak': 0, 'longest_streak': 0}
+            for plant in chunk
+        ])
+        stmt = stmt.on_conflict_do_update(index_elements=[table.c.user_plant_id], set_={
+            'event_count': table.c.event_count + stmt.excluded.event_count,
+            'watering_count': table.c.watering_count + stmt.excluded.watering_count,
+            'last_event_at': _later(table.c.last_event_at, stmt.excluded.last_event_at),
+            'last_watered_at': _later(table.c.last_watered_at, stmt.excluded.last_watered_at),
+        }).returning(table.c.user_plant_id, table.c.last_care_day,
+                     table.c.current_streak, table.c.longest_streak)
+        for row in db.session.execute(stmt):
+            streaks[row.user_plant_id] = row
+
+    updates = []
+    for plant in plants:
+        _, last_day, streak, longest = streaks[plant['user_plant_id']]
+        new_days = sorted(day for day in plant['care_days'] if last_day is None or day > last_day)
+        if not new_days:
+            continue
+        for day in new_days:
+            streak = _advance_streak(streak, last_day, day)
+            last_day = day
+            longest = max(longest, streak)
+        updates.append({'user_plant_id': plant['user_plant_id'], 'last_care_day': last_day,
+                        'current_streak': streak, 'longest_streak': longest})
+
+    if updates:
+        db.session.execute(update(table).where(table.c.user_plant_id == bindparam('plant_id')),
+                           [dict(row, plant_id=row.pop('user_plant_id')) for row in updates])
+
+
+def _upsert_daily(days):
+    """Add counts to the per-user daily rows; new rows continue the streak."""
+    table = UserCareDaily.__table__
+    user_ids = {user_id for user_id, _ in days}
+    earliest = min(day for _, day in days) - timedelta(days=1)
+    latest = max(day for _, day in days)
+
+    streaks = {
+        (row.user_id, row.day): row.streak
+        for row in db.session.execute(
+            select(table.c.user_id, table.c.day, table.c.streak)
+            .where(table.c.user_id.in_(user_ids), table.c.day >= earliest, table.c.day <= latest))
+    }
+    rows = []
+    for key in sorted(days):
+        user_id, day = key
+        if key not in streaks:
+            streaks[key] = streaks.get((user_id, day - timedelta(days=1)), 0) + 1
+        rows.append(dict(days[key], streak=streaks[key]))
+
+    for start in range(0, len(rows), CHUNK_SIZE):
+        stmt = _insert_statement(UserCareDaily).values(rows[start:start + CHUNK_SIZE])
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=[table.c.user_id, table.c.day], set_={
+                'event_count': table.c.event_count + stmt.excluded.event_count,
+                'watering_count': table.c.watering_count + stmt.excluded.watering_count,
+            }))
+
+
+def rebuild_rollups(user_id=None):
+    """Recompute rollups from care_events, for one user or everyone.
+
+    Counts come from aggregate queries; streaks are computed from the
+    distinct care days, which are streamed in order.
+    """
+    watering = case((func.lower(CareEvent.event_type) == WATERING, 1), else_=0)
+    event_day = func.date(CareEvent.date, type_=db.Date)
+
+    plants = select(UserPlant.user_plant_id)
+    if user_id is not None:
+        plants = plants.where(UserPlant.user_id == user_id)
+
+    db.session.execute(delete(UserPlantCareSummary).where(
+        UserPlantCareSummary.user_plant_id.in_(plants)))
+    daily_delete = delete(UserCareDaily)
+    if user_id is not None:
+        daily_delete = daily_delete.where(UserCareDaily.user_id == user_id)
+    db.session.execute(daily_delete)
+
+    # Per-plant totals
+    totals = (
+        select(CareEvent.user_plant_id,
+               func.count().label('event_count'),
+               func.sum(watering).label('watering_count'),
+               func.max(CareEvent.date).label('last_event_at'),
+               func.max(case((func.lower(CareEvent.event_type) == WATERING, CareEvent.date)))
+                   .label('last_watered_at'))
+        .where(CareEvent.user_plant_id.in_(plants))
+        .group_by(CareEvent.user_plant_id)
+    )
+    summaries = {
+        row.user_plant_id: dict(row._mapping, last_care_day=None,
+                                current_streak=0, longest_streak=0)
+        for row in db.session.execute(totals)
+    }
+
+    # Per-plant streaks from distinct care days
+    plant_days = (
+        select(CareEvent.user_plant_id, event_day.label('day'))
+        .where(CareEvent.user_plant_id.in_(plants))
+        .group_by(CareEvent.user_plant_id, event_day)
+        .order_by(CareEvent.user_plant_id, event_day)
+        .execution_options(yield_per=CHUNK_SIZE)
+    )
+    for user_plant_id, day in db.session.execute(plant_days):
+        summary = summaries[user_plant_id]
+        summary['current_streak'] = _advance_streak(summary['current_streak'],
+                                                    summary['last_care_day'], day)
+        summary['last_care_day'] = day
+        summary['longest_streak'] = max(summary['longest_streak'], summary['current_streak'])
+
+    _insert_chunked(UserPlantCareSummary, list(summaries.values()))
+
+    # Per-user daily rows
+    user_days = (
+        select(UserPlant.user_id, event_day.label('day'),
+               func.count().label('event_count'),
+               func.sum(watering).label('watering_count'))
+        .join(UserPlant, UserPlant.user_plant_id == CareEvent.user_plant_id)
+        .group_by(UserPlant.user_id, event_day)
+        .order_by(UserPlant.user_id, event_day)
+        .execution_options(yield_per=CHUNK_SIZE)
+    )
+    if user_id is not None:
+        user_days = user_days.where(UserPlant.user_id == user_id)
+
+    rows, last = [], None
+    for row in db.session.execute(user_days):
+        if last and last['user_id'] == row.user_id:
+            streak = _advance_streak(last['streak'], last['day'], row.day)
+        else:
+            streak = 1
+        last = dict(row._mapping, streak=streak)
+        rows.append(last)
+        if len(rows) >= CHUNK_SIZE:
+            _insert_chunked(UserCareDaily, rows)
+            rows = []
+    _insert_chunked(UserCareDaily, rows)
+
+    db.session.commit()
+
+
+def _insert_chunked(model, rows):
+    """Insert rows in multi-row chunks."""
+    for start in range(0, len(rows), CHUNK_SIZE):
+        db.session.execute(insert(model), rows[start:start + CHUNK_SIZE])
+
+
+def _live_streak(streak, last_day, today):
+    """A streak only counts if care was logged today or yesterday."""
+    if last_day is None or last_day < today - timedelta(days=1):
+        return 0
+    return streak
+
+
+def get_plant_care_summary(user_plant_id, today=None):
+    """Return care stats for a user's plant from its rollup row."""
+    today = today or date.today()
+    summary = db.session.get(UserPlantCareSummary, user_plant_id)
+
+    if not summary:
+        return {'event_count': 0, 'watering_count': 0, 'last_event_at': None,
+                'last_watered_at': None, 'current_streak': 0, 'longest_streak': 0}
+
+    return {
+        'event_count': summary.event_count,
+        'watering_count': summary.watering_count,
+        'last_event_at': summary.last_event_at,
+        'last_watered_at': summary.last_watered_at,
+        'current_streak': _live_streak(summary.current_streak, summary.last_care_day, today),
+        'longest_streak': summary.longest_streak
+    }
+
+
+def get_user_care_stats(user_id, days=7, today=None):
+    """Return dashboard care stats for a user.
+
+    Reads at most `days` daily rows plus one aggregate over the user's plant
+    summaries, regardless of how many events the user has logged.
+    """
+    today = today or date.today()
+    recent = UserCareDaily.query.filter(
+        UserCareDaily.user_id == user_id,
+        UserCareDaily.day > today - timedelta(days=days)
+    ).order_by(UserCareDaily.day.desc()).all()
+
+    totals = db.session.execute(
+        select(func.coalesce(func.sum(UserPlantCareSummary.event_count), 0),
+               func.max(UserPlantCareSummary.last_watered_at))
+        .join(UserPlant, UserPlant.user_plant_id == UserPlantCareSummary.user_plant_id)
+        .where(UserPlant.user_id == user_id)
+    ).one()
+
+    latest = recent[0] if recent else None
+    return {
+        'total_events': totals[0],
+        'last_watered_at': totals[1],
+        'events_this_week': sum(row.event_count for row in recent),
+        'waterings_this_week': sum(row.watering_count for row in recent),
+        'current_streak': _live_streak(latest.streak, latest.day, today) if latest else 0
+    }
+
+
+if __name__ == "__main__":
+    from server import app
+    from model import connect_to_db
+
+    connect_to_db(app, echo=False)
+
+    with app.app_context():
+        rebuild_rollups()
+        print("Rollups rebuilt!")
@@ -0,0 +1,136 @@
+"""Purge uploaded images that no row refers to any more.
+
+Deleting a user or a plant from a collection removes its rows in one
+cascading statement, which leaves its images behind in the upload folder.
+Rather than finding and unlinking them on the request path, crud calls
+schedule_upload_purge after the delete commits. That wakes a background
+thread which lists the folder, streams every image_url still referenced,
+and removes the rest.
+
+Files younger than UPLOAD_PURGE_GRACE seconds (default 86400) are kept,
+since an upload is saved before the row that points to it (and the
+identify page shows images that are never stored at all).
+
+The purge can also run from cron:
+
+    python -m utils.uploads [--dry-run]
+"""
+
+import logging
+import os
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import select, union
+
+from model import db, HealthAssessment, IdentificationHistory, Plant, UserPlant
+
+GRACE_SECONDS = int(os.environ.get('UPLOAD_PURGE_GRACE', 86400))
+UPLOAD_URL_PREFIX = '/static/uploads/'
+
+logger = logging.getLogger(__name__)
+
+_purge_lock = threading.Lock()
+_purge_requested = threading.Event()
+_purge_thread = None
+
+
+def referenced_uploads():
+    """Return the set of upload filenames that some row still points to."""
+    urls = union(
+        select(UserPlant.image_url),
+        select(HealthAssessment.image_url),
+        select(IdentificationHistory.image_url),
+        select(Plant.image_url),
+    )
+
+    filenames = set()
+    for (image_url,) in db.session.execute(urls.execution_options(yield_per=5000)):
+        if image_url and image_url.startswith(UPLOAD_URL_PREFIX):
+            filenames.add(os.path.basename(image_url[len(UPLOAD_URL_PREFIX):]))
+    return filenames
+
+
+def purge_orphaned_uploads(upload_dir, grace=GRACE_SECONDS, dry_run=False):
+    """Remove files in upload_dir older than grace seconds that nothing references.
+
+    Returns the filenames removed (or that would be, with dry_run).
+    """
+    cutoff = time.time() - grace
+    candidates = []
+    with os.scandir(upload_dir) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                candidates.append(entry.name)
+
+    if not candidates:
+        return []
+
+    referenced = referenced_uploads()
+    orphans = [name for name in candidates if name not in referenced]
+
+    if not dry_run:
+        for name in orphans:
+            try:
+                os.remove(os.path.join(upload_dir, name))
+            except FileNotFoundError:
+                pass
+
+    return orphans
+
+
+def _purge_worker(app):
+    """Run purges until no more have been requested, then exit."""
+    global _purge_thread
+
+    while True:
+        _purge_requested.clear()
+        try:
+            with app.app_context():
+                removed = purge_orphaned_uploads(app.config['UPLOAD_FOLDER'])
+                db.session.remove()
+            if removed:
+                logger.info("Purged %d orphaned uploads", len(removed))
+        except Exception:
+            logger.exception("Upload purge failed")
+
+        with _purge_lock:
+            if not _purge_requested.is_set():
+                _purge_thread = None
+                return
+
+
+def schedule_upload_purge():
+    """Ask the background purger to run; returns immediately.
+
+    Requests made while a purge is running are folded into one more run.
+    """
+    global _purge_thread
+
+    app = current_app._get_current_object()
+    with _purge_lock:
+        _purge_requested.set()
+        if _purge_thread is None:
+            _purge_thread = threading.Thread(target=_purge_worker, args=(app,),
+                                             name='upload-purge', daemon=True)
+            _purge_thread.start()
+
+
+if __name__ == "__main__":
+    import sys
+
+    from server import app
+    from model import connect_to_db
+
+    connect_to_db(app, echo=False)
+    dry_run = '--dry-run' in sys.argv[1:]
+
+    with app.app_context():
+        start = time.perf_counter()
+        removed = purge_orphaned_uploads(app.config['UPLOAD_FOLDER'], dry_run=dry_run)
+        elapsed = time.perf_counter() - start
+        for name in removed:
+            print(name)
+        verb = 'would remove' if dry_run else 'removed'
+        print(f"{verb} {len(removed)} orphaned uploads in {elapsed:.2f} s")
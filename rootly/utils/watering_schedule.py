@@ -0,0 +1,185 @@
+"""Nightly watering schedules adjusted for each user's climate.
+
+A plant's next watering date is the day it was last watered plus its
+species' watering_interval_days, scaled by the user's region:
+
+- every 10°F of Region.avg_temperature above 65°F shortens the interval by
+  15% (and every 10°F below lengthens it), within 0.6x to 1.4x;
+- Region.humidity_level 'low' shortens it to 0.85x, 'high' lengthens it
+  to 1.15x.
+
+Last watering times come from UserPlantCareSummary.last_watered_at, which
+crud keeps in step with watering CareEvents. Plants never watered are due
+today, and plants whose species has no interval get no date.
+
+Species intervals and region factors are loaded once into arrays indexed by
+id. Active user plants are then read in keyset-ordered chunks of
+WATERING_CHUNK_SIZE rows (default 10000), their due dates computed with
+NumPy, and only changed rows written back in one UPDATE ... FROM unnest per
+chunk, committed chunk by chunk.
+
+    python -m utils.watering_schedule
+"""
+
+import os
+import time
+from datetime import date
+
+import numpy as np
+from sqlalchemy import Date, Integer, bindparam, func, select, text, update
+from sqlalchemy.dialects.postgresql import ARRAY
+
+from model import db, PlantCareDetails, Region, User, UserPlant, UserPlantCareSummary
+
+CHUNK_SIZE = int(os.environ.get('WATERING_CHUNK_SIZE', 10000))
+
+REFERENCE_TEMPERATURE = 65.0
+TEMPERATURE_SENSITIVITY = 0.015
+MIN_FACTOR, MAX_FACTOR = 0.6, 1.4
+HUMIDITY_FACTORS = {'low': 0.85, 'moderate': 1.0, 'high': 1.15}
+
+_UNNEST_UPDATE = text("""
+    UPDATE user_plants
+    SET next_watering_date = v.due, version = user_plants.version + 1
+    FROM (SELECT unnest(:ids) AS user_plant_id, unnest(:due) AS due) AS v
+    WHERE user_plants.user_plant_id = v.user_plant_id
+""").bindparams(bindparam('ids', type_=ARRAY(Integer)), bindparam('due', type_=ARRAY(Date)))
+
+
+def climate_factor(avg_temperature, humidity_level):
+    """Return the multiplier applied to a watering interval in a region."""
+    factor = 1.0
+    if avg_temperature is not None:
+        factor -= TEMPERATURE_SENSITIVITY * (avg_temperature - REFERENCE_TEMPERATURE)
+        factor = min(max(factor, MIN_FACTOR), MAX_FACTOR)
+    return factor * HUMIDITY_FACTORS.get((humidity_level or '').strip().lower(), 1.0)
+
+
+def load_species_intervals():
+    """Return a float array of watering intervals indexed by plant_id (NaN if unknown)."""
+    rows = db.session.execute(
+        select(PlantCareDetails.plant_id, func.min(PlantCareDetails.watering_interval_days))
+        .where(PlantCareDetails.watering_interval_days > 0)
+        .group_by(PlantCareDetails.plant_id)
+    ).all()
+
+    intervals = np.full(max((plant_id for plant_id, _ in rows), default=0) + 1, np.nan)
+    for plant_id, interval in rows:
+        intervals[plant_id] = interval
+    return intervals
+
+
+def load_region_factors():
+    """Return climate factors indexed by region_id; index 0 is for users with no region."""
+    rows = db.session.execute(
+        select(Region.region_id, Region.avg_temperature, Region.humidity_level)).all()
+
+    factors = np.ones(max((row.region_id for row in rows), default=0) + 1)
+    for row in rows:
+        factors[row.region_id] = climate_factor(row.avg_temperature, row.humidity_level)
+    return factors
+
+
+def compute_due_dates(plant_ids, region_ids, last_watered, intervals, factors, today):
+    """Vectorised due dates for one chunk.
+
+    plant_ids and region_ids are int arrays (region 0 for none), last_watered
+    a datetime64[D] array with NaT for never watered. Returns datetime64[D]
+    with NaT where the species has no interval.
+    """
+    known = plant_ids < len(intervals)
+    species_interval = np.full(len(plant_ids), np.nan)
+    species_interval[known] = intervals[plant_ids[known]]
+
+    region_ids = np.where(region_ids < len(factors), region_ids, 0)
+    days = np.maximum(np.rint(species_interval * factors[region_ids]), 1)
+
+    due = last_watered + np.nan_to_num(days).astype(np.int64).astype('timedelta64[D]')
+    due = np.where(np.isnat(last_watered), np.datetime64(today, 'D'), due)
+    return np.where(np.isnan(days), np.datetime64('NaT', 'D'), due)
+
+
+def _write_due_dates(ids, due):
+    """Write (user_plant_id, next_watering_date) pairs and bump row versions."""
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute(_UNNEST_UPDATE, {'ids': ids, 'due': due})
+        return
+
+    user_plants = UserPlant.__table__
+    db.session.execute(
+        update(user_plants)
+        .where(user_plants.c.user_plant_id == bindparam('target_id'))
+        .values(next_watering_date=bindparam('due_date'), version=user_plants.c.version + 1),
+        [{'target_id': user_plant_id, 'due_date': day} for user_plant_id, day in zip(ids, due)]
+    )
+
+
+def update_watering_schedules(today=None, chunk_size=CHUNK_SIZE):
+    """Recompute next_watering_date for every active user plant.
+
+    Returns (plants scanned, rows updated).
+    """
+    today = today or date.today()
+    intervals = load_species_intervals()
+    factors = load_region_factors()
+
+    stmt = (
+        select(UserPlant.user_plant_id, UserPlant.plant_id, User.region_id,
+               UserPlantCareSummary.last_watered_at, UserPlant.next_watering_date)
+        .join(User, User.user_id == UserPlant.user_id)
+        .outerjoin(UserPlantCareSummary,
+                   UserPlantCareSummary.user_plant_id == UserPlant.user_plant_id)
+        .where(UserPlant.status == 'active')
+        .order_by(UserPlant.user_plant_id)
+        .limit(chunk_size)
+    )
+
+    scanned = updated = 0
+    after = 0
+    while True:
+        rows = db.session.execute(stmt.where(UserPlant.user_plant_id > after)).all()
+        if not rows:
+            break
+
+        ids, plant_ids, region_ids, last_watered, current = zip(*rows)
+        due = compute_due_dates(
+            np.array(plant_ids, dtype=np.int64),
+            np.array([region_id or 0 for region_id in region_ids], dtype=np.int64),
+            np.array(last_watered, dtype='datetime64[D]'),
+            intervals, factors, today)
+
+        current = np.array(current, dtype='datetime64[D]')
+        changed = np.flatnonzero((due != current) & ~(np.isnat(due) & np.isnat(current)))
+        if len(changed):
+            _write_due_dates(np.array(ids)[changed].tolist(), due[changed].astype(object).tolist())
+
+        db.session.commit()
+        scanned += len(rows)
+        updated += len(changed)
+        after = ids[-1]
+
+    # Plants that stopped being active keep no schedule
+    user_plants = UserPlant.__table__
+    result = db.session.execute(
+        update(user_plants)
+        .where(user_plants.c.status.is_distinct_from('active'),
+               user_plants.c.next_watering_date != None)
+        .values(next_watering_date=None, version=user_plants.c.version + 1)
+    )
+    db.session.commit()
+
+    return scanned, updated + result.rowcount
+
+
+if __name__ == "__main__":
+    from server import app
+    from model import connect_to_db
+
+    connect_to_db(app, echo=False)
+
+    with app.app_context():
+        start = time.perf_counter()
+        scanned, updated = update_watering_schedules()
+        elapsed = time.perf_counter() - start
+        rate = scanned / elapsed if elapsed else 0
+        print(f"scanned {scanned} plants, updated {updated} in {elapsed:.1f} s ({rate:,.0f} plants/s)")
@@ -0,0 +1,376 @@
+"""Write-behind buffering for care events and identification records.
+
+With WRITE_BEHIND_ENABLED set, record_care_event and record_identification
+append the row to a local spill file, fsync it and return; nothing waits
+on the database. A background thread writes the spilled rows with one
+multi-row insert per table whenever WRITE_BEHIND_MAX_ROWS are waiting or
+WRITE_BEHIND_MAX_DELAY seconds have passed. Rollups and dashboard caches
+are updated in the same transaction, as crud's _many helpers always do.
+Until that flush, a buffered event is not visible on the plant's page.
+
+Spill files live in WRITE_BEHIND_DIR. Each process appends to its own
+segment and starts a new one at every flush. Whoever holds a segment's
+flock owns it: the writer while appending, then the flusher while
+inserting it. A segment is deleted only after its rows are committed, so a
+crash loses nothing. Segments left by a crashed process are unlocked, and
+the next flush of any process (including one at start-up) replays them.
+Every row is given a write_id, unique in its table, when it is buffered.
+A crash between the commit and the delete replays that segment, and rows
+whose write_id is already in the table are skipped, so no event is
+inserted or counted in the rollups twice.
+
+Rows whose user, plant or catalog plant was deleted before the flush are
+dropped; an identification whose user plant is gone keeps the row with no
+user_plant_id, as the foreign key's ON DELETE SET NULL would. If a batch
+fails anyway, its rows are retried one at a time and those that still fail
+are logged and moved to a dead-*.ndjson file next to the segments, so one
+bad row never holds up the rest. Connection errors are not blamed on the
+rows: the segment stays and is retried on the next flush.
+
+Without WRITE_BEHIND_ENABLED both functions write through crud at once.
+
+Settings (environment variables):
+
+- WRITE_BEHIND_ENABLED: 1 to buffer writes (default off)
+- WRITE_BEHIND_DIR: spill directory (default rootly/data/write_behind)
+- WRITE_BEHIND_MAX_ROWS: rows that trigger a flush (default 500)
+- WRITE_BEHIND_MAX_DELAY: seconds a row may wait (default 1.0)
+
+    python -m utils.write_behind     # replay leftover spill files and exit
+"""
+
+import atexit
+import fcntl
+import glob
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from sqlalchemy.exc import InterfaceError, OperationalError
+
+import crud
+from model import db, CareEvent, IdentificationHistory, Plant, User, UserPlant
+
+SPILL_DIR = os.environ.get(
+    'WRITE_BEHIND_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'write_behind'))
+MAX_ROWS = int(os.environ.get('WRITE_BEHIND_MAX_ROWS', 500))
+MAX_DELAY = float(os.environ.get('WRITE_BEHIND_MAX_DELAY', 1.0))
+
+CARE_EVENT = 'care_event'
+IDENTIFICATION = 'identification'
+DATETIME_FIELDS = {CARE_EVENT: 'date', IDENTIFICATION: 'identified_at'}
+
+# Errors that say nothing about the rows being written
+TRANSIENT_ERRORS = (OperationalError, InterfaceError)
+
+logger = logging.getLogger(__name__)
+
+_buffer = None
+
+
+class WriteBehindBuffer:
+    """Durable local buffer in front of the care event and identification tables."""
+
+    def __init__(self, app, directory=SPILL_DIR, max_rows=MAX_ROWS, max_delay=MAX_DELAY):
+        self.app = app
+        self.directory = directory
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = False
+        self._segment = None
+        self._pending = 0
+        self._sequence = 0
+        self._thread = None
+
+        os.makedirs(directory, exist_ok=True)
+
+    # ----------------------------------------
+    # Appending
+    # ----------------------------------------
+
+    def submit(self, kind, row):
+        """Append one row to the spill file; it is durable when this returns."""
+        field = DATETIME_FIELDS[kind]
+        row = {**row, field: (row.get(field) or datetime.utcnow()).isoformat(),
+               'write_id': uuid.uuid4().hex}
+        line = json.dumps({'kind': kind, 'row': row}).encode() + b'\n'
+
+        with self._lock:
+            if self._segment is None:
+                self._segment = self._open_segment()
+            self._segment.write(line)
+            self._segment.flush()
+            # A flush may close the segment before we sync, so sync a duplicate
+            fd = os.dup(self._segment.fileno())
+            self._pending += 1
+            full = self._pending >= self.max_rows
+
+        # Outside the lock, so concurrent submits sync together instead of in turn
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+        if full:
+            self._wake.set()
+
+    def _open_segment(self):
+        """Create a new segment, locked before it becomes visible to flushers."""
+        self._sequence += 1
+        name = f"seg-{time.time_ns()}-{os.getpid()}-{self._sequence}.ndjson"
+        temp_path = os.path.join(self.directory, f"tmp-{name}")
+
+        segment = open(temp_path, 'ab')
+        fcntl.flock(segment.fileno(), fcntl.LOCK_EX)
+        os.rename(temp_path, os.path.join(self.directory, name))
+        return segment
+
+    def _close_segment(self):
+        """Hand the current segment over to the flushers. Call with _lock held."""
+        if self._segment is not None:
+            self._segment.close()
+            self._segment = None
+            self._pending = 0
+
+    # ----------------------------------------
+    # Flushing
+    # ----------------------------------------
+
+    def flush(self):
+        """Write every unlocked segment to the database; return rows written."""
+        with self._lock:
+            self._close_segment()
+
+        written = 0
+        with self._flush_lock:
+            for path in sorted(glob.glob(os.path.join(self.directory, 'seg-*.ndjson'))):
+                try:
+                    written += self._flush_segment(path)
+                except Exception:
+                    # The segment stays on disk and is retried on the next flush
+                    logger.exception("Write-behind flush of %s failed", path)
+        return written
+
+    def _flush_segment(self, path):
+        try:
+            segment = open(path, 'rb')
+        except FileNotFoundError:
+            return 0
+
+        with segment:
+            try:
+                fcntl.flock(segment.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                # Still being written, or another process is flushing it
+                return 0
+            if os.fstat(segment.fileno()).st_nlink == 0:
+                # Flushed and deleted while we waited to open it
+                return 0
+
+            records = []
+            for number, line in enumerate(segment, 1):
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # A write cut off by a crash; it was never acknowledged
+                    logger.warning("Skipping torn line %d of %s", number, path)
+
+            try:
+                written = self._write(records)
+            except TRANSIENT_ERRORS:
+                raise
+            except Exception:
+                logger.exception("Batch from %s failed, retrying its rows one by one", path)
+                written = self._write_one_by_one(path, records)
+
+            os.remove(path)
+            return written
+
+    def _write(self, records):
+        """Insert the records in one transaction and return how many were new.
+
+        Rows whose owner is gone, or that an earlier replay already wrote,
+        are left out.
+        """
+        rows = {CARE_EVENT: [], IDENTIFICATION: []}
+        for record in records:
+            row = dict(record['row'])
+            field = DATETIME_FIELDS[record['kind']]
+            row[field] = datetime.fromisoformat(row[field])
+            rows[record['kind']].append(row)
+
+        with self.app.app_context():
+            try:
+                with crud.unit_of_work():
+                    care_events, identifications = _still_owned(rows[CARE_EVENT],
+                                                                rows[IDENTIFICATION])
+                    care_events = _not_yet_written(CareEvent, care_events)
+                    identifications = _not_yet_written(IdentificationHistory, identifications)
+                    if care_events:
+                        crud.create_care_events_many(care_events)
+                    if identifications:
+                        crud.create_identifications_many(identifications)
+            finally:
+                db.session.remove()
+        return len(care_events) + len(identifications)
+
+    def _write_one_by_one(self, path, records):
+        """Write each record on its own; dead-letter the ones that fail."""
+        written = 0
+        dead = []
+        for record in records:
+            try:
+                written += self._write([record])
+            except TRANSIENT_ERRORS:
+                raise
+            except Exception as error:
+                logger.error("Dead-lettering a row from %s: %r (%s)", path, record, error)
+                dead.append({**record, 'error': repr(error)})
+
+        if dead:
+            self._dead_letter(path, dead)
+        return written
+
+    def _dead_letter(self, path, records):
+        """Append records that cannot be written to dead-<segment>, for a person to look at."""
+        dead_path = os.path.join(self.directory, f"dead-{os.path.basename(path)}")
+        with open(dead_path, 'ab') as dead:
+            for record in records:
+                dead.write(json.dumps(record).encode() + b'\n')
+            dead.flush()
+            os.fsync(dead.fileno())
+
+    def _run(self):
+        while not self._stopping:
+            self._wake.wait(self.max_delay)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                # The segment stays on disk and is retried on the next tick
+                logger.exception("Write-behind flush failed")
+
+    def start(self):
+        """Replay leftover segments, then flush in the background."""
+        self.flush()
+        self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background thread and flush what is buffered."""
+        self._stopping = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+
+def _existing(column, values):
+    """The values that are present in column."""
+    values = {value for value in values if value is not None}
+    if not values:
+        return set()
+    return set(db.session.execute(db.select(column).where(column.in_(values))).scalars())
+
+
+def _still_owned(care_events, identifications):
+    """Drop rows whose user, user plant or catalog plant was deleted since they were buffered."""
+    user_plants = _existing(UserPlant.user_plant_id,
+                            [row['user_plant_id'] for row in care_events + identifications])
+    care_events = [row for row in care_events if row['user_plant_id'] in user_plants]
+
+    if identifications:
+        users = _existing(User.user_id, [row['user_id'] for row in identifications])
+        plants = _existing(Plant.plant_id, [row['identified_plant_id'] for row in identifications])
+        identifications = [
+            {**row, 'user_plant_id': row['user_plant_id'] if row['user_plant_id'] in user_plants else None}
+            for row in identifications
+            if row['user_id'] in users and row['identified_plant_id'] in plants
+        ]
+
+    return care_events, identifications
+
+
+def _not_yet_written(model, rows):
+    """Drop rows whose write_id is already in model's table."""
+    written = _existing(model.write_id, [row.get('write_id') for row in rows])
+    return [row for row in rows if row.get('write_id') is None or row['write_id'] not in written]
+
+
+def _check_care_event(user_plant_id, event_type, notes):
+    """Raise ValueError for a care event the database would refuse at flush time."""
+    if isinstance(user_plant_id, bool) or not isinstance(user_plant_id, int):
+        raise ValueError(f"user_plant_id must be an integer, not {user_plant_id!r}")
+    if not isinstance(event_type, str) or not event_type.strip():
+        raise ValueError("A care event needs an event type")
+    if len(event_type) > CareEvent.event_type.type.length:
+        raise ValueError(f"Event type is longer than {CareEvent.event_type.type.length} characters")
+    if notes is not None and not isinstance(notes, str):
+        raise ValueError("Care event notes must be text")
+
+
+def record_care_event(user_plant_id, event_type, notes=None, date=None):
+    """Log a care event, through the buffer when write-behind is on.
+
+    Raises ValueError for an event that could not be written, before it is
+    buffered, so the caller can still tell the user.
+    """
+    _check_care_event(user_plant_id, event_type, notes)
+
+    if _buffer is None:
+        crud.create_care_event(user_plant_id, event_type, notes=notes, date=date)
+        return
+
+    _buffer.submit(CARE_EVENT, {'user_plant_id': user_plant_id, 'event_type': event_type,
+                                'notes': notes, 'date': date})
+
+
+def record_identification(user_id, image_url, identified_plant_id, confidence_score,
+                          user_plant_id=None, added_to_collection=False):
+    """Store an identification, through the buffer when write-behind is on."""
+    if _buffer is None:
+        crud.create_identification(user_id, image_url, identified_plant_id, confidence_score,
+                                   user_plant_id=user_plant_id,
+                                   added_to_collection=added_to_collection)
+        return
+
+    _buffer.submit(IDENTIFICATION, {'user_id': user_id, 'image_url': image_url,
+                                    'identified_plant_id': identified_plant_id,
+                                    'confidence_score': confidence_score,
+                                    'user_plant_id': user_plant_id,
+                                    'added_to_collection': added_to_collection,
+                                    'identified_at': None})
+
+
+def init_write_behind(app, enabled=None):
+    """Start buffering writes for app, if enabled. Call once the db is connected."""
+    global _buffer
+
+    if enabled is None:
+        enabled = os.environ.get('WRITE_BEHIND_ENABLED', '').lower() in ('1', 'true', 'yes')
+    if not enabled or _buffer is not None:
+        return False
+
+    _buffer = WriteBehindBuffer(app)
+    _buffer.start()
+    atexit.register(_buffer.stop)
+    return True
+
+
+if __name__ == "__main__":
+    from server import app
+    from model import connect_to_db
+
+    connect_to_db(app, echo=False)
+    start = time.perf_counter()
+    written = WriteBehindBuffer(app).flush()
+    print(f"replayed {written} rows in {time.perf_counter() - start:.2f} s")